@@ -0,0 +1,96 @@
+"""
+列表查询与序列化基准测试
+
+对比订单列表一页数据的两种取数和序列化方式:
+- orm: 查询完整 Order 对象（含 goods_info、delivery_info），逐个 to_dict() 后 json.dumps
+- slim: 只查询列表列到 OrderListRow，rows_to_dicts 后 utils.serialization.dumps（有 orjson 时使用 orjson）
+
+用法: python benchmarks/bench_list_serialization.py [订单数] [每页条数] [翻页次数]
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# 添加项目根目录到Python路径，并使用临时数据库
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+TMP_DIR = tempfile.mkdtemp(prefix="bench_list_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(TMP_DIR, 'bench.db')}"
+
+from models.list_rows import OrderListRow
+from models.order import Order, OrderStatus
+from services.order_service import OrderService
+from utils.pagination import keyset_paginate
+from utils import serialization
+
+
+def _seed(service: OrderService, count: int):
+    """生成带商品信息和发货内容的订单"""
+    base_time = datetime.now() - timedelta(days=30)
+    goods_info = json.dumps([{"goods_id": f"goods_{i}", "goods_name": "虚拟商品" * 10, "goods_type": 1,
+                              "quantity": 1, "price": 10.0} for i in range(5)], ensure_ascii=False)
+    delivery_info = json.dumps({"delivery_content": {"content": "X" * 16, "instructions": "说明" * 100}},
+                               ensure_ascii=False)
+    for i in range(count):
+        created_at = base_time + timedelta(seconds=i)
+        service.db.add(Order(
+            order_sn=f"L{i:012d}",
+            buyer_id=f"buyer_{i}",
+            buyer_name=f"买家{i}",
+            order_status=OrderStatus.SHIPPED.value,
+            order_amount=10.0,
+            goods_info=goods_info,
+            delivery_info=delivery_info,
+            verification_code=f"L{i:09d}",
+            shipped_at=created_at,
+            created_at=created_at,
+            updated_at=created_at
+        ))
+        if i % 1000 == 999:
+            service.db.commit()
+    service.db.commit()
+
+
+def list_orm(service: OrderService, cursor, page_size: int):
+    page = keyset_paginate(service.db.query(Order), Order.created_at, Order.id, cursor, page_size)
+    body = json.dumps({"orders": [order.to_dict() for order in page.items]}, ensure_ascii=False).encode("utf-8")
+    service.db.expunge_all()
+    return page.next_cursor, len(body)
+
+
+def list_slim(service: OrderService, cursor, page_size: int):
+    page = service.list_orders(cursor=cursor, page_size=page_size)
+    body = serialization.dumps({"orders": serialization.rows_to_dicts(page.items, OrderListRow._fields)})
+    return page.next_cursor, len(body)
+
+
+def run(name: str, func, service: OrderService, page_size: int, pages: int):
+    cursor = None
+    total_bytes = 0
+    start = time.perf_counter()
+    for _ in range(pages):
+        cursor, size = func(service, cursor, page_size)
+        total_bytes += size
+        service.db.rollback()
+    elapsed = time.perf_counter() - start
+    print(f"{name:<5} 每页 {elapsed / pages * 1000:>7.2f} ms  响应 {total_bytes / pages / 1024:>7.1f} KiB/页")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    page_size = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    pages = int(sys.argv[3]) if len(sys.argv) > 3 else 50
+    
+    service = OrderService()
+    _seed(service, count)
+    serializer = "orjson" if serialization.orjson is not None else "json"
+    print(f"订单列表基准测试（{count} 个订单，每页 {page_size} 条，翻 {pages} 页，slim 使用 {serializer}）")
+    run("orm", list_orm, service, page_size, pages)
+    run("slim", list_slim, service, page_size, pages)
+    service.close()
+
+
+if __name__ == "__main__":
+    main()
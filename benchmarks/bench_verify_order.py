@@ -0,0 +1,112 @@
+"""
+核销落库开销基准测试
+
+对比核销成功后两种落库方式的单次数据库开销:
+- legacy: update_order(提交+回读) 后 create_verification_record(提交+回读)
+- unit_of_work: save_verification 单事务提交、不回读
+
+用法: python benchmarks/bench_verify_order.py [订单数]
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+# 添加项目根目录到Python路径，并使用临时数据库
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+TMP_DIR = tempfile.mkdtemp(prefix="bench_verify_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(TMP_DIR, 'bench.db')}"
+
+from sqlalchemy import event
+
+from models.order import Order, OrderStatus, VerificationRecord
+from services.verification_service import VerificationService
+
+
+def _seed_orders(service: VerificationService, prefix: str, count: int):
+    """生成待核销订单"""
+    for i in range(count):
+        order_sn = f"{prefix}{i:010d}"
+        service.db.add(Order(
+            order_sn=order_sn,
+            buyer_id=f"buyer_{i}",
+            buyer_name=f"买家{i}",
+            order_status=OrderStatus.SHIPPED.value,
+            order_amount=10.0,
+            verification_code=f"{prefix[0]}{i:07d}",
+            verification_status=False
+        ))
+    service.db.commit()
+    service.release()
+
+
+def _build_record(order_sn: str, verification_code: str) -> VerificationRecord:
+    return VerificationRecord(
+        order_sn=order_sn,
+        verification_code=verification_code,
+        verification_status=True,
+        verification_time=datetime.now(),
+        verification_method="api",
+        verification_result="成功"
+    )
+
+
+def _mark_verified(order: Order):
+    order.verification_status = True
+    order.verification_time = datetime.now()
+    order.order_status = OrderStatus.FINISHED.value
+    order.finished_at = datetime.now()
+
+
+def verify_legacy(service: VerificationService, order_sn: str):
+    """原实现：两次提交、两次回读"""
+    order = service.get_order_by_sn(order_sn)
+    _mark_verified(order)
+    service.update_order(order)
+    service.create_verification_record(_build_record(order_sn, order.verification_code))
+
+
+def verify_unit_of_work(service: VerificationService, order_sn: str):
+    """新实现：单事务提交、不回读"""
+    order = service.get_order_by_sn(order_sn)
+    _mark_verified(order)
+    service.save_verification(order, _build_record(order_sn, order.verification_code))
+
+
+def run(name: str, func, service: VerificationService, prefix: str, count: int, counters: dict):
+    _seed_orders(service, prefix, count)
+    counters["statements"] = 0
+    counters["commits"] = 0
+    
+    start = time.perf_counter()
+    for i in range(count):
+        func(service, f"{prefix}{i:010d}")
+    elapsed = time.perf_counter() - start
+    
+    print(f"{name:<14} {elapsed / count * 1000:>10.3f} ms/次 "
+          f"{counters['statements'] / count:>8.2f} SQL/次 "
+          f"{counters['commits'] / count:>8.2f} 提交/次")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    service = VerificationService()
+    counters = {"statements": 0, "commits": 0}
+    
+    @event.listens_for(service.engine, "before_cursor_execute")
+    def _count_statement(*args):
+        counters["statements"] += 1
+    
+    @event.listens_for(service.engine, "commit")
+    def _count_commit(*args):
+        counters["commits"] += 1
+    
+    print(f"核销落库开销基准测试（{count} 个订单，{service.engine.url}）")
+    run("legacy", verify_legacy, service, "LEGACY", count, counters)
+    run("unit_of_work", verify_unit_of_work, service, "UOW", count, counters)
+    service.close()
+
+
+if __name__ == "__main__":
+    main()
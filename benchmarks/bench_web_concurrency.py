@@ -0,0 +1,183 @@
+"""
+Web查询接口并发基准测试
+
+对比两种处理函数实现在并发请求下的吞吐和延迟:
+- sync: async 处理函数内直接调用同步服务（改造前的写法，查询期间阻塞事件循环）
+- async: 处理函数 await 基于 AsyncSession 的异步服务（WebInterface 当前实现）
+
+两种实现各自在后台线程中用 uvicorn 启动，多个客户端线程轮流请求
+/api/orders、/api/verification-records、/api/stats，统计每秒请求数和 p50/p99 延迟。
+
+用法: python benchmarks/bench_web_concurrency.py [并发数] [请求总数] [订单数]
+"""
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+# 添加项目根目录到Python路径，并使用临时数据库
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+TMP_DIR = tempfile.mkdtemp(prefix="bench_web_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(TMP_DIR, 'bench.db')}"
+
+import requests
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request
+
+from models.database import dispose_engines
+from models.order import Order, OrderStatus, VerificationRecord
+from services.order_service import OrderService
+from services.stats_service import StatsService
+from services.verification_service import VerificationService
+from web.interface import create_web_interface
+
+ENDPOINTS = (
+    "/api/orders?page_size=50",
+    "/api/orders?page_size=50&status=2",
+    "/api/verification-records?page_size=50",
+    "/api/stats",
+)
+
+
+def _seed(count: int):
+    """生成订单和核销记录（一半订单已核销）"""
+    service = OrderService()
+    base_time = datetime.now() - timedelta(days=30)
+    for start in range(0, count, 1000):
+        for i in range(start, min(start + 1000, count)):
+            created_at = base_time + timedelta(seconds=i * 10)
+            verified = i % 2 == 0
+            service.db.add(Order(
+                order_sn=f"B{i:012d}",
+                buyer_id=f"buyer_{i}",
+                buyer_name=f"买家{i}",
+                order_status=OrderStatus.SHIPPED.value,
+                order_amount=10.0,
+                verification_code=f"B{i:07d}",
+                verification_status=verified,
+                created_at=created_at
+            ))
+            if verified:
+                service.db.add(VerificationRecord(
+                    order_sn=f"B{i:012d}",
+                    verification_code=f"B{i:07d}",
+                    verification_status=True,
+                    verification_time=created_at,
+                    verification_method="api",
+                    verification_result="成功",
+                    created_at=created_at
+                ))
+        service.db.commit()
+    service.close()
+
+
+def _sync_app() -> FastAPI:
+    """改造前的处理函数：共享同步只读服务，请求结束后归还连接"""
+    app = FastAPI()
+    order_service = OrderService(read_only=True)
+    verification_service = VerificationService(read_only=True)
+    stats_service = StatsService(read_only=True)
+    
+    @app.middleware("http")
+    async def end_read_transactions(request: Request, call_next):
+        try:
+            return await call_next(request)
+        finally:
+            for service in (order_service, verification_service, stats_service):
+                service.end_read()
+    
+    @app.get("/api/orders")
+    async def api_get_orders(cursor: str = None, page_size: int = 20, status: int = None):
+        page = order_service.list_orders(cursor=cursor, page_size=page_size, status=status)
+        return {"orders": [order._asdict() for order in page.items], "next_cursor": page.next_cursor}
+    
+    @app.get("/api/verification-records")
+    async def api_get_verification_records(cursor: str = None, page_size: int = 20):
+        page = verification_service.list_verification_records(cursor=cursor, page_size=page_size)
+        return {"records": [record._asdict() for record in page.items], "next_cursor": page.next_cursor}
+    
+    @app.get("/api/stats")
+    async def api_get_stats():
+        try:
+            return stats_service.get_dashboard_stats()
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+    
+    return app
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _serve(app: FastAPI):
+    """在后台线程中启动 uvicorn，返回 (server, thread, base_url)"""
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread, f"http://127.0.0.1:{port}"
+
+
+def _client(base_url: str, paths: list) -> list:
+    """单个客户端顺序发送请求，返回每个请求的耗时"""
+    latencies = []
+    with requests.Session() as session:
+        for path in paths:
+            start = time.perf_counter()
+            response = session.get(base_url + path)
+            latencies.append(time.perf_counter() - start)
+            response.raise_for_status()
+    return latencies
+
+
+def _percentile(values: list, percent: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+def run(name: str, app: FastAPI, concurrency: int, total: int):
+    server, thread, base_url = _serve(app)
+    _client(base_url, ENDPOINTS)  # 预热连接池
+    
+    per_client = max(1, total // concurrency)
+    plans = [
+        [ENDPOINTS[(worker + i) % len(ENDPOINTS)] for i in range(per_client)]
+        for worker in range(concurrency)
+    ]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda paths: _client(base_url, paths), plans))
+    elapsed = time.perf_counter() - start
+    
+    server.should_exit = True
+    thread.join()
+    
+    latencies = [latency for result in results for latency in result]
+    print(f"{name:<6} {len(latencies) / elapsed:>9.1f} 请求/秒 "
+          f"p50 {_percentile(latencies, 50) * 1000:>7.1f} ms "
+          f"p99 {_percentile(latencies, 99) * 1000:>7.1f} ms")
+
+
+def main():
+    concurrency = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    total = int(sys.argv[2]) if len(sys.argv) > 2 else 4000
+    orders = int(sys.argv[3]) if len(sys.argv) > 3 else 20000
+    
+    _seed(orders)
+    print(f"Web查询并发基准测试（{concurrency} 个并发客户端，{total} 个请求，{orders} 个订单）")
+    run("sync", _sync_app(), concurrency, total)
+    run("async", create_web_interface().app, concurrency, total)
+    dispose_engines()
+
+
+if __name__ == "__main__":
+    main()
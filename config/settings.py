@@ -22,10 +22,54 @@ class Settings(BaseSettings):
     
     # 数据库配置
     database_url: str = Field("sqlite:///./pdd_auto_verify.db", env="DATABASE_URL")
+    db_pool_size: int = Field(5, env="DB_POOL_SIZE")  # 连接池常驻连接数
+    db_max_overflow: int = Field(10, env="DB_MAX_OVERFLOW")  # 连接池允许的额外连接数
+    db_pool_recycle: int = Field(3600, env="DB_POOL_RECYCLE")  # 连接回收时间（秒）
+    db_pool_timeout: int = Field(30, env="DB_POOL_TIMEOUT")  # 获取连接的等待超时（秒）
+    db_pool_pre_ping: bool = Field(True, env="DB_POOL_PRE_PING")  # 使用连接前检测是否可用
+    
+    # SQL执行统计
+    slow_query_threshold_ms: int = Field(200, env="SLOW_QUERY_THRESHOLD_MS")  # 单条SQL超过毫秒数时记录慢查询日志，0为不记录
+    query_count_warn_threshold: int = Field(50, env="QUERY_COUNT_WARN_THRESHOLD")  # 单次请求或任务的SQL数达到该值时记录警告，0为不检查
+    
+    # 只读查询路由（Web页面和查询API的读请求）
+    database_read_url: Optional[str] = Field(None, env="DATABASE_READ_URL")  # 只读副本地址
+    sqlite_read_mode: str = Field("off", env="SQLITE_READ_MODE")  # 未配置副本时的SQLite读模式: off/readonly/snapshot
+    sqlite_snapshot_path: str = Field("data/read_snapshot.db", env="SQLITE_SNAPSHOT_PATH")  # 只读快照文件
+    sqlite_snapshot_interval: int = Field(10, env="SQLITE_SNAPSHOT_INTERVAL")  # 快照刷新间隔（秒）
+    read_max_staleness: int = Field(30, env="READ_MAX_STALENESS")  # 副本最大允许延迟（秒），超过时回退主库
+    read_staleness_check_interval: int = Field(5, env="READ_STALENESS_CHECK_INTERVAL")  # 副本延迟检查间隔（秒）
+    read_heartbeat_interval: int = Field(5, env="READ_HEARTBEAT_INTERVAL")  # 主库心跳写入间隔（秒）
+    
+    # SQLite调优配置（仅对SQLite数据库生效）
+    sqlite_pragmas_enabled: bool = Field(True, env="SQLITE_PRAGMAS_ENABLED")  # 连接时应用以下PRAGMA
+    sqlite_journal_mode: str = Field("WAL", env="SQLITE_JOURNAL_MODE")  # 日志模式，WAL允许读写并发
+    sqlite_synchronous: str = Field("NORMAL", env="SQLITE_SYNCHRONOUS")  # 同步级别: OFF/NORMAL/FULL/EXTRA
+    sqlite_busy_timeout: int = Field(5000, env="SQLITE_BUSY_TIMEOUT")  # 锁等待超时（毫秒）
+    sqlite_cache_size: int = Field(-20000, env="SQLITE_CACHE_SIZE")  # 页缓存，负数表示KiB
+    sqlite_mmap_size: int = Field(268435456, env="SQLITE_MMAP_SIZE")  # 内存映射大小（字节），0为关闭
+    sqlite_temp_store: str = Field("MEMORY", env="SQLITE_TEMP_STORE")  # 临时表存储: DEFAULT/FILE/MEMORY
+    sqlite_wal_autocheckpoint: int = Field(1000, env="SQLITE_WAL_AUTOCHECKPOINT")  # 自动检查点页数，0为关闭
+    sqlite_wal_checkpoint_interval: int = Field(300, env="SQLITE_WAL_CHECKPOINT_INTERVAL")  # 后台检查点间隔（秒），0为关闭
+    sqlite_wal_checkpoint_mode: str = Field("PASSIVE", env="SQLITE_WAL_CHECKPOINT_MODE")  # 检查点模式: PASSIVE/FULL/RESTART/TRUNCATE
+    
+    # 订单归档配置
+    archive_after_days: int = Field(0, env="ARCHIVE_AFTER_DAYS")  # 已完成/取消/退款订单超过天数后归档，0为不归档
+    archive_batch_size: int = Field(500, env="ARCHIVE_BATCH_SIZE")  # 每个事务归档的订单数
+    archive_database_url: Optional[str] = Field(None, env="ARCHIVE_DATABASE_URL")  # 归档库地址，未配置时归档到主库的按月归档表
     
     # Redis配置
     redis_url: str = Field("redis://localhost:6379/0", env="REDIS_URL")
     
+    # 缓存配置
+    cache_backend: str = Field("redis", env="CACHE_BACKEND")  # redis（连不上时回退到进程内缓存）/memory/none
+    cache_key_prefix: str = Field("pdd_auto_verify:", env="CACHE_KEY_PREFIX")  # 缓存键前缀，多个部署共用Redis时区分
+    cache_redis_timeout: float = Field(0.2, env="CACHE_REDIS_TIMEOUT")  # Redis 连接和读写超时秒数
+    cache_memory_size: int = Field(10000, env="CACHE_MEMORY_SIZE")  # 进程内缓存条数
+    cache_memory_max_ttl: int = Field(5, env="CACHE_MEMORY_MAX_TTL")  # 进程内缓存最长秒数（失效不跨进程），0为不限制
+    cache_order_ttl: int = Field(60, env="CACHE_ORDER_TTL")  # 订单详情缓存秒数，0为不缓存
+    cache_stats_ttl: int = Field(10, env="CACHE_STATS_TTL")  # 仪表板统计缓存秒数，0为不缓存
+    
     # 日志配置
     log_level: str = Field("INFO", env="LOG_LEVEL")
     log_file: str = Field("logs/pdd_auto_verify.log", env="LOG_FILE")
@@ -37,6 +81,38 @@ class Settings(BaseSettings):
     order_check_interval: int = Field(60, env="ORDER_CHECK_INTERVAL")
     max_retry_times: int = Field(3, env="MAX_RETRY_TIMES")
     
+    # 多进程配置
+    worker_id: str = Field("default", env="WORKER_ID")  # 进程标识，用于区分扫描游标和租约持有者
+    order_lease_seconds: int = Field(300, env="ORDER_LEASE_SECONDS")  # 订单租约时长（秒）
+    web_workers: int = Field(1, env="WEB_WORKERS")  # Web服务进程数，每个请求使用独立会话，可多进程运行
+    
+    # 自动核销配置
+    auto_verify_batch_size: int = Field(500, env="AUTO_VERIFY_BATCH_SIZE")  # 每批扫描订单数
+    auto_verify_max_orders: int = Field(0, env="AUTO_VERIFY_MAX_ORDERS")  # 单次最多处理订单数，0为不限制
+    auto_verify_time_budget: int = Field(0, env="AUTO_VERIFY_TIME_BUDGET")  # 单次最长运行秒数，0为不限制
+    verify_priority_mode: str = Field("priority", env="VERIFY_PRIORITY_MODE")  # priority: 按优先级; fifo: 按订单主键
+    verify_priority_amount_weight: float = Field(60.0, env="VERIFY_PRIORITY_AMOUNT_WEIGHT")  # 每元订单金额提前的秒数
+    verify_priority_max_boost: float = Field(86400.0, env="VERIFY_PRIORITY_MAX_BOOST")  # 金额最多提前的秒数
+    verify_retry_base_delay: int = Field(60, env="VERIFY_RETRY_BASE_DELAY")  # 首次失败后的重试等待秒数
+    verify_retry_max_delay: int = Field(86400, env="VERIFY_RETRY_MAX_DELAY")  # 重试等待上限秒数
+    verify_retry_max_attempts: int = Field(8, env="VERIFY_RETRY_MAX_ATTEMPTS")  # 超过后转入死信
+    
+    # 核销记录缓冲写入配置
+    verification_record_buffer_enabled: bool = Field(False, env="VERIFICATION_RECORD_BUFFER_ENABLED")
+    verification_record_buffer_size: int = Field(200, env="VERIFICATION_RECORD_BUFFER_SIZE")  # 达到条数即写入
+    verification_record_flush_interval: float = Field(5.0, env="VERIFICATION_RECORD_FLUSH_INTERVAL")  # 最长缓冲秒数
+    verification_record_spool_file: str = Field("data/verification_records.spool", env="VERIFICATION_RECORD_SPOOL_FILE")  # 写库失败时的溢出文件
+    
+    # 核销对账配置
+    reconcile_window_hours: int = Field(24, env="RECONCILE_WINDOW_HOURS")  # 每个对账窗口的小时数
+    reconcile_page_size: int = Field(100, env="RECONCILE_PAGE_SIZE")  # 平台记录和本地扫描的分页大小
+    reconcile_report_dir: str = Field("reports", env="RECONCILE_REPORT_DIR")  # 差异报告目录
+    
+    # 扫码核销配置
+    scan_code_cache_size: int = Field(10000, env="SCAN_CODE_CACHE_SIZE")  # 核销码->订单号缓存条数
+    scan_negative_cache_size: int = Field(10000, env="SCAN_NEGATIVE_CACHE_SIZE")  # 未知核销码缓存条数
+    scan_negative_cache_ttl: int = Field(60, env="SCAN_NEGATIVE_CACHE_TTL")  # 未知核销码缓存秒数
+    
     # 通知配置
     notification_enabled: bool = Field(True, env="NOTIFICATION_ENABLED")
     email_smtp_server: Optional[str] = Field(None, env="EMAIL_SMTP_SERVER")
@@ -34,11 +34,14 @@ class PddAPIClient:
         self.app_secret = settings.pdd_app_secret
         # 优先从授权存储读取 access_token（生产多店铺可扩展为按店铺选择）
         self.access_token = settings.pdd_access_token
+        # 当前授权的店铺，入库订单记为该店铺
+        self.shop_id = None
         try:
             auth_service = AuthService()
             auth = auth_service.get_active_auth()
             if auth and auth.access_token:
                 self.access_token = auth.access_token
+                self.shop_id = auth.shop_id
             auth_service.close()
         except Exception:
             # 读取失败时，回退到 settings
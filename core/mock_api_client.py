@@ -19,6 +19,7 @@ class MockPddAPIClient:
         self.app_id = settings.pdd_app_id
         self.app_secret = settings.pdd_app_secret
         self.access_token = settings.pdd_access_token
+        self.shop_id = None
         self.test_mode = getattr(settings, 'test_mode', True)
         
         # 模拟数据存储
@@ -1,23 +1,35 @@
 """
 订单管理模块
 """
+import copy
 import json
 from typing import Dict, Any, List, Optional
 from datetime import datetime, timedelta
 from loguru import logger
+from sqlalchemy.orm import Session
 
 from core.api_client import get_api_client
 from core.exceptions import OrderException, APIException
-from models.order import Order, OrderStatus
+from core.priority import compute_verify_priority
+from models.order import Order, OrderStatus, build_order_items, is_virtual_goods
 from services.order_service import OrderService
+from services.order_lease import new_lease_owner
 
 
 class OrderManager:
     """订单管理器"""
     
-    def __init__(self):
+    def __init__(self, db: Optional[Session] = None):
         self.api_client = get_api_client()
-        self.order_service = OrderService()
+        self.order_service = OrderService(db)
+        # 多进程部署时用于认领订单的租约持有者
+        self.lease_owner = new_lease_owner()
+    
+    def for_session(self, db: Session) -> "OrderManager":
+        """返回使用指定会话的订单管理器（共享API客户端和租约持有者）"""
+        manager = copy.copy(self)
+        manager.order_service = OrderService(db)
+        return manager
         
     def get_pending_orders(self, hours: int = 24) -> List[Dict[str, Any]]:
         """获取待处理订单"""
@@ -76,9 +88,18 @@ class OrderManager:
             
             # 保存订单到数据库
             order = self._save_order_to_db(order_info)
+            order_id = order.id
+            
+            # 认领订单，避免多个进程重复发货
+            if not self.order_service.try_claim_order(order_id, self.lease_owner, OrderStatus.PAID.value):
+                logger.info(f"订单 {order_sn} 已被其他进程处理，跳过")
+                return False
             
             # 执行自动发货
-            success = self._auto_ship_order(order)
+            try:
+                success = self._auto_ship_order(order)
+            finally:
+                self.order_service.release_orders(self.lease_owner, [order_id])
             
             if success:
                 logger.info(f"订单 {order_sn} 处理成功")
@@ -93,14 +114,7 @@ class OrderManager:
     
     def _is_virtual_goods_order(self, order_info: Dict[str, Any]) -> bool:
         """判断是否为虚拟商品订单"""
-        # 检查商品类型
-        goods_list = order_info.get("goods_list", [])
-        for goods in goods_list:
-            goods_type = goods.get("goods_type")
-            # 虚拟商品类型标识
-            if goods_type in [1, 2, 3]:  # 根据拼多多API文档调整
-                return True
-        return False
+        return is_virtual_goods(order_info.get("goods_list", []))
     
     def _save_order_to_db(self, order_info: Dict[str, Any]) -> Order:
         """保存订单到数据库"""
@@ -113,20 +127,23 @@ class OrderManager:
                 logger.info(f"订单 {order_sn} 已存在，更新信息")
                 return existing_order
             
-            # 创建新订单记录
+            # 创建新订单记录，商品明细拆到 order_items
+            goods_list = order_info.get("goods_list", [])
+            created_at = datetime.now()
             order = Order(
                 order_sn=order_sn,
+                shop_id=order_info.get("shop_id") or self.api_client.shop_id,
                 buyer_id=order_info.get("buyer_id"),
                 buyer_name=order_info.get("buyer_name"),
                 order_status=order_info.get("order_status"),
-                pay_time=order_info.get("pay_time"),
+                pay_time=self._parse_time(order_info.get("pay_time")),
                 order_amount=order_info.get("order_amount"),
-                goods_info=order_info.get("goods_list", []),
-                created_at=datetime.now(),
-                updated_at=datetime.now()
+                goods_info=json.dumps(goods_list, ensure_ascii=False),
+                created_at=created_at,
+                updated_at=created_at
             )
             
-            self.order_service.create_order(order)
+            self.order_service.create_order(order, build_order_items(order_sn, goods_list, created_at))
             logger.info(f"订单 {order_sn} 保存到数据库成功")
             
             return order
@@ -135,6 +152,13 @@ class OrderManager:
             logger.error(f"保存订单到数据库失败: {e}")
             raise OrderException(f"保存订单到数据库失败: {e}")
     
+    @staticmethod
+    def _parse_time(value: Any) -> Optional[datetime]:
+        """平台返回的时间为 "%Y-%m-%d %H:%M:%S" 字符串"""
+        if not value or isinstance(value, datetime):
+            return value or None
+        return datetime.strptime(value, "%Y-%m-%d %H:%M:%S")
+    
     def _auto_ship_order(self, order: Order) -> bool:
         """自动发货"""
         try:
@@ -151,7 +175,8 @@ class OrderManager:
                 # 更新订单状态
                 order.order_status = OrderStatus.SHIPPED.value
                 order.shipped_at = datetime.now()
-                order.goods_info = json.dumps(goods_info)  # 转换为JSON字符串
+                order.verify_priority = compute_verify_priority(order.shipped_at, order.order_amount)
+                order.delivery_info = json.dumps(goods_info, ensure_ascii=False)  # 发货内容，goods_info 保留商品列表
                 self.order_service.update_order(order)
                 
                 logger.info(f"订单 {order_sn} 自动发货成功")
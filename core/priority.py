@@ -0,0 +1,25 @@
+"""
+核销优先级模块
+"""
+from datetime import datetime
+from typing import Optional
+
+from config.settings import settings
+
+
+def compute_verify_priority(shipped_at: Optional[datetime], order_amount: Optional[float]) -> float:
+    """计算订单的核销优先级键（越小越优先）
+    
+    以发货时间为基准（发货越早越优先），再按订单金额提前：每元提前 verify_priority_amount_weight 秒，
+    最多提前 verify_priority_max_boost 秒。优先级键与当前时间无关，可以直接建索引排序，
+    等价于按“发货时长 + 金额权重”从大到小处理。
+    """
+    shipped_at = shipped_at or datetime.now()
+    boost = min((order_amount or 0) * settings.verify_priority_amount_weight,
+                settings.verify_priority_max_boost)
+    return shipped_at.timestamp() - boost
+
+
+def priority_rules_version() -> str:
+    """当前优先级规则的版本标识，规则配置变化时随之变化"""
+    return f"{settings.verify_priority_amount_weight}:{settings.verify_priority_max_boost}"
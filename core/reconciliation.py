@@ -0,0 +1,234 @@
+"""
+核销对账模块
+"""
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from loguru import logger
+
+from config.settings import settings
+from core.api_client import get_api_client
+from core.exceptions import VerificationException
+from services.verification_service import VerificationService
+
+
+# 差异类型
+DIFF_MISSING_LOCAL = "missing_local"      # 平台已核销，本地订单未核销
+DIFF_MISSING_REMOTE = "missing_remote"    # 本地已核销，平台无核销记录
+DIFF_MISSING_RECORD = "missing_record"    # 本地订单已核销，但没有成功的核销记录
+DIFF_CODE_MISMATCH = "code_mismatch"      # 双方核销码不一致
+DIFF_UNKNOWN_ORDER = "unknown_order"      # 平台核销记录对应的订单本地不存在
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+class VerificationReconciler:
+    """核销对账器
+    
+    按时间窗口比对平台核销记录与本地订单核销状态、核销记录：
+    每个窗口分页拉取平台记录并按订单号排序，与按订单号键集分页的本地扫描做有序归并，
+    内存占用只与单个窗口的平台记录数有关，可以处理数月的历史数据。
+    """
+    
+    def __init__(self,
+                 window_hours: Optional[int] = None,
+                 page_size: Optional[int] = None):
+        self.api_client = get_api_client()
+        self.verification_service = VerificationService()
+        self.window = timedelta(hours=window_hours or settings.reconcile_window_hours)
+        self.page_size = page_size or settings.reconcile_page_size
+    
+    def reconcile(self,
+                  start_time: datetime,
+                  end_time: datetime,
+                  repair: bool = False,
+                  report_file: Optional[str] = None) -> Dict[str, Any]:
+        """对账并写出差异报告，repair 为 True 时按平台结果修复本地数据"""
+        try:
+            report_file = report_file or os.path.join(
+                settings.reconcile_report_dir,
+                f"reconcile_{start_time:%Y%m%d%H%M}_{end_time:%Y%m%d%H%M}.ndjson"
+            )
+            report_dir = os.path.dirname(report_file)
+            if report_dir and not os.path.exists(report_dir):
+                os.makedirs(report_dir)
+            
+            logger.info(f"开始核销对账: {start_time:{TIME_FORMAT}} - {end_time:{TIME_FORMAT}}")
+            
+            summary = {
+                "start_time": start_time.strftime(TIME_FORMAT),
+                "end_time": end_time.strftime(TIME_FORMAT),
+                "remote_records": 0,
+                "local_orders": 0,
+                "matched": 0,
+                "repaired": 0,
+                "diffs": {},
+            }
+            
+            with open(report_file, "w", encoding="utf-8") as report:
+                window_start = start_time
+                while window_start < end_time:
+                    window_end = min(window_start + self.window, end_time)
+                    for diff in self._reconcile_window(window_start, window_end, summary):
+                        if repair and self._repair(diff):
+                            diff["repaired"] = True
+                            summary["repaired"] += 1
+                        summary["diffs"][diff["type"]] = summary["diffs"].get(diff["type"], 0) + 1
+                        report.write(json.dumps(diff, ensure_ascii=False) + "\n")
+                    self.verification_service.release()
+                    window_start = window_end
+                
+                report.write(json.dumps({"type": "summary", **summary}, ensure_ascii=False) + "\n")
+            
+            summary["report_file"] = report_file
+            logger.info(f"核销对账完成，一致 {summary['matched']} 条，差异 {summary['diffs']}，报告: {report_file}")
+            return summary
+            
+        except Exception as e:
+            logger.error(f"核销对账失败: {e}")
+            raise VerificationException(f"核销对账失败: {e}")
+    
+    def _reconcile_window(self,
+                          window_start: datetime,
+                          window_end: datetime,
+                          summary: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """归并一个时间窗口内的平台记录和本地订单，逐条产出差异"""
+        remote = self._load_remote_window(window_start, window_end)
+        summary["remote_records"] += len(remote)
+        remote_only: List[Dict[str, Any]] = []
+        
+        remote_index = 0
+        for local_page in self._iter_local_pages(window_start, window_end):
+            summary["local_orders"] += len(local_page)
+            recorded = self.verification_service.get_recorded_order_sns([row[0] for row in local_page])
+            
+            for order_sn, verification_code, verification_time in local_page:
+                # 平台侧订单号更小的记录在本地窗口内不存在
+                while remote_index < len(remote) and remote[remote_index]["order_sn"] < order_sn:
+                    remote_only.append(remote[remote_index])
+                    remote_index += 1
+                
+                local = {
+                    "verification_code": verification_code,
+                    "verification_time": verification_time.strftime(TIME_FORMAT),
+                }
+                if order_sn not in recorded:
+                    yield self._diff(DIFF_MISSING_RECORD, order_sn, local=local)
+                
+                if remote_index < len(remote) and remote[remote_index]["order_sn"] == order_sn:
+                    record = remote[remote_index]
+                    remote_index += 1
+                    if record["verification_code"] and record["verification_code"] != verification_code:
+                        yield self._diff(DIFF_CODE_MISMATCH, order_sn, remote=record, local=local)
+                    else:
+                        summary["matched"] += 1
+                else:
+                    yield self._diff(DIFF_MISSING_REMOTE, order_sn, local=local)
+        
+        remote_only.extend(remote[remote_index:])
+        
+        # 平台有而本地窗口内没有的记录，按订单号批量查询本地状态
+        for start in range(0, len(remote_only), self.page_size):
+            chunk = remote_only[start:start + self.page_size]
+            states = self.verification_service.get_order_states([r["order_sn"] for r in chunk])
+            for record in chunk:
+                state = states.get(record["order_sn"])
+                if state is None:
+                    yield self._diff(DIFF_UNKNOWN_ORDER, record["order_sn"], remote=record)
+                    continue
+                
+                order_status, verification_status, verification_code, verification_time = state
+                local = {
+                    "order_status": order_status,
+                    "verification_status": bool(verification_status),
+                    "verification_code": verification_code,
+                }
+                if not verification_status:
+                    yield self._diff(DIFF_MISSING_LOCAL, record["order_sn"], remote=record, local=local)
+                elif record["verification_code"] and record["verification_code"] != verification_code:
+                    yield self._diff(DIFF_CODE_MISMATCH, record["order_sn"], remote=record, local=local)
+                else:
+                    # 本地已核销，仅核销时间落在其他窗口
+                    summary["matched"] += 1
+    
+    def _load_remote_window(self, window_start: datetime, window_end: datetime) -> List[Dict[str, Any]]:
+        """分页拉取一个时间窗口内平台的成功核销记录，按订单号排序去重"""
+        records: Dict[str, Dict[str, Any]] = {}
+        page = 1
+        while True:
+            result = self.api_client.get_verification_record(
+                start_time=window_start.strftime(TIME_FORMAT),
+                end_time=window_end.strftime(TIME_FORMAT),
+                page=page,
+                page_size=self.page_size
+            )
+            page_records = result.get("verification_record_get_response", {}).get("records", [])
+            for item in page_records:
+                if not item.get("success", True) or not item.get("order_sn"):
+                    continue
+                records[item["order_sn"]] = {
+                    "order_sn": item["order_sn"],
+                    "verification_code": item.get("verification_code"),
+                    "verification_time": item.get("verification_time") or item.get("time"),
+                }
+            
+            if len(page_records) < self.page_size:
+                break
+            page += 1
+        
+        return [records[order_sn] for order_sn in sorted(records)]
+    
+    def _iter_local_pages(self, window_start: datetime, window_end: datetime) -> Iterator[List[Tuple]]:
+        """按订单号键集分页扫描本地已核销订单"""
+        after_order_sn = ""
+        while True:
+            page = self.verification_service.get_verified_order_page(
+                window_start, window_end, after_order_sn, self.page_size
+            )
+            if not page:
+                break
+            yield page
+            if len(page) < self.page_size:
+                break
+            after_order_sn = page[-1][0]
+    
+    def _repair(self, diff: Dict[str, Any]) -> bool:
+        """按平台结果修复本地数据（只修复可确定的差异）"""
+        try:
+            if diff["type"] == DIFF_MISSING_LOCAL:
+                remote = diff["remote"]
+                verification_time = datetime.now()
+                if remote.get("verification_time"):
+                    verification_time = datetime.strptime(remote["verification_time"], TIME_FORMAT)
+                return self.verification_service.mark_order_verified(
+                    diff["order_sn"], remote.get("verification_code"), verification_time, "reconcile"
+                )
+            
+            if diff["type"] == DIFF_MISSING_RECORD:
+                local = diff["local"]
+                return self.verification_service.add_reconciled_record(
+                    diff["order_sn"],
+                    local["verification_code"],
+                    datetime.strptime(local["verification_time"], TIME_FORMAT)
+                )
+        except Exception as e:
+            logger.error(f"修复订单 {diff['order_sn']} 失败: {e}")
+        return False
+    
+    @staticmethod
+    def _diff(diff_type: str,
+              order_sn: str,
+              remote: Optional[Dict[str, Any]] = None,
+              local: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        diff = {"type": diff_type, "order_sn": order_sn}
+        if remote is not None:
+            diff["remote"] = remote
+        if local is not None:
+            diff["local"] = local
+        return diff
+    
+    def close(self):
+        """关闭数据库连接"""
+        self.verification_service.close()
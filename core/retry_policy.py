@@ -0,0 +1,43 @@
+"""
+核销重试策略模块
+"""
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from config.settings import settings
+
+
+class RetryPolicy:
+    """核销失败重试策略：指数退避，超过最大次数或遇到不可恢复错误时转入死信"""
+    
+    # 重试也无法成功的错误类型，直接转入死信
+    PERMANENT_ERRORS = {
+        "INVALID_CODE",      # 核销码格式不正确
+        "CODE_MISMATCH",     # 核销码不匹配
+        "ORDER_NOT_FOUND",   # 订单不存在
+        "INVALID_STATUS",    # 订单状态不允许核销
+        "ALREADY_VERIFIED",  # 订单已核销
+    }
+    
+    def __init__(self,
+                 base_delay: Optional[int] = None,
+                 max_delay: Optional[int] = None,
+                 max_attempts: Optional[int] = None):
+        self.base_delay = base_delay or settings.verify_retry_base_delay
+        self.max_delay = max_delay or settings.verify_retry_max_delay
+        self.max_attempts = max_attempts or settings.verify_retry_max_attempts
+    
+    def next_delay(self, attempts: int) -> int:
+        """第 attempts 次失败后的等待秒数"""
+        return min(self.base_delay * 2 ** max(attempts - 1, 0), self.max_delay)
+    
+    def schedule(self,
+                 attempts: int,
+                 error_class: str,
+                 now: Optional[datetime] = None) -> Tuple[Optional[datetime], bool]:
+        """计算下次核销时间，返回 (下次核销时间, 是否转入死信)"""
+        if error_class in self.PERMANENT_ERRORS or attempts >= self.max_attempts:
+            return None, True
+        
+        now = now or datetime.now()
+        return now + timedelta(seconds=self.next_delay(attempts)), False
@@ -1,23 +1,60 @@
 """
 虚拟商品核销模块
 """
+import copy
+import time
 from typing import Dict, Any, Optional, List
 from datetime import datetime
 from loguru import logger
+from sqlalchemy.orm import Session
 
+from config.settings import settings
 from core.api_client import get_api_client
 from core.exceptions import VerificationException, APIException
+from core.retry_policy import RetryPolicy
+from models.list_rows import VerificationRecordListRow
 from models.order import Order, VerificationRecord, OrderStatus
 from services.verification_service import VerificationService
+from services.order_lease import new_lease_owner
+from services.verification_record_writer import BufferedVerificationRecordWriter
+from utils.lru_cache import LRUCache
+from utils.serialization import rows_to_plain_dicts
+
+# 自动核销扫描游标名称
+AUTO_VERIFY_CURSOR = "auto_verify_orders"
 
 
 class VirtualGoodsVerifier:
     """虚拟商品核销器"""
     
-    def __init__(self):
+    def __init__(self, db: Optional[Session] = None):
         self.api_client = get_api_client()
-        self.verification_service = VerificationService()
+        self.verification_service = VerificationService(db)
+        
+        # 多进程部署时用于认领订单的租约持有者，以及本进程的扫描游标
+        self.lease_owner = new_lease_owner()
+        self.cursor_name = f"{AUTO_VERIFY_CURSOR}:{settings.worker_id}"
+        
+        # 可选：失败等核销记录走缓冲批量写入
+        self.record_writer = None
+        if settings.verification_record_buffer_enabled:
+            self.record_writer = BufferedVerificationRecordWriter(self.verification_service.engine)
+        
+        # 自动核销失败重试策略
+        self.retry_policy = RetryPolicy()
+        
+        # 扫码核销缓存：核销码->订单号，以及短期缓存的未知核销码
+        self.code_cache = LRUCache(settings.scan_code_cache_size)
+        self.unknown_code_cache = LRUCache(
+            settings.scan_negative_cache_size, ttl=settings.scan_negative_cache_ttl
+        )
         
+    def for_session(self, db: Session) -> "VirtualGoodsVerifier":
+        """返回使用指定会话的核销器（共享API客户端、缓存、重试策略和缓冲写入器）"""
+        verifier = copy.copy(self)
+        verifier.verification_service = VerificationService(db)
+        return verifier
+    
     def verify_order(self, order_sn: str, verification_code: str) -> Dict[str, Any]:
         """核销订单"""
         try:
@@ -25,35 +62,32 @@ class VirtualGoodsVerifier:
             
             # 验证核销码格式
             if not self._validate_verification_code(verification_code):
-                raise VerificationException("核销码格式不正确")
+                raise VerificationException("核销码格式不正确", error_code="INVALID_CODE")
             
             # 检查订单状态
             order = self.verification_service.get_order_by_sn(order_sn)
             if not order:
-                raise VerificationException(f"订单 {order_sn} 不存在")
+                raise VerificationException(f"订单 {order_sn} 不存在", error_code="ORDER_NOT_FOUND")
             
             # 只允许已发货的订单进行核销
             if order.order_status != OrderStatus.SHIPPED.value:
-                raise VerificationException(f"订单 {order_sn} 状态不正确，无法核销")
+                raise VerificationException(f"订单 {order_sn} 状态不正确，无法核销", error_code="INVALID_STATUS")
             
             if order.verification_status:
-                raise VerificationException(f"订单 {order_sn} 已经核销过了")
+                raise VerificationException(f"订单 {order_sn} 已经核销过了", error_code="ALREADY_VERIFIED")
             
             # 验证核销码
             if order.verification_code != verification_code:
-                raise VerificationException("核销码不匹配")
+                raise VerificationException("核销码不匹配", error_code="CODE_MISMATCH")
             
             # 调用拼多多API进行核销
             result = self.api_client.verify_virtual_goods(order_sn, verification_code)
             
             # 检查核销结果
             if result.get("virtual_goods_verify_response", {}).get("success"):
-                # 更新订单状态
+                # 更新订单状态并记录核销记录（同一事务提交）
                 self._update_order_verification_status(order, True)
                 
-                # 记录核销记录
-                self._create_verification_record(order_sn, verification_code, True, "api")
-                
                 logger.info(f"订单 {order_sn} 核销成功")
                 
                 return {
@@ -79,10 +113,29 @@ class VirtualGoodsVerifier:
             raise
         except APIException as e:
             logger.error(f"API调用失败: {e}")
-            raise VerificationException(f"API调用失败: {e}")
+            raise VerificationException(f"API调用失败: {e}", error_code="API_ERROR")
         except Exception as e:
             logger.error(f"核销过程中发生未知错误: {e}")
-            raise VerificationException(f"核销过程中发生未知错误: {e}")
+            raise VerificationException(f"核销过程中发生未知错误: {e}", error_code="UNKNOWN_ERROR")
+    
+    def verify_by_code(self, verification_code: str) -> Dict[str, Any]:
+        """根据核销码核销订单（扫码核销）"""
+        if not self._validate_verification_code(verification_code):
+            raise VerificationException("核销码格式不正确", error_code="INVALID_CODE")
+        
+        order_sn = self.code_cache.get(verification_code)
+        if order_sn is None:
+            if verification_code in self.unknown_code_cache:
+                raise VerificationException("核销码不存在", error_code="CODE_NOT_FOUND")
+            
+            order_sn = self.verification_service.get_order_sn_by_code(verification_code)
+            if order_sn is None:
+                self.unknown_code_cache.set(verification_code, True)
+                raise VerificationException("核销码不存在", error_code="CODE_NOT_FOUND")
+            
+            self.code_cache.set(verification_code, order_sn)
+        
+        return self.verify_order(order_sn, verification_code)
     
     def batch_verify_orders(self, verification_list: List[Dict[str, str]]) -> Dict[str, Any]:
         """批量核销订单"""
@@ -129,34 +182,34 @@ class VirtualGoodsVerifier:
                                  order_sn: Optional[str] = None,
                                  start_time: Optional[str] = None,
                                  end_time: Optional[str] = None,
-                                 page: int = 1,
+                                 cursor: Optional[str] = None,
                                  page_size: int = 20) -> Dict[str, Any]:
-        """获取核销记录"""
+        """获取核销记录（按创建时间倒序，cursor 为上一页返回的 next_cursor）"""
         try:
-            logger.info(f"获取核销记录: order_sn={order_sn}, page={page}")
+            logger.info(f"获取核销记录: order_sn={order_sn}, cursor={cursor}")
             
             # 从数据库获取核销记录
-            records = self.verification_service.get_verification_records(
+            page = self.verification_service.list_verification_records(
+                cursor=cursor,
+                page_size=page_size,
                 order_sn=order_sn,
                 start_time=start_time,
-                end_time=end_time,
-                page=page,
-                page_size=page_size
+                end_time=end_time
             )
             
             # 转换为字典格式
-            record_list = [record.to_dict() for record in records]
+            record_list = rows_to_plain_dicts(page.items, VerificationRecordListRow._fields)
             
             return {
                 "records": record_list,
-                "page": page,
-                "page_size": page_size,
-                "total": len(record_list)
+                "page_size": page.page_size,
+                "next_cursor": page.next_cursor,
+                "has_more": page.has_more
             }
             
         except Exception as e:
             logger.error(f"获取核销记录失败: {e}")
-            raise VerificationException(f"获取核销记录失败: {e}")
+            raise VerificationException(f"获取核销记录失败: {e}", getattr(e, "error_code", None))
     
     def _validate_verification_code(self, verification_code: str) -> bool:
         """验证核销码格式"""
@@ -174,7 +227,7 @@ class VirtualGoodsVerifier:
         return True
     
     def _update_order_verification_status(self, order: Order, verified: bool):
-        """更新订单核销状态"""
+        """更新订单核销状态，并在同一事务中写入核销记录"""
         try:
             order.verification_status = verified
             order.verification_time = datetime.now()
@@ -183,11 +236,30 @@ class VirtualGoodsVerifier:
                 order.order_status = OrderStatus.FINISHED.value
                 order.finished_at = datetime.now()
             
-            self.verification_service.update_order(order)
+            record = self._build_verification_record(
+                order.order_sn, order.verification_code, verified, "api"
+            )
+            self.verification_service.save_verification(order, record)
             
         except Exception as e:
             logger.error(f"更新订单核销状态失败: {e}")
-            raise VerificationException(f"更新订单核销状态失败: {e}")
+            raise VerificationException(f"更新订单核销状态失败: {e}", error_code="DATABASE_ERROR")
+    
+    def _build_verification_record(self,
+                                   order_sn: str,
+                                   verification_code: str,
+                                   success: bool,
+                                   method: str,
+                                   result: Optional[str] = None) -> VerificationRecord:
+        """构造核销记录"""
+        return VerificationRecord(
+            order_sn=order_sn,
+            verification_code=verification_code,
+            verification_status=success,
+            verification_time=datetime.now() if success else None,
+            verification_method=method,
+            verification_result=result or ("成功" if success else "失败")
+        )
     
     def _create_verification_record(self, 
                                    order_sn: str, 
@@ -197,44 +269,134 @@ class VirtualGoodsVerifier:
                                    result: Optional[str] = None):
         """创建核销记录"""
         try:
-            record = VerificationRecord(
-                order_sn=order_sn,
-                verification_code=verification_code,
-                verification_status=success,
-                verification_time=datetime.now() if success else None,
-                verification_method=method,
-                verification_result=result or ("成功" if success else "失败")
+            record = self._build_verification_record(
+                order_sn, verification_code, success, method, result
             )
             
-            self.verification_service.create_verification_record(record)
+            if self.record_writer is not None:
+                self.record_writer.add(record)
+            else:
+                self.verification_service.create_verification_record(record)
             
         except Exception as e:
             logger.error(f"创建核销记录失败: {e}")
-            raise VerificationException(f"创建核销记录失败: {e}")
+            raise VerificationException(f"创建核销记录失败: {e}", error_code="DATABASE_ERROR")
+    
+    def _schedule_retry(self, order_id: int, order_sn: str, error_class: str):
+        """记录自动核销失败，按退避策略安排下次核销或转入死信"""
+        try:
+            attempts = self.verification_service.get_verify_attempts(order_id) + 1
+            next_verify_at, dead_letter = self.retry_policy.schedule(attempts, error_class)
+            self.verification_service.schedule_verification_retry(
+                order_id, attempts, error_class, next_verify_at, dead_letter
+            )
+            
+            if dead_letter:
+                logger.warning(f"订单 {order_sn} 自动核销失败 {attempts} 次（{error_class}），已转入死信")
+            else:
+                logger.info(f"订单 {order_sn} 将于 {next_verify_at:%Y-%m-%d %H:%M:%S} 重试核销（第 {attempts} 次失败）")
+        except Exception as e:
+            logger.error(f"安排订单 {order_sn} 核销重试失败: {e}")
     
-    def auto_verify_orders(self):
-        """自动核销订单"""
+    def auto_verify_orders(self,
+                           batch_size: Optional[int] = None,
+                           max_orders: Optional[int] = None,
+                           time_budget: Optional[int] = None) -> Dict[str, Any]:
+        """自动核销订单
+        
+        分批扫描待核销订单（键集分页），每批先通过租约认领，避免多个进程重复核销同一订单；
+        只认领已到重试时间的订单，失败的订单按退避策略安排下次核销，多次失败或不可恢复的错误转入死信；
+        每批处理完后释放租约、提交游标并释放已加载的订单。
+        
+        priority 模式按核销优先级键（发货时长、订单金额）排序，每次运行从最优先的订单开始；
+        fifo 模式按订单主键排序，达到数量或时间预算时中断，下次运行从保存的游标继续，扫描到末尾后游标归零。
+        """
         try:
-            logger.info("开始自动核销订单")
+            batch_size = batch_size or settings.auto_verify_batch_size
+            max_orders = settings.auto_verify_max_orders if max_orders is None else max_orders
+            time_budget = settings.auto_verify_time_budget if time_budget is None else time_budget
+            deadline = time.monotonic() + time_budget if time_budget > 0 else None
+            by_priority = settings.verify_priority_mode == "priority"
             
-            # 获取已发货但未核销的订单
-            unverified_orders = self.verification_service.get_unverified_orders()
+            last_priority = None
+            if by_priority:
+                # 补算新发货订单的优先级键（规则配置变化时全部重算），每次从最优先的订单开始
+                self.verification_service.refresh_verify_priority()
+                last_id = 0
+                logger.info("开始自动核销订单，按优先级顺序")
+            else:
+                last_id = int(self.verification_service.get_job_cursor(self.cursor_name) or 0)
+                logger.info(f"开始自动核销订单，起始游标: {last_id}")
             
+            processed_count = 0
             verified_count = 0
-            for order in unverified_orders:
-                try:
-                    # 这里可以根据业务逻辑自动生成核销码或从其他地方获取
-                    # 示例：使用订单号作为核销码
-                    verification_code = order.order_sn[-8:]  # 使用订单号后8位作为核销码
+            exhausted = False
+            finished = False
+            
+            while not exhausted and not finished:
+                # 认领游标之后的一批已发货但未核销的订单
+                batch, lease_expires_at = self.verification_service.claim_unverified_orders(
+                    self.lease_owner, last_id, batch_size,
+                    by_priority=by_priority, after_priority=last_priority
+                )
+                finished = len(batch) < batch_size
+                
+                for order_id, order_sn, verify_priority in batch:
+                    if (max_orders > 0 and processed_count >= max_orders) or \
+                            (deadline is not None and time.monotonic() >= deadline):
+                        exhausted = True
+                        finished = False
+                        break
                     
-                    result = self.verify_order(order.order_sn, verification_code)
-                    if result["success"]:
-                        verified_count += 1
+                    # 租约到期后剩余订单可能已被其他进程认领，留待下次处理
+                    if datetime.now() >= lease_expires_at:
+                        logger.warning("订单租约已到期，本批剩余订单留待下次处理")
+                        exhausted = True
+                        finished = False
+                        break
+                    
+                    try:
+                        # 这里可以根据业务逻辑自动生成核销码或从其他地方获取
+                        # 示例：使用订单号作为核销码
+                        verification_code = order_sn[-8:]  # 使用订单号后8位作为核销码
                         
-                except Exception as e:
-                    logger.error(f"自动核销订单 {order.order_sn} 失败: {e}")
+                        result = self.verify_order(order_sn, verification_code)
+                        if result["success"]:
+                            verified_count += 1
+                        else:
+                            self._schedule_retry(order_id, order_sn, "VERIFY_REJECTED")
+                            
+                    except Exception as e:
+                        logger.error(f"自动核销订单 {order_sn} 失败: {e}")
+                        error_class = getattr(e, "error_code", None) or type(e).__name__
+                        self._schedule_retry(order_id, order_sn, error_class)
+                    
+                    processed_count += 1
+                    last_id = order_id
+                    last_priority = verify_priority
+                
+                # 每批结束释放租约、提交游标，并释放本批加载的订单对象
+                self.verification_service.release_orders(
+                    self.lease_owner, [order_id for order_id, _, _ in batch]
+                )
+                if not by_priority:
+                    self.verification_service.save_job_cursor(
+                        self.cursor_name, None if finished else str(last_id)
+                    )
+                self.verification_service.release()
+            
+            if exhausted and not by_priority:
+                logger.info(f"自动核销达到预算上限，下次从游标 {last_id} 继续")
+            elif exhausted:
+                logger.info("自动核销达到预算上限，剩余订单下次按优先级继续")
+            logger.info(f"自动核销完成，处理 {processed_count} 个订单，成功核销 {verified_count} 个订单")
             
-            logger.info(f"自动核销完成，成功核销 {verified_count} 个订单")
+            return {
+                "processed": processed_count,
+                "verified": verified_count,
+                "cursor": None if finished or by_priority else last_id,
+                "finished": finished
+            }
             
         except Exception as e:
             logger.error(f"自动核销失败: {e}")
@@ -2,6 +2,9 @@
 主程序入口
 """
 import asyncio
+import gc
+import os
+import resource
 import schedule
 import time
 from datetime import datetime
@@ -9,12 +12,29 @@ from loguru import logger
 from typing import Optional
 
 from config.settings import settings
+from models.database import start_wal_checkpointer, unit_of_work
+from models.query_stats import track_queries
+from models.read_routing import start_replica_heartbeat
+from models.order import OrderStatus
 from core.order_manager import OrderManager
 from core.verification import VirtualGoodsVerifier
+from services.archive_service import ArchiveService
 from utils.logger import setup_logger
 from services.notification_service import NotificationService
 
 
+def _current_rss_mb() -> float:
+    """当前进程常驻内存（MB），无法读取 /proc 时返回峰值"""
+    try:
+        with open(f"/proc/{os.getpid()}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
 class PddAutoVerifyApp:
     """拼多多自动核销应用"""
     
@@ -26,14 +46,32 @@ class PddAutoVerifyApp:
         self.order_manager = OrderManager()
         self.verifier = VirtualGoodsVerifier()
         self.notification_service = NotificationService()
+        # 最近一次各任务结束时会话中的对象数（浸泡测试报告用）
+        self.identity_map_sizes = {}
         
         logger.info("拼多多自动核销系统初始化完成")
     
+    def _run_job(self, name: str, job):
+        """每次任务使用新的会话（工作单元），结束后关闭，加载的订单不会在进程中跨任务累积
+        
+        任务结束时记录用时和执行的SQL数（SQL数较多时附上执行次数最多的语句）。
+        """
+        started = time.perf_counter()
+        with track_queries() as queries, unit_of_work() as db:
+            try:
+                return job(db)
+            finally:
+                self.identity_map_sizes[name] = len(db.identity_map)
+                logger.info(
+                    f"任务 {name} 结束，用时 {time.perf_counter() - started:.2f} 秒，"
+                    f"{queries.summary(settings.query_count_warn_threshold)}"
+                )
+    
     def start_order_monitoring(self):
         """启动订单监控"""
         try:
             logger.info("开始订单监控")
-            self.order_manager.monitor_orders()
+            self._run_job("monitor", lambda db: self.order_manager.for_session(db).monitor_orders())
         except Exception as e:
             logger.error(f"订单监控失败: {e}")
             self.notification_service.send_error_notification(f"订单监控失败: {e}")
@@ -42,19 +80,35 @@ class PddAutoVerifyApp:
         """启动自动核销"""
         try:
             logger.info("开始自动核销")
-            self.verifier.auto_verify_orders()
+            self._run_job("verify", lambda db: self.verifier.for_session(db).auto_verify_orders())
         except Exception as e:
             logger.error(f"自动核销失败: {e}")
             self.notification_service.send_error_notification(f"自动核销失败: {e}")
     
+    def start_order_archival(self):
+        """归档超过 ARCHIVE_AFTER_DAYS 的终态订单"""
+        try:
+            self._run_job("archive", lambda db: ArchiveService(db).archive_orders())
+        except Exception as e:
+            logger.error(f"订单归档失败: {e}")
+            self.notification_service.send_error_notification(f"订单归档失败: {e}")
+    
     def run_scheduled_tasks(self):
         """运行定时任务"""
         # 设置定时任务
         schedule.every(settings.order_check_interval).seconds.do(self.start_order_monitoring)
         schedule.every(30).minutes.do(self.start_auto_verification)
+        if settings.archive_after_days > 0:
+            schedule.every().day.at("03:00").do(self.start_order_archival)
         
         logger.info(f"定时任务已设置，订单检查间隔: {settings.order_check_interval}秒")
         
+        # SQLite在WAL模式下定期回写检查点，避免WAL文件持续增长
+        start_wal_checkpointer()
+        
+        # 配置了只读副本时，定期写入心跳供Web服务判断副本延迟
+        start_replica_heartbeat()
+        
         # 运行定时任务
         while True:
             try:
@@ -79,6 +133,45 @@ class PddAutoVerifyApp:
         
         logger.info("一次性任务执行完成")
     
+    def run_soak_test(self, cycles: int = 100):
+        """浸泡测试：使用模拟API重复执行订单监控和自动核销，报告每轮的RSS和会话标识映射大小"""
+        from core.mock_api_client import MockPddAPIClient
+        
+        mock_client = MockPddAPIClient()
+        self.order_manager.api_client = mock_client
+        self.verifier.api_client = mock_client
+        
+        samples = []
+        for cycle in range(1, cycles + 1):
+            # 每轮换一批新的已支付订单，模拟持续进单
+            mock_client.mock_orders = [
+                dict(order, order_sn=f"SOAK{cycle:06d}{i:04d}", order_status=OrderStatus.PAID.value)
+                for i, order in enumerate(mock_client._generate_mock_orders())
+            ]
+            self.start_order_monitoring()
+            self.start_auto_verification()
+            gc.collect()
+            
+            # 常驻组件自身的会话不应持有任何对象
+            resident = len(self.order_manager.order_service.db.identity_map) + \
+                len(self.verifier.verification_service.db.identity_map)
+            sample = {
+                "cycle": cycle,
+                "rss_mb": _current_rss_mb(),
+                "job_identity_map": dict(self.identity_map_sizes),
+                "resident_identity_map": resident,
+            }
+            samples.append(sample)
+            logger.info(
+                f"浸泡测试 {cycle}/{cycles}: RSS {sample['rss_mb']:.1f} MB, "
+                f"任务会话对象数 {sample['job_identity_map']}, 常驻会话对象数 {resident}"
+            )
+        
+        if samples:
+            growth = samples[-1]["rss_mb"] - samples[0]["rss_mb"]
+            logger.info(f"浸泡测试完成: {cycles} 轮, RSS 变化 {growth:+.1f} MB（相对第1轮）")
+        return samples
+    
     def run_web_server(self):
         """运行Web服务器"""
         try:
@@ -86,6 +179,7 @@ class PddAutoVerifyApp:
             
             # 创建Web界面
             web_interface = create_web_interface()
+            start_wal_checkpointer()
             
             logger.info("Web服务器启动中...")
             # 启动Web服务器
@@ -112,8 +206,12 @@ def main():
             app.run_once()
         elif command == "web":
             app.run_web_server()
+        elif command == "archive":
+            app.start_order_archival()
+        elif command == "soak":
+            app.run_soak_test(int(sys.argv[2]) if len(sys.argv) > 2 else 100)
         else:
-            print("可用命令: monitor, verify, once, web")
+            print("可用命令: monitor, verify, once, web, archive, soak [轮数]")
     else:
         # 默认运行定时任务
         app.run_scheduled_tasks()
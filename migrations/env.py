@@ -0,0 +1,73 @@
+"""
+Alembic 迁移环境
+
+命令行执行（alembic upgrade head）时使用 DATABASE_URL 对应的数据库；
+程序内通过 models.database.init_database 执行时复用调用方传入的连接。
+"""
+from logging.config import fileConfig
+
+from alembic import context
+
+from config.settings import settings
+from models.archive import is_archive_table
+from models.database import Base, get_engine, import_models
+
+config = context.config
+connection = config.attributes.get("connection")
+
+# 程序内调用时不改动应用的日志配置
+if connection is None and config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+import_models()
+target_metadata = Base.metadata
+
+
+def _database_url() -> str:
+    return config.get_main_option("sqlalchemy.url") or settings.database_url
+
+
+def _include_object(obj, name, type_, reflected, compare_to):
+    # 按月创建的归档表不由迁移管理
+    table_name = obj.table.name if type_ in ("column", "index", "unique_constraint") else name
+    return not (reflected and is_archive_table(table_name))
+
+
+def _run_migrations(conn):
+    context.configure(
+        connection=conn,
+        target_metadata=target_metadata,
+        render_as_batch=conn.dialect.name == "sqlite",
+        compare_type=True,
+        include_object=_include_object,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_offline():
+    """生成SQL脚本，不连接数据库"""
+    context.configure(
+        url=_database_url(),
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    """连接数据库执行迁移"""
+    if connection is not None:
+        _run_migrations(connection)
+        return
+    with get_engine(_database_url()).connect() as conn:
+        _run_migrations(conn)
+        conn.commit()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
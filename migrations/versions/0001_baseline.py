@@ -0,0 +1,150 @@
+"""
+基线表结构
+
+与引入迁移前运行时 create_all + 补列得到的表结构一致。
+已有数据库执行时只补齐缺失的表、列和索引，因此新旧数据库都可以直接升级。
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19
+"""
+import logging
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+logger = logging.getLogger("alembic.runtime.migration")
+
+
+def _tables():
+    return {
+        "orders": [
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("order_sn", sa.String(50), nullable=False),
+            sa.Column("buyer_id", sa.String(50), nullable=False),
+            sa.Column("buyer_name", sa.String(100), nullable=False),
+            sa.Column("order_status", sa.Integer(), nullable=False),
+            sa.Column("pay_time", sa.DateTime()),
+            sa.Column("shipped_at", sa.DateTime()),
+            sa.Column("received_at", sa.DateTime()),
+            sa.Column("finished_at", sa.DateTime()),
+            sa.Column("order_amount", sa.Float(), nullable=False),
+            sa.Column("goods_info", sa.Text()),
+            sa.Column("delivery_info", sa.Text()),
+            sa.Column("verification_code", sa.String(100)),
+            sa.Column("verification_status", sa.Boolean()),
+            sa.Column("verification_time", sa.DateTime()),
+            sa.Column("lease_owner", sa.String(128)),
+            sa.Column("lease_expires_at", sa.DateTime()),
+            sa.Column("verify_attempts", sa.Integer(), server_default="0"),
+            sa.Column("next_verify_at", sa.DateTime()),
+            sa.Column("last_verify_error", sa.String(100)),
+            sa.Column("verify_dead_letter", sa.Boolean(), server_default="0"),
+            sa.Column("verify_priority", sa.Float()),
+            sa.Column("created_at", sa.DateTime()),
+            sa.Column("updated_at", sa.DateTime()),
+        ],
+        "products": [
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("goods_id", sa.String(50), nullable=False),
+            sa.Column("goods_name", sa.String(200), nullable=False),
+            sa.Column("goods_type", sa.Integer(), nullable=False),
+            sa.Column("goods_status", sa.Integer(), nullable=False),
+            sa.Column("price", sa.Float(), nullable=False),
+            sa.Column("stock", sa.Integer(), nullable=False),
+            sa.Column("description", sa.Text()),
+            sa.Column("created_at", sa.DateTime()),
+            sa.Column("updated_at", sa.DateTime()),
+        ],
+        "verification_records": [
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("order_sn", sa.String(50), nullable=False),
+            sa.Column("verification_code", sa.String(100), nullable=False),
+            sa.Column("verification_status", sa.Boolean()),
+            sa.Column("verification_time", sa.DateTime()),
+            sa.Column("verification_method", sa.String(50)),
+            sa.Column("verification_result", sa.Text()),
+            sa.Column("created_at", sa.DateTime()),
+        ],
+        "shop_auth": [
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("shop_id", sa.String(64)),
+            sa.Column("shop_name", sa.String(255)),
+            sa.Column("access_token", sa.String(1024), nullable=False),
+            sa.Column("refresh_token", sa.String(1024)),
+            sa.Column("expires_at", sa.DateTime()),
+            sa.Column("created_at", sa.DateTime()),
+            sa.Column("updated_at", sa.DateTime()),
+            sa.Column("is_active", sa.Boolean()),
+        ],
+        "job_cursors": [
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("name", sa.String(100), nullable=False),
+            sa.Column("position", sa.String(255)),
+            sa.Column("updated_at", sa.DateTime()),
+        ],
+    }
+
+
+# (索引名, 表名, 列, 是否唯一)
+INDEXES = [
+    ("ix_orders_id", "orders", ["id"], False),
+    ("ix_orders_order_sn", "orders", ["order_sn"], True),
+    ("ix_orders_verification_code", "orders", ["verification_code"], True),
+    ("ix_orders_lease_expires_at", "orders", ["lease_expires_at"], False),
+    ("ix_orders_next_verify_at", "orders", ["next_verify_at"], False),
+    ("ix_orders_verify_queue", "orders", ["order_status", "verification_status", "verify_priority", "id"], False),
+    ("ix_products_id", "products", ["id"], False),
+    ("ix_products_goods_id", "products", ["goods_id"], True),
+    ("ix_verification_records_id", "verification_records", ["id"], False),
+    ("ix_verification_records_order_sn", "verification_records", ["order_sn"], False),
+    ("ix_shop_auth_id", "shop_auth", ["id"], False),
+    ("ix_shop_auth_shop_id", "shop_auth", ["shop_id"], False),
+    ("ix_job_cursors_id", "job_cursors", ["id"], False),
+    ("ix_job_cursors_name", "job_cursors", ["name"], True),
+]
+
+
+def _has_duplicates(table: str, column: str) -> bool:
+    """唯一索引创建前检查已有数据是否重复"""
+    conn = op.get_bind()
+    row = conn.execute(sa.text(
+        f"SELECT {column} FROM {table} WHERE {column} IS NOT NULL "
+        f"GROUP BY {column} HAVING COUNT(*) > 1 LIMIT 1"
+    )).first()
+    return row is not None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    existing_tables = set(inspector.get_table_names())
+    
+    for table_name, columns in _tables().items():
+        if table_name not in existing_tables:
+            op.create_table(table_name, *columns)
+            continue
+        
+        # 旧数据库补齐缺失的列
+        existing_columns = {column["name"] for column in inspector.get_columns(table_name)}
+        for column in columns:
+            if column.name not in existing_columns:
+                op.add_column(table_name, column)
+    
+    for index_name, table_name, columns, unique in INDEXES:
+        existing_indexes = {index["name"] for index in sa.inspect(op.get_bind()).get_indexes(table_name)}
+        if index_name in existing_indexes:
+            continue
+        if unique and table_name in existing_tables and _has_duplicates(table_name, columns[0]):
+            logger.warning(f"{table_name}.{columns[0]} 存在重复数据，跳过唯一索引 {index_name}")
+            continue
+        op.create_index(index_name, table_name, columns, unique=unique)
+
+
+def downgrade():
+    for table_name in reversed(list(_tables())):
+        op.drop_table(table_name)
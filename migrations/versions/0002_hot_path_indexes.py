@@ -0,0 +1,46 @@
+"""
+热点查询索引
+
+- 订单按状态+核销状态筛选并按创建时间排序（仪表盘、订单列表）
+- 订单、核销记录按 (created_at, id) 排序分页
+- 已发货未核销订单的部分索引，自动核销只扫描待核销的少量行
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+# 与 models.order.Order 中的索引定义保持一致（OrderStatus.SHIPPED = 2）
+PENDING_VERIFY_SQLITE = "order_status = 2 AND verification_status = 0"
+PENDING_VERIFY_POSTGRESQL = "order_status = 2 AND verification_status = false"
+
+
+def upgrade():
+    op.create_index(
+        "ix_orders_status_verified_created", "orders",
+        ["order_status", "verification_status", "created_at"]
+    )
+    op.create_index("ix_orders_created_at_id", "orders", ["created_at", "id"])
+    op.create_index(
+        "ix_verification_records_created_at_id", "verification_records", ["created_at", "id"]
+    )
+    # 不支持部分索引的数据库（如MySQL）会创建为普通索引
+    op.create_index(
+        "ix_orders_pending_verify", "orders", ["verify_priority", "id"],
+        sqlite_where=sa.text(PENDING_VERIFY_SQLITE),
+        postgresql_where=sa.text(PENDING_VERIFY_POSTGRESQL),
+    )
+
+
+def downgrade():
+    op.drop_index("ix_orders_pending_verify", table_name="orders")
+    op.drop_index("ix_verification_records_created_at_id", table_name="verification_records")
+    op.drop_index("ix_orders_created_at_id", table_name="orders")
+    op.drop_index("ix_orders_status_verified_created", table_name="orders")
@@ -0,0 +1,104 @@
+"""
+统计计数表
+
+新增 stat_counters 表，并从已有订单和核销记录回填计数。
+回填逻辑按本版本的表结构固定在迁移中（与当时的 models.stats.rebuild_stat_counters 口径相同），
+不引用应用代码，之后模型变化不影响从头升级。
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19
+"""
+from collections import defaultdict
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+# 本版本的计数桶和计数器名称
+TOTAL_BUCKET_START = datetime(1970, 1, 1)
+ORDER_EVENTS = (("orders_shipped", "shipped_at"), ("orders_finished", "finished_at"),
+                ("orders_verified", "verification_time"))
+
+orders = sa.table(
+    "orders",
+    sa.column("order_status", sa.Integer),
+    sa.column("verification_status", sa.Boolean),
+    sa.column("created_at", sa.DateTime),
+    sa.column("shipped_at", sa.DateTime),
+    sa.column("finished_at", sa.DateTime),
+    sa.column("verification_time", sa.DateTime),
+)
+verification_records = sa.table(
+    "verification_records",
+    sa.column("verification_status", sa.Boolean),
+    sa.column("created_at", sa.DateTime),
+)
+
+
+def upgrade():
+    stat_counters = op.create_table(
+        "stat_counters",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("bucket", sa.String(8), nullable=False),
+        sa.Column("bucket_start", sa.DateTime(), nullable=False),
+        sa.Column("name", sa.String(64), nullable=False),
+        sa.Column("value", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("updated_at", sa.DateTime()),
+        sa.UniqueConstraint("bucket", "bucket_start", "name", name="uq_stat_counters_key"),
+    )
+    op.create_index("ix_stat_counters_id", "stat_counters", ["id"])
+    
+    backfill_counters(op.get_bind(), stat_counters)
+
+
+def backfill_counters(connection, stat_counters, batch_size: int = 10000):
+    """从订单和核销记录计算订单状态计数和按累计、小时、天落桶的事件计数"""
+    counters = defaultdict(int)
+    
+    def add_event(name, at):
+        hour = (at or datetime.now()).replace(minute=0, second=0, microsecond=0)
+        counters[("total", TOTAL_BUCKET_START, name)] += 1
+        counters[("hour", hour, name)] += 1
+        counters[("day", hour.replace(hour=0), name)] += 1
+    
+    rows = connection.execute(
+        sa.select(orders.c.order_status, orders.c.verification_status, sa.func.count())
+        .group_by(orders.c.order_status, orders.c.verification_status)
+    )
+    for order_status, verification_status, count in rows:
+        counters[("total", TOTAL_BUCKET_START, f"orders:{order_status}:{int(bool(verification_status))}")] += count
+    
+    rows = connection.execution_options(yield_per=batch_size).execute(
+        sa.select(orders.c.created_at, *(orders.c[field] for _, field in ORDER_EVENTS))
+    )
+    for created_at, *times in rows:
+        add_event("orders_created", created_at)
+        for (name, _), value in zip(ORDER_EVENTS, times):
+            if value is not None:
+                add_event(name, value)
+    
+    rows = connection.execution_options(yield_per=batch_size).execute(
+        sa.select(verification_records.c.verification_status, verification_records.c.created_at)
+    )
+    for verification_status, created_at in rows:
+        add_event("verifications_success" if verification_status else "verifications_failed", created_at)
+    
+    now = datetime.now()
+    values = [
+        {"bucket": bucket, "bucket_start": start, "name": name, "value": value, "updated_at": now}
+        for (bucket, start, name), value in sorted(counters.items())
+    ]
+    if values:
+        connection.execute(sa.insert(stat_counters), values)
+
+
+def downgrade():
+    op.drop_index("ix_stat_counters_id", table_name="stat_counters")
+    op.drop_table("stat_counters")
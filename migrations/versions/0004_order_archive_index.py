@@ -0,0 +1,34 @@
+"""
+订单归档索引表
+
+新增 order_archive_index 表（订单号 -> 归档月份）。按月归档表由归档任务按需创建，不在迁移中管理。
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "order_archive_index",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("order_sn", sa.String(50), nullable=False),
+        sa.Column("archive_month", sa.String(6), nullable=False),
+        sa.Column("archived_at", sa.DateTime()),
+    )
+    op.create_index("ix_order_archive_index_id", "order_archive_index", ["id"])
+    op.create_index("ix_order_archive_index_order_sn", "order_archive_index", ["order_sn"], unique=True)
+
+
+def downgrade():
+    op.drop_index("ix_order_archive_index_order_sn", table_name="order_archive_index")
+    op.drop_index("ix_order_archive_index_id", table_name="order_archive_index")
+    op.drop_table("order_archive_index")
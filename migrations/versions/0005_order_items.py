@@ -0,0 +1,105 @@
+"""
+订单商品明细表
+
+新增 order_items 表，并从已有订单的 goods_info 回填。
+回填逻辑按本版本的表结构固定在迁移中，不引用应用代码，之后模型变化不影响从头升级。
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19
+"""
+import json
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+orders = sa.table(
+    "orders",
+    sa.column("id", sa.Integer),
+    sa.column("order_sn", sa.String),
+    sa.column("goods_info", sa.Text),
+    sa.column("created_at", sa.DateTime),
+)
+
+
+def upgrade():
+    order_items = op.create_table(
+        "order_items",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("order_sn", sa.String(50), nullable=False),
+        sa.Column("goods_id", sa.String(50), nullable=False),
+        sa.Column("goods_name", sa.String(200)),
+        sa.Column("goods_type", sa.Integer()),
+        sa.Column("quantity", sa.Integer(), nullable=False),
+        sa.Column("price", sa.Float()),
+        sa.Column("created_at", sa.DateTime()),
+    )
+    op.create_index("ix_order_items_id", "order_items", ["id"])
+    op.create_index("ix_order_items_order_sn", "order_items", ["order_sn"])
+    op.create_index("ix_order_items_goods_id_order_sn", "order_items", ["goods_id", "order_sn"])
+    op.create_index("ix_order_items_goods_type_order_sn", "order_items", ["goods_type", "order_sn"])
+    
+    # 已发货订单的 goods_info 曾被发货内容覆盖，无法还原的订单不生成明细
+    backfill_order_items(op.get_bind(), order_items)
+
+
+def _to_number(convert, value):
+    try:
+        return convert(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_goods_list(goods_info):
+    """解析 goods_info 中的商品列表，无法解析时返回空列表"""
+    try:
+        goods_list = json.loads(goods_info)
+    except ValueError:
+        return []
+    if not isinstance(goods_list, list):
+        return []
+    return [goods for goods in goods_list if isinstance(goods, dict) and goods.get("goods_id") is not None]
+
+
+def backfill_order_items(connection, order_items, batch_size: int = 1000):
+    """按订单主键分批，从 goods_info 生成商品明细"""
+    statement = sa.select(orders.c.id, orders.c.order_sn, orders.c.goods_info, orders.c.created_at).where(
+        orders.c.goods_info.isnot(None)
+    ).order_by(orders.c.id)
+    
+    last_id = 0
+    while True:
+        rows = connection.execute(statement.where(orders.c.id > last_id).limit(batch_size)).all()
+        if not rows:
+            return
+        values = []
+        for row in rows:
+            for goods in parse_goods_list(row.goods_info):
+                quantity = _to_number(int, goods.get("quantity"))
+                values.append({
+                    "order_sn": row.order_sn,
+                    "goods_id": str(goods["goods_id"]),
+                    "goods_name": goods.get("goods_name"),
+                    "goods_type": _to_number(int, goods.get("goods_type")),
+                    "quantity": 1 if quantity is None else quantity,
+                    "price": _to_number(float, goods.get("price")),
+                    "created_at": row.created_at or datetime.now(),
+                })
+        if values:
+            connection.execute(sa.insert(order_items), values)
+        last_id = rows[-1].id
+
+
+def downgrade():
+    op.drop_index("ix_order_items_goods_type_order_sn", table_name="order_items")
+    op.drop_index("ix_order_items_goods_id_order_sn", table_name="order_items")
+    op.drop_index("ix_order_items_order_sn", table_name="order_items")
+    op.drop_index("ix_order_items_id", table_name="order_items")
+    op.drop_table("order_items")
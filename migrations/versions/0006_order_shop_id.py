@@ -0,0 +1,44 @@
+"""
+订单店铺ID
+
+orders 新增 shop_id 列和 (shop_id, created_at, id) 索引，用于按店铺导出和筛选。
+已有订单归属当前生效授权的店铺（未授权时保持为空）。
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("orders", sa.Column("shop_id", sa.String(64)))
+    op.create_index("ix_orders_shop_created_at_id", "orders", ["shop_id", "created_at", "id"])
+    
+    orders = sa.table("orders", sa.column("shop_id", sa.String(64)))
+    shop_auth = sa.table(
+        "shop_auth",
+        sa.column("shop_id", sa.String(64)),
+        sa.column("is_active", sa.Boolean()),
+        sa.column("updated_at", sa.DateTime()),
+    )
+    active_shop = (
+        sa.select(shop_auth.c.shop_id)
+        .where(shop_auth.c.is_active == sa.true(), shop_auth.c.shop_id.isnot(None))
+        .order_by(shop_auth.c.updated_at.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    op.execute(orders.update().where(orders.c.shop_id.is_(None)).values(shop_id=active_shop))
+
+
+def downgrade():
+    op.drop_index("ix_orders_shop_created_at_id", table_name="orders")
+    with op.batch_alter_table("orders") as batch_op:
+        batch_op.drop_column("shop_id")
@@ -0,0 +1,24 @@
+"""
+订单状态+创建时间分页索引
+
+orders 新增 (order_status, created_at, id) 索引：订单列表只按订单状态筛选时，
+按 (created_at, id) 倒序的键集分页可以直接沿索引读取，不再额外排序。
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19
+"""
+from alembic import op
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index("ix_orders_status_created_at_id", "orders", ["order_status", "created_at", "id"])
+
+
+def downgrade():
+    op.drop_index("ix_orders_status_created_at_id", table_name="orders")
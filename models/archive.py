@@ -0,0 +1,163 @@
+"""
+订单归档模型
+
+已完成、已取消、已退款且超过 ARCHIVE_AFTER_DAYS 的订单及其核销记录、商品明细，按订单创建月份移入归档表:
+- orders_archive_YYYYMM / verification_records_archive_YYYYMM / order_items_archive_YYYYMM:
+  与业务表列相同，按需创建，不纳入迁移
+- order_archive_index: 订单号 -> 归档月份，保存在主库，按订单号查询时先查业务表、再经索引查归档表
+
+配置 ARCHIVE_DATABASE_URL 时归档表建在单独的归档库中，索引表仍在主库。
+"""
+import re
+import threading
+from datetime import datetime
+from typing import Dict, Optional, Set, Tuple
+
+from sqlalchemy import Column, DateTime, Index, Integer, MetaData, String, Table, inspect, select, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import NoSuchTableError
+from sqlalchemy.schema import CreateColumn
+
+from config.settings import settings
+from models.database import Base, get_engine
+from models.order import Order, OrderItem, VerificationRecord
+
+# 归档表名: <业务表>_archive_<YYYYMM>
+ARCHIVE_TABLE_PATTERN = re.compile(r"^(orders|verification_records|order_items)_archive_\d{6}$")
+
+# 归档表不属于 Base.metadata，由 ensure_archive_tables 按月创建
+archive_metadata = MetaData()
+_created: Set[Tuple[str, str]] = set()
+# (数据库URL, 归档表名) -> 实际存在的列，按订单号回查时只查询这些列
+_columns: Dict[Tuple[str, str], Set[str]] = {}
+_lock = threading.Lock()
+
+
+class OrderArchiveIndex(Base):
+    """已归档订单索引"""
+    __tablename__ = "order_archive_index"
+
+    id = Column(Integer, primary_key=True, index=True)
+    order_sn = Column(String(50), unique=True, index=True, nullable=False)  # 订单号
+    archive_month = Column(String(6), nullable=False)  # 归档月份 YYYYMM
+    archived_at = Column(DateTime, default=datetime.now)  # 归档时间
+
+
+def is_archive_table(name: str) -> bool:
+    """是否为按月创建的归档表（迁移对比时忽略）"""
+    return bool(ARCHIVE_TABLE_PATTERN.match(name or ""))
+
+
+def archive_month(created_at: Optional[datetime]) -> str:
+    """订单所属的归档月份"""
+    return (created_at or datetime.now()).strftime("%Y%m")
+
+
+def _archive_table(source: Table, month: str, unique_order_sn: bool) -> Table:
+    name = f"{source.name}_archive_{month}"
+    table = archive_metadata.tables.get(name)
+    if table is not None:
+        return table
+    # 只保留列定义，归档表只需按订单号查询
+    columns = [
+        Column(column.name, column.type, primary_key=column.primary_key, nullable=column.nullable)
+        for column in source.columns
+    ]
+    return Table(
+        name, archive_metadata, *columns,
+        Index(f"ix_{name}_order_sn", "order_sn", unique=unique_order_sn),
+    )
+
+
+def archive_tables(month: str) -> Tuple[Table, Table, Table]:
+    """指定月份的 (订单归档表, 核销记录归档表, 商品明细归档表)"""
+    with _lock:
+        return (
+            _archive_table(Order.__table__, month, unique_order_sn=True),
+            _archive_table(VerificationRecord.__table__, month, unique_order_sn=False),
+            _archive_table(OrderItem.__table__, month, unique_order_sn=False),
+        )
+
+
+def ensure_archive_tables(connection: Connection, month: str) -> Tuple[Table, Table, Table]:
+    """确保指定月份的归档表已创建（每个数据库每个月份在进程内只检查一次）"""
+    tables = archive_tables(month)
+    key = (str(connection.engine.url), month)
+    if key not in _created:
+        archive_metadata.create_all(connection, tables=list(tables), checkfirst=True)
+        _add_missing_columns(connection, tables)
+        _created.add(key)
+        for table in tables:
+            _columns.pop((key[0], table.name), None)
+    return tables
+
+
+def _add_missing_columns(connection: Connection, tables: Tuple[Table, ...]):
+    """业务表新增列后，已存在的归档表补上同名的可空列"""
+    inspector = inspect(connection)
+    preparer = connection.dialect.identifier_preparer
+    for table in tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                ddl = CreateColumn(column).compile(dialect=connection.dialect)
+                connection.execute(text(f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {ddl}"))
+
+
+def _existing_columns(connection: Connection, table_name: str) -> Set[str]:
+    """归档表实际存在的列（进程内缓存，本进程补列后失效），表不存在时为空"""
+    key = (str(connection.engine.url), table_name)
+    columns = _columns.get(key)
+    if columns is None:
+        try:
+            columns = {column["name"] for column in inspect(connection).get_columns(table_name)}
+        except NoSuchTableError:
+            return set()
+        _columns[key] = columns
+    return columns
+
+
+class OrderArchive:
+    """归档订单查询"""
+
+    def __init__(self, archive_url: Optional[str] = None):
+        # 未配置归档库时归档表与业务表在同一个库
+        self.engine = get_engine(archive_url) if archive_url else None
+
+    def load_order(self, connection: Connection, order_sn: str) -> Optional[Order]:
+        """经主库的归档索引查找订单，返回只读的 Order 对象（archived=True，不属于任何会话）"""
+        month = connection.execute(
+            select(OrderArchiveIndex.archive_month).where(OrderArchiveIndex.order_sn == order_sn)
+        ).scalar()
+        if month is None:
+            return None
+
+        if self.engine is None:
+            row = self._load_row(connection, month, order_sn)
+        else:
+            with self.engine.connect() as archive_connection:
+                row = self._load_row(archive_connection, month, order_sn)
+        if row is None:
+            return None
+
+        order = Order(**row)
+        order.archived = True
+        return order
+
+    @staticmethod
+    def _load_row(connection: Connection, month: str, order_sn: str) -> Optional[dict]:
+        """只查询归档表已有的列（业务表后来新增的列在归档时才补上，未补的列为空）"""
+        orders_table = archive_tables(month)[0]
+        existing = _existing_columns(connection, orders_table.name)
+        columns = [column for column in orders_table.columns if column.name in existing]
+        if not columns:
+            return None
+        row = connection.execute(
+            select(*columns).where(orders_table.c.order_sn == order_sn)
+        ).mappings().first()
+        return dict(row) if row is not None else None
+
+
+def get_order_archive() -> OrderArchive:
+    """按当前配置获取归档查询"""
+    return OrderArchive(settings.archive_database_url)
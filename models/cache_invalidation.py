@@ -0,0 +1,66 @@
+"""
+缓存命名空间与写入后失效
+
+ORM 写入订单、核销记录和商品明细时，在 before_flush 中记下受影响的缓存键，
+会话提交后再删除（回滚则丢弃），避免其他请求在提交前把旧值重新写入缓存。
+Core 批量写入（归档、批量导入、缓冲核销记录）不经过 ORM 事件，由写入方调用
+invalidate_after_commit 或在提交后调用 invalidate_orders / invalidate_stats。
+"""
+from typing import Iterable
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from utils.cache import get_cache
+
+# 缓存命名空间
+CACHE_ORDER = "order"  # 订单号 -> 订单详情
+CACHE_STATS = "stats"  # 仪表板统计
+
+DASHBOARD_STATS_KEY = "dashboard"
+
+_SESSION_KEY = "stale_cache_keys"
+
+
+def invalidate_orders(order_sns: Iterable[str], stats: bool = True):
+    """删除订单详情缓存（默认同时删除仪表板统计）"""
+    keys = [(CACHE_ORDER, order_sn) for order_sn in order_sns]
+    if stats:
+        keys.append((CACHE_STATS, DASHBOARD_STATS_KEY))
+    get_cache().delete_keys(keys)
+
+
+def invalidate_stats():
+    """删除仪表板统计缓存"""
+    get_cache().delete(CACHE_STATS, DASHBOARD_STATS_KEY)
+
+
+def invalidate_after_commit(session: Session, namespace: str, keys: Iterable):
+    """会话提交后删除指定缓存"""
+    session.info.setdefault(_SESSION_KEY, set()).update((namespace, key) for key in keys)
+
+
+@event.listens_for(Session, "before_flush")
+def _collect_stale_keys(session, flush_context, instances):
+    from models.order import Order, OrderItem, VerificationRecord
+
+    stale = set()
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, (Order, OrderItem, VerificationRecord)):
+            stale.add((CACHE_ORDER, obj.order_sn))
+            if not isinstance(obj, OrderItem):
+                stale.add((CACHE_STATS, DASHBOARD_STATS_KEY))
+    if stale:
+        session.info.setdefault(_SESSION_KEY, set()).update(stale)
+
+
+@event.listens_for(Session, "after_commit")
+def _delete_stale_keys(session):
+    stale = session.info.pop(_SESSION_KEY, None)
+    if stale:
+        get_cache().delete_keys(stale)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_stale_keys(session, previous_transaction):
+    session.info.pop(_SESSION_KEY, None)
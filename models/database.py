@@ -1,32 +1,316 @@
 """
 数据库配置模块
 """
-from sqlalchemy import create_engine
+import asyncio
+import os
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional, Set
+
+from loguru import logger
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from config.settings import settings
+import models.query_stats  # 注册SQL计时和计数事件
 
-# 创建数据库引擎
-engine = create_engine(settings.database_url)
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ALEMBIC_INI = os.path.join(PROJECT_ROOT, "alembic.ini")
+MIGRATIONS_DIR = os.path.join(PROJECT_ROOT, "migrations")
 
-# 创建会话工厂
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# 进程级引擎注册表：同一数据库URL在进程内只创建一个引擎和连接池
+_engines: Dict[str, Engine] = {}
+_session_factories: Dict[str, sessionmaker] = {}
+_initialized_urls: Set[str] = set()
+_checkpointers: Dict[str, "WalCheckpointer"] = {}
+_async_engines: Dict[str, AsyncEngine] = {}
+_registry_lock = threading.RLock()
 
 # 创建基础模型类
 Base = declarative_base()
 
-def init_database():
-    """初始化数据库表"""
-    # 导入所有模型以确保它们被注册
-    from models.order import Order, Product, VerificationRecord
+def _engine_options(url: str) -> dict:
+    """连接池配置（内存SQLite使用单连接池，不支持这些参数）"""
+    if url.startswith("sqlite") and (":memory:" in url or url.rstrip("/") in ("sqlite:", "sqlite+pysqlite:")):
+        return {}
+    return {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+    }
+
+_SYNCHRONOUS_LEVELS = {"OFF", "NORMAL", "FULL", "EXTRA"}
+_TEMP_STORES = {"DEFAULT", "FILE", "MEMORY"}
+_JOURNAL_MODES = {"DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"}
+_CHECKPOINT_MODES = {"PASSIVE", "FULL", "RESTART", "TRUNCATE"}
+
+def _choice(name: str, value: str, choices: Set[str]) -> Optional[str]:
+    value = (value or "").upper()
+    if value not in choices:
+        logger.warning(f"SQLite配置 {name}={value} 无效，已忽略")
+        return None
+    return value
+
+def sqlite_pragmas() -> Dict[str, object]:
+    """根据配置生成连接时执行的SQLite PRAGMA（有序）"""
+    pragmas = {
+        "journal_mode": _choice("journal_mode", settings.sqlite_journal_mode, _JOURNAL_MODES),
+        "synchronous": _choice("synchronous", settings.sqlite_synchronous, _SYNCHRONOUS_LEVELS),
+        "busy_timeout": int(settings.sqlite_busy_timeout),
+        "cache_size": int(settings.sqlite_cache_size),
+        "mmap_size": int(settings.sqlite_mmap_size),
+        "temp_store": _choice("temp_store", settings.sqlite_temp_store, _TEMP_STORES),
+        "wal_autocheckpoint": int(settings.sqlite_wal_autocheckpoint),
+    }
+    return {name: value for name, value in pragmas.items() if value is not None}
+
+def apply_sqlite_pragmas(engine: Engine, pragmas: Optional[Dict[str, object]] = None):
+    """为SQLite引擎注册连接事件，每个新连接建立时执行PRAGMA"""
+    if engine.dialect.name != "sqlite":
+        return
+    pragmas = sqlite_pragmas() if pragmas is None else pragmas
+    
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+def get_engine(url: Optional[str] = None) -> Engine:
+    """获取数据库引擎（按URL在进程内共享）"""
+    url = url or settings.database_url
+    with _registry_lock:
+        engine = _engines.get(url)
+        if engine is None:
+            engine = create_engine(url, **_engine_options(url))
+            if settings.sqlite_pragmas_enabled:
+                apply_sqlite_pragmas(engine)
+            _engines[url] = engine
+        return engine
+
+def get_session_factory(url: Optional[str] = None) -> sessionmaker:
+    """获取会话工厂（按URL在进程内共享）"""
+    url = url or settings.database_url
+    with _registry_lock:
+        factory = _session_factories.get(url)
+        if factory is None:
+            factory = sessionmaker(autocommit=False, autoflush=False, bind=get_engine(url))
+            _session_factories[url] = factory
+        return factory
+
+# 同步驱动 -> 异步驱动
+_ASYNC_DRIVERS = {
+    "sqlite": "aiosqlite",
+    "postgresql": "asyncpg",
+    "mysql": "aiomysql",
+}
+
+def async_database_url(url: str) -> str:
+    """把同步数据库URL转换为对应异步驱动的URL（已指定异步驱动时原样返回）"""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    driver = _ASYNC_DRIVERS.get(backend)
+    if driver is None or parsed.get_driver_name() == driver:
+        return url
+    return parsed.set(drivername=f"{backend}+{driver}").render_as_string(hide_password=False)
+
+def get_async_engine(url: Optional[str] = None) -> AsyncEngine:
+    """获取异步数据库引擎（按URL在进程内共享，url 为同步URL）
+    
+    aiosqlite 对文件数据库默认不使用连接池，这里显式使用 AsyncAdaptedQueuePool，
+    和同步引擎一样受 DB_POOL_* 配置约束。
+    """
+    url = url or settings.database_url
+    with _registry_lock:
+        engine = _async_engines.get(url)
+        if engine is None:
+            options = _engine_options(url)
+            if options and url.startswith("sqlite"):
+                options["poolclass"] = AsyncAdaptedQueuePool
+            engine = create_async_engine(async_database_url(url), **options)
+            if settings.sqlite_pragmas_enabled:
+                apply_sqlite_pragmas(engine.sync_engine)
+            _async_engines[url] = engine
+        return engine
+
+def close_async_engines(engines):
+    """关闭异步引擎的连接池
+    
+    aiosqlite 每个连接占用一个非守护线程，未关闭的连接会让进程无法退出。
+    不在事件循环中时新建一个事件循环关闭连接；在事件循环中调用时只能丢弃连接池引用，
+    异步代码中应改为在线程池里调用 dispose_engines()。
+    """
+    engines = list(engines)
+    if not engines:
+        return
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        async def _dispose():
+            for async_engine in engines:
+                await async_engine.dispose()
+        asyncio.run(_dispose())
+        return
+    for async_engine in engines:
+        async_engine.sync_engine.dispose(close=False)
+
+def ensure_schema(bind: Optional[Engine] = None):
+    """确保数据库已迁移到最新版本（每个引擎在进程内只检查一次）"""
+    bind = bind or get_engine()
+    url = str(bind.url)
+    with _registry_lock:
+        if url in _initialized_urls:
+            return
+        init_database(bind)
+        _initialized_urls.add(url)
+
+class WalCheckpointer:
+    """后台WAL检查点
+    
+    WAL文件只有在没有读事务占用时才能被检查点回写并截断，
+    长时间运行的调度器和Web服务可能让自动检查点一直推迟，因此定期主动执行一次。
+    """
+    
+    def __init__(self, engine: Engine, interval: float, mode: str = "PASSIVE"):
+        self.engine = engine
+        self.interval = interval
+        self.mode = _choice("wal_checkpoint_mode", mode, _CHECKPOINT_MODES) or "PASSIVE"
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
     
-    # 创建所有表
-    Base.metadata.create_all(bind=engine)
+    def start(self):
+        """启动后台线程"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="sqlite-wal-checkpoint", daemon=True)
+        self._thread.start()
+        logger.info(f"SQLite WAL检查点已启动，间隔 {self.interval} 秒，模式 {self.mode}")
+    
+    def stop(self):
+        """停止后台线程"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+    
+    def checkpoint(self):
+        """执行一次检查点，返回 (是否被阻塞, WAL总页数, 已回写页数)"""
+        with self.engine.connect() as conn:
+            busy, log_pages, checkpointed = conn.exec_driver_sql(
+                f"PRAGMA wal_checkpoint({self.mode})"
+            ).fetchone()
+        if busy:
+            logger.warning(f"WAL检查点被阻塞: 共 {log_pages} 页，已回写 {checkpointed} 页")
+        else:
+            logger.debug(f"WAL检查点完成: 共 {log_pages} 页，已回写 {checkpointed} 页")
+        return busy, log_pages, checkpointed
+    
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.checkpoint()
+            except Exception as e:
+                logger.error(f"WAL检查点失败: {e}")
+
+def start_wal_checkpointer(engine: Optional[Engine] = None) -> Optional[WalCheckpointer]:
+    """为SQLite引擎启动后台WAL检查点（每个引擎只启动一个）"""
+    engine = engine or get_engine()
+    interval = settings.sqlite_wal_checkpoint_interval
+    if engine.dialect.name != "sqlite" or interval <= 0:
+        return None
+    if settings.sqlite_journal_mode.upper() != "WAL":
+        return None
+    url = str(engine.url)
+    with _registry_lock:
+        checkpointer = _checkpointers.get(url)
+        if checkpointer is None:
+            checkpointer = WalCheckpointer(engine, interval, settings.sqlite_wal_checkpoint_mode)
+            checkpointer.start()
+            _checkpointers[url] = checkpointer
+        return checkpointer
+
+def dispose_engines():
+    """关闭所有引擎的连接池并清空注册表"""
+    from models.read_routing import dispose_read_routers
+    
+    dispose_read_routers()
+    with _registry_lock:
+        close_async_engines(_async_engines.values())
+        _async_engines.clear()
+        for checkpointer in _checkpointers.values():
+            checkpointer.stop()
+        _checkpointers.clear()
+        for engine in _engines.values():
+            engine.dispose()
+        _engines.clear()
+        _session_factories.clear()
+        _initialized_urls.clear()
+
+# 默认数据库引擎和会话工厂
+engine = get_engine()
+SessionLocal = get_session_factory()
+
+def import_models():
+    """导入所有模型以确保它们注册到 Base.metadata"""
+    from models.order import Order, OrderItem, Product, VerificationRecord
+    from models.auth import ShopAuth
+    from models.job import JobCursor
+    from models.stats import StatCounter
+    from models.archive import OrderArchiveIndex
+
+def _alembic_config():
+    from alembic.config import Config
+    
+    config = Config(ALEMBIC_INI)
+    config.set_main_option("script_location", MIGRATIONS_DIR)
+    return config
+
+def init_database(bind=None):
+    """将数据库迁移到最新版本（已是最新版本时不做任何修改）"""
+    from alembic import command
+    from alembic.runtime.migration import MigrationContext
+    from alembic.script import ScriptDirectory
+    
+    bind = bind or engine
+    config = _alembic_config()
+    head = ScriptDirectory.from_config(config).get_current_head()
+    
+    with bind.begin() as conn:
+        current = MigrationContext.configure(conn).get_current_revision()
+        if current == head:
+            return
+        logger.info(f"数据库迁移: {current or '未初始化'} -> {head}")
+        config.attributes["connection"] = conn
+        command.upgrade(config, "head")
+
+@contextmanager
+def unit_of_work(url: Optional[str] = None):
+    """一次任务使用的会话：正常结束时提交，异常时回滚，最后关闭并清空标识映射"""
+    db = get_session_factory(url)()
+    try:
+        yield db
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
 
 def get_db():
-    """获取数据库会话"""
-    db = SessionLocal()
+    """获取数据库会话（FastAPI 依赖：每个请求使用独立会话，请求结束后归还连接）"""
+    db = get_session_factory()()
     try:
         yield db
+    except Exception:
+        db.rollback()
+        raise
     finally:
         db.close()
@@ -0,0 +1,18 @@
+"""
+后台任务状态模型
+"""
+from datetime import datetime
+
+from sqlalchemy import Column, Integer, String, DateTime
+
+from models.database import Base
+
+
+class JobCursor(Base):
+    """任务游标（记录分批扫描的断点，便于下次继续）"""
+    __tablename__ = "job_cursors"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(100), unique=True, index=True, nullable=False)  # 任务名称
+    position = Column(String(255))  # 游标位置
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)  # 更新时间
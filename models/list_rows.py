@@ -0,0 +1,42 @@
+"""
+列表视图行对象
+
+订单和核销记录列表只查询列表需要的列，结果放入基于元组的 namedtuple，
+不创建 ORM 对象、不进入会话的标识映射，也不加载 goods_info、delivery_info 等大文本列。
+行对象按属性访问（order.order_sn），序列化见 utils.serialization。
+"""
+from collections import namedtuple
+
+from models.order import Order, VerificationRecord
+
+# 订单列表列（与 Order.to_dict() 相同，不含 goods_info、delivery_info）
+ORDER_LIST_COLUMNS = (
+    Order.id, Order.order_sn, Order.shop_id, Order.buyer_id, Order.buyer_name, Order.order_status,
+    Order.pay_time, Order.shipped_at, Order.received_at, Order.finished_at, Order.order_amount,
+    Order.verification_code, Order.verification_status, Order.verification_time,
+    Order.created_at, Order.updated_at,
+)
+OrderListRow = namedtuple("OrderListRow", [column.key for column in ORDER_LIST_COLUMNS])
+
+# 核销记录列表列（与 VerificationRecord.to_dict() 相同）
+VERIFICATION_RECORD_LIST_COLUMNS = (
+    VerificationRecord.id, VerificationRecord.order_sn, VerificationRecord.verification_code,
+    VerificationRecord.verification_status, VerificationRecord.verification_time,
+    VerificationRecord.verification_method, VerificationRecord.verification_result,
+    VerificationRecord.created_at,
+)
+VerificationRecordListRow = namedtuple(
+    "VerificationRecordListRow", [column.key for column in VERIFICATION_RECORD_LIST_COLUMNS]
+)
+
+
+def order_list_rows(rows) -> list:
+    """把 ORDER_LIST_COLUMNS 的查询结果转换为 OrderListRow"""
+    make = OrderListRow._make
+    return [make(row) for row in rows]
+
+
+def verification_record_list_rows(rows) -> list:
+    """把 VERIFICATION_RECORD_LIST_COLUMNS 的查询结果转换为 VerificationRecordListRow"""
+    make = VerificationRecordListRow._make
+    return [make(row) for row in rows]
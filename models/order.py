@@ -1,11 +1,16 @@
 """
 订单数据模型
 """
+import json
 from datetime import datetime
 from enum import Enum
 from typing import Dict, Any, Optional, List
-from sqlalchemy import Column, Integer, String, DateTime, Text, Float, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, Text, Float, Boolean, Index, event, insert, inspect, select, text
+from sqlalchemy.engine import Connection
+from core.priority import compute_verify_priority
 from models.database import Base
+from models.stats import track_counter_history
+import models.cache_invalidation  # 注册写入后删除缓存的会话事件
 
 
 class OrderStatus(Enum):
@@ -19,12 +24,35 @@ class OrderStatus(Enum):
     REFUNDED = 6     # 已退款
 
 
+# 虚拟商品的 goods_type（根据拼多多API文档调整）
+VIRTUAL_GOODS_TYPES = (1, 2, 3)
+
+
 class Order(Base):
     """订单模型"""
     __tablename__ = "orders"
+    __table_args__ = (
+        # 自动核销按优先级取数
+        Index("ix_orders_verify_queue", "order_status", "verification_status", "verify_priority", "id"),
+        # 仪表盘和订单列表按状态筛选、按创建时间排序
+        Index("ix_orders_status_verified_created", "order_status", "verification_status", "created_at"),
+        # 按 (created_at, id) 分页
+        Index("ix_orders_created_at_id", "created_at", "id"),
+        # 订单列表按状态筛选后按 (created_at, id) 分页
+        Index("ix_orders_status_created_at_id", "order_status", "created_at", "id"),
+        # 按店铺导出、筛选
+        Index("ix_orders_shop_created_at_id", "shop_id", "created_at", "id"),
+        # 只包含已发货未核销订单的部分索引（OrderStatus.SHIPPED = 2）
+        Index(
+            "ix_orders_pending_verify", "verify_priority", "id",
+            sqlite_where=text("order_status = 2 AND verification_status = 0"),
+            postgresql_where=text("order_status = 2 AND verification_status = false"),
+        ),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     order_sn = Column(String(50), unique=True, index=True, nullable=False)  # 订单号
+    shop_id = Column(String(64))  # 店铺ID
     buyer_id = Column(String(50), nullable=False)  # 买家ID
     buyer_name = Column(String(100), nullable=False)  # 买家姓名
     order_status = Column(Integer, nullable=False, default=OrderStatus.UNPAID.value)  # 订单状态
@@ -35,17 +63,28 @@ class Order(Base):
     order_amount = Column(Float, nullable=False)  # 订单金额
     goods_info = Column(Text)  # 商品信息(JSON格式)
     delivery_info = Column(Text)  # 发货信息(JSON格式)
-    verification_code = Column(String(100))  # 核销码
+    verification_code = Column(String(100), unique=True, index=True)  # 核销码
     verification_status = Column(Boolean, default=False)  # 核销状态
     verification_time = Column(DateTime)  # 核销时间
+    lease_owner = Column(String(128))  # 租约持有者（处理该订单的进程）
+    lease_expires_at = Column(DateTime, index=True)  # 租约到期时间
+    verify_attempts = Column(Integer, default=0, server_default="0")  # 自动核销失败次数
+    next_verify_at = Column(DateTime, index=True)  # 下次自动核销时间
+    last_verify_error = Column(String(100))  # 上次核销失败的错误类型
+    verify_dead_letter = Column(Boolean, default=False, server_default="0")  # 是否已放弃自动核销（死信）
+    verify_priority = Column(Float)  # 核销优先级键（越小越优先）
     created_at = Column(DateTime, default=datetime.now)  # 创建时间
     updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)  # 更新时间
     
+    # 从归档表加载的订单为 True，只读，不属于任何会话
+    archived = False
+    
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典"""
         return {
             "id": self.id,
             "order_sn": self.order_sn,
+            "shop_id": self.shop_id,
             "buyer_id": self.buyer_id,
             "buyer_name": self.buyer_name,
             "order_status": self.order_status,
@@ -95,9 +134,46 @@ class Product(Base):
         }
 
 
+class OrderItem(Base):
+    """订单商品明细（入库时从订单的 goods_list 拆出）"""
+    __tablename__ = "order_items"
+    __table_args__ = (
+        # 按商品统计销量、按商品筛选订单
+        Index("ix_order_items_goods_id_order_sn", "goods_id", "order_sn"),
+        # 按商品类型筛选订单（虚拟商品判断）
+        Index("ix_order_items_goods_type_order_sn", "goods_type", "order_sn"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    order_sn = Column(String(50), nullable=False, index=True)  # 订单号
+    goods_id = Column(String(50), nullable=False)  # 商品ID
+    goods_name = Column(String(200))  # 商品名称
+    goods_type = Column(Integer)  # 商品类型
+    quantity = Column(Integer, nullable=False, default=1)  # 数量
+    price = Column(Float)  # 单价
+    created_at = Column(DateTime, default=datetime.now)  # 创建时间（与订单创建时间相同）
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典"""
+        return {
+            "id": self.id,
+            "order_sn": self.order_sn,
+            "goods_id": self.goods_id,
+            "goods_name": self.goods_name,
+            "goods_type": self.goods_type,
+            "quantity": self.quantity,
+            "price": self.price,
+            "created_at": self.created_at.isoformat() if self.created_at else None
+        }
+
+
 class VerificationRecord(Base):
     """核销记录模型"""
     __tablename__ = "verification_records"
+    __table_args__ = (
+        # 按 (created_at, id) 筛选和分页
+        Index("ix_verification_records_created_at_id", "created_at", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     order_sn = Column(String(50), nullable=False, index=True)  # 订单号
@@ -120,3 +196,107 @@ class VerificationRecord(Base):
             "verification_result": self.verification_result,
             "created_at": self.created_at.isoformat()
         }
+
+
+def parse_goods_list(goods_info: Any) -> List[Dict[str, Any]]:
+    """解析订单的商品列表（goods_list 或 goods_info 的 JSON 文本），无法解析时返回空列表"""
+    if isinstance(goods_info, str):
+        try:
+            goods_info = json.loads(goods_info)
+        except ValueError:
+            return []
+    if not isinstance(goods_info, list):
+        return []
+    return [goods for goods in goods_info if isinstance(goods, dict) and goods.get("goods_id") is not None]
+
+
+def _to_int(value: Any) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_float(value: Any) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def order_item_values(order_sn: str, goods: Dict[str, Any],
+                      created_at: Optional[datetime] = None) -> Dict[str, Any]:
+    """把平台返回的单个商品转换为 order_items 行"""
+    quantity = _to_int(goods.get("quantity"))
+    return {
+        "order_sn": order_sn,
+        "goods_id": str(goods["goods_id"]),
+        "goods_name": goods.get("goods_name"),
+        "goods_type": _to_int(goods.get("goods_type")),
+        "quantity": 1 if quantity is None else quantity,
+        "price": _to_float(goods.get("price")),
+        "created_at": created_at or datetime.now(),
+    }
+
+
+def build_order_items(order_sn: str, goods_info: Any,
+                      created_at: Optional[datetime] = None) -> List[OrderItem]:
+    """从商品列表生成订单商品明细"""
+    return [OrderItem(**order_item_values(order_sn, goods, created_at)) for goods in parse_goods_list(goods_info)]
+
+
+def is_virtual_goods(goods_info: Any) -> bool:
+    """商品列表中是否包含虚拟商品"""
+    return any(_to_int(goods.get("goods_type")) in VIRTUAL_GOODS_TYPES for goods in parse_goods_list(goods_info))
+
+
+def backfill_order_items(connection: Connection, batch_size: int = 1000) -> int:
+    """从已有订单的 goods_info 回填 order_items（跳过已有明细的订单），返回写入的行数"""
+    orders = Order.__table__
+    items = OrderItem.__table__
+    statement = select(orders.c.id, orders.c.order_sn, orders.c.goods_info, orders.c.created_at).where(
+        orders.c.goods_info.isnot(None),
+        ~select(items.c.id).where(items.c.order_sn == orders.c.order_sn).exists(),
+    ).order_by(orders.c.id)
+    
+    total = 0
+    last_id = 0
+    while True:
+        rows = connection.execute(statement.where(orders.c.id > last_id).limit(batch_size)).all()
+        if not rows:
+            return total
+        values = [
+            order_item_values(row.order_sn, goods, row.created_at)
+            for row in rows for goods in parse_goods_list(row.goods_info)
+        ]
+        if values:
+            connection.execute(insert(items), values)
+            total += len(values)
+        last_id = rows[-1].id
+
+
+# 统计计数需要这些字段修改前的值（见 models.stats）
+track_counter_history(
+    Order.order_status,
+    Order.verification_status,
+    Order.shipped_at,
+    Order.finished_at,
+    Order.verification_time,
+)
+
+
+@event.listens_for(Order, "before_insert")
+@event.listens_for(Order, "before_update")
+def _fill_verify_priority(mapper, connection, order):
+    """ORM写入已发货未核销的订单时计算核销优先级键
+    
+    自动核销按 (优先级键, 主键) 键集分页，键为空的订单不会被认领；
+    发货时间或订单金额变化时重算（调用方同时显式设置了优先级键时以调用方为准）。
+    """
+    if order.order_status != OrderStatus.SHIPPED.value or order.verification_status:
+        return
+    attrs = inspect(order).attrs
+    if attrs.verify_priority.history.added:
+        return
+    if order.verify_priority is None or attrs.shipped_at.history.added or attrs.order_amount.history.added:
+        order.verify_priority = compute_verify_priority(order.shipped_at or order.created_at, order.order_amount)
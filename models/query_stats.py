@@ -0,0 +1,118 @@
+"""
+SQL 执行统计
+
+所有引擎（包括异步引擎底层的同步引擎）执行的每条语句都会计时:
+- 超过 SLOW_QUERY_THRESHOLD_MS 的语句记录慢查询日志，日志中只有语句形状（占位符和参数组数），不含参数值
+- 在 track_queries() 范围内（一次Web请求或一次定时任务）累计语句数、耗时和每种语句的执行次数，
+  范围通过 contextvars 传递，并发请求互不影响，run_in_threadpool 和异步会话中执行的语句也计入所在请求
+"""
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Iterator, Optional, Tuple
+
+from loguru import logger
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from config.settings import settings
+
+# 语句形状最多保留的字符数
+_MAX_STATEMENT_LENGTH = 500
+# IN 列表等连续的占位符折叠为 "?, ..."
+_PLACEHOLDER_RUN = re.compile(r"(\?|%s|%\(\w+\)s|:\w+)(\s*,\s*(\?|%s|%\(\w+\)s|:\w+)){3,}")
+_WHITESPACE = re.compile(r"\s+")
+
+_current: ContextVar[Optional["QueryStats"]] = ContextVar("query_stats", default=None)
+
+
+class QueryStats:
+    """一次请求或任务的SQL执行统计"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.slow = 0
+        self.statements: Counter = Counter()
+
+    def add(self, statement: str, seconds: float):
+        self.count += 1
+        self.seconds += seconds
+        self.statements[statement] += 1
+
+    def most_repeated(self) -> Optional[Tuple[str, int]]:
+        """执行次数最多的语句形状及其次数"""
+        common = self.statements.most_common(1)
+        return common[0] if common else None
+
+    def summary(self, repeated_threshold: int = 0) -> str:
+        """汇总文本，SQL 数达到 repeated_threshold 时附上执行次数最多的语句（便于发现 N+1 查询）"""
+        text = f"SQL {self.count} 条，耗时 {self.seconds * 1000:.1f} ms，慢查询 {self.slow} 条"
+        if repeated_threshold and self.count >= repeated_threshold:
+            statement, times = self.most_repeated()
+            text += f"，执行最多的语句（{times} 次）: {statement}"
+        return text
+
+
+@contextmanager
+def track_queries() -> Iterator[QueryStats]:
+    """统计范围内执行的SQL（可嵌套，内层的语句只计入内层）"""
+    stats = QueryStats()
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+def current_query_stats() -> Optional[QueryStats]:
+    """当前范围的统计，不在 track_queries() 范围内时为 None"""
+    return _current.get()
+
+
+@lru_cache(maxsize=1024)
+def statement_shape(statement: str) -> str:
+    """语句形状：合并空白、折叠连续占位符并截断"""
+    shape = _PLACEHOLDER_RUN.sub(r"\1, ...", _WHITESPACE.sub(" ", statement).strip())
+    if len(shape) > _MAX_STATEMENT_LENGTH:
+        shape = shape[:_MAX_STATEMENT_LENGTH] + "..."
+    return shape
+
+
+def parameter_shape(parameters, executemany: bool) -> str:
+    """参数形状（只有个数，不含参数值）"""
+    if executemany:
+        return f"{len(parameters)} 组参数"
+    return f"{len(parameters or ())} 个参数"
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _record_query(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    stats = _current.get()
+    if stats is not None:
+        stats.add(statement_shape(statement), elapsed)
+    threshold = settings.slow_query_threshold_ms
+    if threshold and elapsed * 1000 >= threshold:
+        if stats is not None:
+            stats.slow += 1
+        logger.warning(
+            f"慢查询 {elapsed * 1000:.1f} ms: {statement_shape(statement)}"
+            f"（{parameter_shape(parameters, executemany)}）"
+        )
+
+
+@event.listens_for(Engine, "handle_error")
+def _discard_timer(exception_context):
+    # 执行失败时不会触发 after_cursor_execute，丢弃计时
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("query_started"):
+        connection.info["query_started"].pop()
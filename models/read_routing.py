@@ -0,0 +1,345 @@
+"""
+只读查询路由
+
+Web页面和查询API的读请求可以不走主库，避免与调度器的写入争用:
+- DATABASE_READ_URL: 只读副本。主库进程定期写入心跳，副本上读到的心跳时间即复制延迟
+- SQLITE_READ_MODE=readonly: 以只读方式打开同一个SQLite文件（WAL模式下读写互不阻塞，无延迟）
+- SQLITE_READ_MODE=snapshot: 定期用 SQLite backup API 把主库复制为快照文件，延迟为快照年龄
+延迟超过 READ_MAX_STALENESS 或副本不可用时回退到主库。
+"""
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Optional
+
+from loguru import logger
+from sqlalchemy import create_engine, select
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
+
+from config.settings import settings
+from core.exceptions import DatabaseException
+from models.database import (
+    apply_sqlite_pragmas, close_async_engines, get_async_engine, get_engine, sqlite_pragmas
+)
+from models.job import JobCursor
+
+# 主库写入、副本读取的心跳游标名称
+HEARTBEAT_CURSOR = "read_replica_heartbeat"
+
+_routers: Dict[str, "ReadRouter"] = {}
+_heartbeats: Dict[str, "ReplicaHeartbeat"] = {}
+_lock = threading.Lock()
+
+
+class ReadOnlySession(Session):
+    """只读会话，每次开启事务时由路由器选择引擎"""
+    
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        return self.info["router"].engine()
+    
+    def flush(self, objects=None):
+        if self.new or self.dirty or self.deleted:
+            raise DatabaseException("只读会话不能写入数据", "READ_ONLY_SESSION")
+        super().flush(objects)
+
+
+def _sqlite_path(url: str) -> Optional[str]:
+    parsed = make_url(url)
+    if parsed.get_backend_name() != "sqlite" or not parsed.database or parsed.database == ":memory:":
+        return None
+    return os.path.abspath(parsed.database)
+
+
+def _readonly_pragmas() -> Dict[str, object]:
+    # 只读连接不能设置需要写权限的PRAGMA
+    return {
+        name: value for name, value in sqlite_pragmas().items()
+        if name not in ("journal_mode", "wal_autocheckpoint")
+    }
+
+
+def _readonly_sqlite_engine(path: str) -> Engine:
+    """以只读方式打开SQLite文件"""
+    engine = create_engine(f"sqlite:///file:{path}?mode=ro&uri=true")
+    apply_sqlite_pragmas(engine, _readonly_pragmas())
+    return engine
+
+
+def _readonly_sqlite_async_engine(path: str, pooled: bool = True) -> AsyncEngine:
+    """以只读方式打开SQLite文件（aiosqlite）；快照文件会被替换，不使用连接池"""
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///file:{path}?mode=ro&uri=true",
+        poolclass=AsyncAdaptedQueuePool if pooled else NullPool
+    )
+    apply_sqlite_pragmas(engine.sync_engine, _readonly_pragmas())
+    return engine
+
+
+class SqliteSnapshotter:
+    """定期生成SQLite主库的快照文件"""
+    
+    def __init__(self, source_path: str, snapshot_path: str, interval: float, on_refresh=None):
+        self.source_path = source_path
+        self.snapshot_path = os.path.abspath(snapshot_path)
+        self.interval = interval
+        self.on_refresh = on_refresh
+        self.refreshed_at: Optional[float] = None
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    def refresh(self):
+        """复制一份一致的快照，写入临时文件后原子替换"""
+        snapshot_dir = os.path.dirname(self.snapshot_path)
+        if snapshot_dir and not os.path.exists(snapshot_dir):
+            os.makedirs(snapshot_dir)
+        
+        tmp_path = f"{self.snapshot_path}.tmp"
+        started = time.time()
+        source = sqlite3.connect(self.source_path)
+        target = sqlite3.connect(tmp_path)
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
+        os.replace(tmp_path, self.snapshot_path)
+        
+        # 快照内容对应复制开始时的主库状态
+        self.refreshed_at = started
+        if self.on_refresh:
+            self.on_refresh()
+        logger.debug(f"SQLite只读快照已刷新: {self.snapshot_path}")
+    
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="sqlite-read-snapshot", daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+    
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"SQLite只读快照刷新失败: {e}")
+
+
+class ReadRouter:
+    """为只读查询选择引擎：副本足够新时用副本，否则回退主库"""
+    
+    def __init__(self,
+                 primary_url: str,
+                 read_url: Optional[str] = None,
+                 sqlite_mode: str = "off",
+                 max_staleness: float = 30,
+                 check_interval: float = 5):
+        self.primary_url = primary_url
+        self.primary = get_engine(primary_url)
+        self.max_staleness = max_staleness
+        self.check_interval = check_interval
+        self.mode = "off"
+        self.replica: Optional[Engine] = None
+        self.async_replica: Optional[AsyncEngine] = None
+        self.snapshotter: Optional[SqliteSnapshotter] = None
+        self._checked_at = 0.0
+        self._use_replica = False
+        self._staleness: Optional[float] = None
+        self._check_lock = threading.Lock()
+        
+        sqlite_path = _sqlite_path(primary_url)
+        sqlite_mode = (sqlite_mode or "off").lower()
+        if read_url:
+            self.mode = "replica"
+            self.replica = get_engine(read_url)
+            self.async_replica = get_async_engine(read_url)
+        elif sqlite_path and sqlite_mode == "readonly":
+            self.mode = "readonly"
+            self.replica = _readonly_sqlite_engine(sqlite_path)
+            self.async_replica = _readonly_sqlite_async_engine(sqlite_path)
+        elif sqlite_path and sqlite_mode == "snapshot":
+            self.mode = "snapshot"
+            self.snapshotter = SqliteSnapshotter(
+                sqlite_path, settings.sqlite_snapshot_path, settings.sqlite_snapshot_interval,
+                on_refresh=self._on_snapshot_refresh
+            )
+            self.replica = _readonly_sqlite_engine(self.snapshotter.snapshot_path)
+            self.async_replica = _readonly_sqlite_async_engine(self.snapshotter.snapshot_path, pooled=False)
+            self.snapshotter.refresh()
+            self.snapshotter.start()
+        
+        self.session_factory = sessionmaker(
+            class_=ReadOnlySession, autocommit=False, autoflush=False, info={"router": self}
+        )
+        
+        if self.mode != "off":
+            logger.info(f"只读查询路由已启用: {self.mode}，最大延迟 {max_staleness} 秒")
+    
+    def engine(self) -> Engine:
+        """当前只读查询应使用的引擎"""
+        if self.replica is None:
+            return self.primary
+        
+        now = time.monotonic()
+        if now - self._checked_at >= self.check_interval:
+            with self._check_lock:
+                if now - self._checked_at >= self.check_interval:
+                    self._refresh_state()
+                    self._checked_at = time.monotonic()
+        return self.replica if self._use_replica else self.primary
+    
+    def async_engine(self) -> AsyncEngine:
+        """当前只读查询应使用的异步引擎（与 engine() 的选择一致）"""
+        if self.engine() is self.primary or self.async_replica is None:
+            return get_async_engine(self.primary_url)
+        return self.async_replica
+    
+    def staleness(self) -> Optional[float]:
+        """副本延迟（秒），无法确定时返回None"""
+        if self.mode == "readonly":
+            return 0.0
+        if self.mode == "snapshot":
+            refreshed_at = self.snapshotter.refreshed_at
+            return time.time() - refreshed_at if refreshed_at else None
+        if self.mode == "replica":
+            with self.replica.connect() as conn:
+                position = conn.execute(
+                    select(JobCursor.position).where(JobCursor.name == HEARTBEAT_CURSOR)
+                ).scalar()
+            if not position:
+                return None
+            return (datetime.now() - datetime.fromisoformat(position)).total_seconds()
+        return None
+    
+    def close(self):
+        if self.snapshotter is not None:
+            self.snapshotter.stop()
+        if self.replica is not None and self.mode != "replica":
+            self.replica.dispose()
+        if self.async_replica is not None and self.mode != "replica":
+            close_async_engines([self.async_replica])
+    
+    def _refresh_state(self):
+        try:
+            staleness = self.staleness()
+        except Exception as e:
+            logger.warning(f"只读副本不可用，回退到主库: {e}")
+            staleness = None
+        
+        use_replica = staleness is not None and staleness <= self.max_staleness
+        if use_replica != self._use_replica:
+            if use_replica:
+                logger.info(f"只读查询切换到副本（延迟 {staleness:.1f} 秒）")
+            else:
+                logger.warning(f"只读副本延迟 {staleness} 秒超过上限，回退到主库")
+        self._use_replica = use_replica
+        self._staleness = staleness
+    
+    def _on_snapshot_refresh(self):
+        # 快照文件已被替换，丢弃仍指向旧文件的连接
+        if self.replica is not None:
+            self.replica.dispose()
+
+
+class ReplicaHeartbeat:
+    """在主库上定期写入心跳时间，供只读副本计算复制延迟"""
+    
+    def __init__(self, engine: Engine, interval: float):
+        self.engine = engine
+        self.interval = interval
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    def beat(self):
+        table = JobCursor.__table__
+        now = datetime.now()
+        with self.engine.begin() as conn:
+            result = conn.execute(
+                table.update()
+                .where(table.c.name == HEARTBEAT_CURSOR)
+                .values(position=now.isoformat(), updated_at=now)
+            )
+            if result.rowcount == 0:
+                conn.execute(table.insert().values(
+                    name=HEARTBEAT_CURSOR, position=now.isoformat(), updated_at=now
+                ))
+    
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="read-replica-heartbeat", daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+    
+    def _run(self):
+        while True:
+            try:
+                self.beat()
+            except Exception as e:
+                logger.error(f"写入只读副本心跳失败: {e}")
+            if self._stop_event.wait(self.interval):
+                break
+
+
+def get_read_router(url: Optional[str] = None) -> ReadRouter:
+    """获取主库对应的只读路由器（进程内共享）"""
+    url = url or settings.database_url
+    with _lock:
+        router = _routers.get(url)
+        if router is None:
+            router = ReadRouter(
+                url,
+                read_url=settings.database_read_url,
+                sqlite_mode=settings.sqlite_read_mode,
+                max_staleness=settings.read_max_staleness,
+                check_interval=settings.read_staleness_check_interval,
+            )
+            _routers[url] = router
+        return router
+
+
+def get_read_session_factory(url: Optional[str] = None) -> sessionmaker:
+    """获取只读会话工厂"""
+    return get_read_router(url).session_factory
+
+
+def start_replica_heartbeat(engine: Optional[Engine] = None) -> Optional[ReplicaHeartbeat]:
+    """配置了只读副本时，在主库上启动心跳（写库进程调用）"""
+    if not settings.database_read_url:
+        return None
+    engine = engine or get_engine()
+    url = str(engine.url)
+    with _lock:
+        heartbeat = _heartbeats.get(url)
+        if heartbeat is None:
+            heartbeat = ReplicaHeartbeat(engine, settings.read_heartbeat_interval)
+            heartbeat.start()
+            _heartbeats[url] = heartbeat
+        return heartbeat
+
+
+def dispose_read_routers():
+    """关闭所有只读路由器和心跳"""
+    with _lock:
+        for router in _routers.values():
+            router.close()
+        for heartbeat in _heartbeats.values():
+            heartbeat.stop()
+        _routers.clear()
+        _heartbeats.clear()
+
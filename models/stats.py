@@ -0,0 +1,294 @@
+"""
+统计计数模型
+
+计数器与订单、核销记录的写入在同一事务中增量维护，仪表板和日报直接读取，
+不需要扫描业务表:
+- 订单状态计数（累计桶）: orders:<订单状态>:<是否核销>，随订单插入、状态变化、删除增减
+- 事件计数（累计、小时、天桶）: 订单创建、发货、完成、核销，以及核销记录成功/失败，
+  按对应时间字段落桶，与 rebuild_stat_counters 从业务表和归档表重算的口径一致
+
+ORM 写入通过 Session 的 before_flush 钩子自动维护；
+绕过 ORM 的 Core 写入（如批量写入核销记录、批量导入订单）需调用 apply_counter_deltas。
+"""
+import re
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import (
+    Boolean, Column, Integer, String, DateTime, UniqueConstraint, column, delete, event, func, inspect, select, table
+)
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from models.database import Base
+
+
+# 计数桶类型
+BUCKET_TOTAL = "total"  # 累计
+BUCKET_HOUR = "hour"    # 按小时
+BUCKET_DAY = "day"      # 按天
+
+# 累计桶没有时间范围，统一使用该起始时间（唯一约束不能依赖NULL）
+TOTAL_BUCKET_START = datetime(1970, 1, 1)
+
+# 事件计数器名称
+ORDERS_CREATED = "orders_created"
+ORDERS_SHIPPED = "orders_shipped"
+ORDERS_FINISHED = "orders_finished"
+ORDERS_VERIFIED = "orders_verified"
+VERIFICATIONS_SUCCESS = "verifications_success"
+VERIFICATIONS_FAILED = "verifications_failed"
+
+# 事件计数器对应的订单时间字段（字段从空变为有值时计数一次）
+ORDER_EVENT_FIELDS = {
+    ORDERS_SHIPPED: "shipped_at",
+    ORDERS_FINISHED: "finished_at",
+    ORDERS_VERIFIED: "verification_time",
+}
+
+# 重建事件计数读取的订单列和核销记录列
+ORDER_EVENT_COLUMNS = ("created_at", "shipped_at", "finished_at", "verification_time")
+RECORD_EVENT_COLUMNS = ("verification_status", "created_at")
+_COLUMN_TYPES = {"verification_status": Boolean}
+
+# 按月归档表（见 models.archive），重建事件计数时一并统计
+ARCHIVE_ORDERS_TABLE = re.compile(r"^orders_archive_\d{6}$")
+ARCHIVE_RECORDS_TABLE = re.compile(r"^verification_records_archive_\d{6}$")
+
+CounterKey = Tuple[str, datetime, str]
+CounterDeltas = Dict[CounterKey, int]
+
+
+class StatCounter(Base):
+    """统计计数器"""
+    __tablename__ = "stat_counters"
+    __table_args__ = (
+        UniqueConstraint("bucket", "bucket_start", "name", name="uq_stat_counters_key"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    bucket = Column(String(8), nullable=False)  # 计数桶类型
+    bucket_start = Column(DateTime, nullable=False)  # 桶起始时间
+    name = Column(String(64), nullable=False)  # 计数器名称
+    value = Column(Integer, nullable=False, default=0, server_default="0")  # 计数值
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)  # 更新时间
+
+
+def order_state_counter(order_status: int, verification_status: Optional[bool]) -> str:
+    """订单状态计数器名称"""
+    return f"orders:{order_status}:{int(bool(verification_status))}"
+
+
+def new_counter_deltas() -> CounterDeltas:
+    return defaultdict(int)
+
+
+def add_state(deltas: CounterDeltas, name: str, amount: int = 1):
+    """累计桶计数"""
+    deltas[(BUCKET_TOTAL, TOTAL_BUCKET_START, name)] += amount
+
+
+def add_event(deltas: CounterDeltas, name: str, at: Optional[datetime], amount: int = 1):
+    """事件计数，同时计入累计、小时和天桶"""
+    at = at or datetime.now()
+    hour = at.replace(minute=0, second=0, microsecond=0)
+    deltas[(BUCKET_TOTAL, TOTAL_BUCKET_START, name)] += amount
+    deltas[(BUCKET_HOUR, hour, name)] += amount
+    deltas[(BUCKET_DAY, hour.replace(hour=0), name)] += amount
+
+
+def add_record_event(deltas: CounterDeltas, verification_status: Optional[bool],
+                     created_at: Optional[datetime], amount: int = 1):
+    """核销记录计数"""
+    name = VERIFICATIONS_SUCCESS if verification_status else VERIFICATIONS_FAILED
+    add_event(deltas, name, created_at, amount)
+
+
+def add_new_order(deltas: CounterDeltas, order_status: int, verification_status: Optional[bool],
+                  created_at: Optional[datetime], event_times: Dict[str, Optional[datetime]]):
+    """新订单的计数：订单状态计数、订单创建事件，以及已有时间字段对应的事件（键为 ORDER_EVENT_FIELDS 的字段名）"""
+    add_state(deltas, order_state_counter(order_status, verification_status))
+    add_event(deltas, ORDERS_CREATED, created_at)
+    for name, field in ORDER_EVENT_FIELDS.items():
+        if event_times.get(field) is not None:
+            add_event(deltas, name, event_times[field])
+
+
+def _upsert_statement(dialect_name: str):
+    table = StatCounter.__table__
+    if dialect_name == "sqlite":
+        stmt = sqlite.insert(table)
+    elif dialect_name == "postgresql":
+        stmt = postgresql.insert(table)
+    elif dialect_name in ("mysql", "mariadb"):
+        stmt = mysql.insert(table)
+        return stmt.on_duplicate_key_update(
+            value=table.c.value + stmt.inserted.value,
+            updated_at=stmt.inserted.updated_at
+        )
+    else:
+        return None
+    return stmt.on_conflict_do_update(
+        index_elements=["bucket", "bucket_start", "name"],
+        set_={"value": table.c.value + stmt.excluded.value, "updated_at": stmt.excluded.updated_at}
+    )
+
+
+def apply_counter_deltas(connection, deltas: CounterDeltas):
+    """在给定连接的当前事务中累加计数（按键排序写入，避免并发事务互相死锁）"""
+    now = datetime.now()
+    rows = [
+        {"bucket": bucket, "bucket_start": start, "name": name, "value": value, "updated_at": now}
+        for (bucket, start, name), value in sorted(deltas.items())
+        if value
+    ]
+    if not rows:
+        return
+    
+    stmt = _upsert_statement(connection.dialect.name)
+    if stmt is not None:
+        connection.execute(stmt, rows)
+        return
+    
+    # 不支持UPSERT的数据库：先更新，不存在时插入
+    table = StatCounter.__table__
+    for row in rows:
+        result = connection.execute(
+            table.update()
+            .where(table.c.bucket == row["bucket"])
+            .where(table.c.bucket_start == row["bucket_start"])
+            .where(table.c.name == row["name"])
+            .values(value=table.c.value + row["value"], updated_at=now)
+        )
+        if result.rowcount == 0:
+            connection.execute(table.insert().values(**row))
+
+
+def track_counter_history(*attributes):
+    """修改这些字段时先加载旧值，before_flush 才能算出计数变化"""
+    for attribute in attributes:
+        event.listen(attribute, "set", _noop_set, active_history=True)
+
+
+def _noop_set(target, value, oldvalue, initiator):
+    return value
+
+
+def _history_values(obj, key: str):
+    """返回字段 (旧值, 新值)，字段未加载时从数据库读取当前值"""
+    history = inspect(obj).attrs[key].history
+    if history.added:
+        new = history.added[0]
+    elif history.unchanged:
+        new = history.unchanged[0]
+    else:
+        new = getattr(obj, key)
+        return new, new
+    return (history.deleted[0] if history.deleted else new), new
+
+
+def _collect_session_deltas(session: Session) -> CounterDeltas:
+    from models.order import Order, OrderStatus, VerificationRecord
+    
+    deltas = new_counter_deltas()
+    for obj in session.new:
+        if isinstance(obj, Order):
+            status = obj.order_status if obj.order_status is not None else OrderStatus.UNPAID.value
+            add_new_order(deltas, status, obj.verification_status, obj.created_at,
+                          {field: getattr(obj, field) for field in ORDER_EVENT_FIELDS.values()})
+        elif isinstance(obj, VerificationRecord):
+            add_record_event(deltas, obj.verification_status, obj.created_at)
+    
+    for obj in session.dirty:
+        if not isinstance(obj, Order) or not session.is_modified(obj):
+            continue
+        old_status, new_status = _history_values(obj, "order_status")
+        old_verified, new_verified = _history_values(obj, "verification_status")
+        old_key = order_state_counter(old_status, old_verified)
+        new_key = order_state_counter(new_status, new_verified)
+        if old_key != new_key:
+            add_state(deltas, old_key, -1)
+            add_state(deltas, new_key)
+        for name, field in ORDER_EVENT_FIELDS.items():
+            old_value, new_value = _history_values(obj, field)
+            if old_value is None and new_value is not None:
+                add_event(deltas, name, new_value)
+            elif old_value is not None and new_value is None:
+                add_event(deltas, name, old_value, -1)
+    
+    for obj in session.deleted:
+        if isinstance(obj, Order):
+            old_status, _ = _history_values(obj, "order_status")
+            old_verified, _ = _history_values(obj, "verification_status")
+            add_state(deltas, order_state_counter(old_status, old_verified), -1)
+    return deltas
+
+
+@event.listens_for(Session, "before_flush")
+def _update_stat_counters(session, flush_context, instances):
+    """ORM写入订单和核销记录时，在同一事务中更新计数器"""
+    deltas = _collect_session_deltas(session)
+    if any(deltas.values()):
+        apply_counter_deltas(session.connection(), deltas)
+
+
+def rebuild_stat_counters(connection, batch_size: int = 10000, archive_connection=None) -> int:
+    """从业务表重新计算全部计数器，返回写入的计数器行数
+    
+    订单状态计数只统计业务表；事件计数还统计按月归档表中的订单和核销记录，归档后重建不会丢失日报历史。
+    archive_connection 为单独的归档库连接，为空时在 connection 所在的库中查找归档表。
+    """
+    from models.order import Order, VerificationRecord
+    
+    deltas = new_counter_deltas()
+    
+    # 订单状态计数
+    rows = connection.execute(
+        select(Order.order_status, Order.verification_status, func.count())
+        .group_by(Order.order_status, Order.verification_status)
+    )
+    for order_status, verification_status, count in rows:
+        add_state(deltas, order_state_counter(order_status, verification_status), count)
+    
+    # 事件计数按时间落桶，分批流式读取
+    _add_order_events(deltas, connection, Order.__table__, batch_size)
+    _add_record_events(deltas, connection, VerificationRecord.__table__, batch_size)
+    
+    archive_connection = archive_connection if archive_connection is not None else connection
+    for name in sorted(inspect(archive_connection).get_table_names()):
+        if ARCHIVE_ORDERS_TABLE.match(name):
+            _add_order_events(deltas, archive_connection, _event_table(name, ORDER_EVENT_COLUMNS), batch_size)
+        elif ARCHIVE_RECORDS_TABLE.match(name):
+            _add_record_events(deltas, archive_connection, _event_table(name, RECORD_EVENT_COLUMNS), batch_size)
+    
+    connection.execute(delete(StatCounter.__table__))
+    apply_counter_deltas(connection, deltas)
+    return sum(1 for value in deltas.values() if value)
+
+
+def _event_table(name: str, columns: Tuple[str, ...]):
+    """只含事件列的归档表定义（归档表不在 Base.metadata 中）"""
+    return table(name, *(column(field, _COLUMN_TYPES.get(field, DateTime)) for field in columns))
+
+
+def _add_order_events(deltas: CounterDeltas, connection, orders, batch_size: int):
+    """统计订单表（业务表或归档表）中的订单事件"""
+    order_rows = connection.execution_options(yield_per=batch_size).execute(
+        select(*(orders.c[name] for name in ORDER_EVENT_COLUMNS))
+    )
+    for created_at, shipped_at, finished_at, verification_time in order_rows:
+        add_event(deltas, ORDERS_CREATED, created_at)
+        for name, value in ((ORDERS_SHIPPED, shipped_at), (ORDERS_FINISHED, finished_at),
+                            (ORDERS_VERIFIED, verification_time)):
+            if value is not None:
+                add_event(deltas, name, value)
+
+
+def _add_record_events(deltas: CounterDeltas, connection, records, batch_size: int):
+    """统计核销记录表（业务表或归档表）中的核销事件"""
+    record_rows = connection.execution_options(yield_per=batch_size).execute(
+        select(*(records.c[name] for name in RECORD_EVENT_COLUMNS))
+    )
+    for verification_status, created_at in record_rows:
+        add_record_event(deltas, verification_status, created_at)
@@ -15,8 +15,12 @@ def reset_order_verification(order_sn):
         if order:
             print(f"重置前 - 订单: {order.order_sn}, 核销状态: {order.verification_status}")
             
-            # 重置核销状态
+            # 重置核销状态和自动核销重试计划
             order.verification_status = False
+            order.verify_attempts = 0
+            order.next_verify_at = None
+            order.last_verify_error = None
+            order.verify_dead_letter = False
             db.commit()
             
             print(f"重置后 - 订单: {order.order_sn}, 核销状态: {order.verification_status}")
@@ -0,0 +1,84 @@
+"""
+数据导出脚本
+
+按批流式读取并写出订单或核销记录，内存占用与导出行数无关。
+
+用法:
+    python scripts/export_data.py orders --start 2025-01-01 --end 2025-02-01
+    python scripts/export_data.py orders --status 4 --shop 123456 --format ndjson --gzip
+    python scripts/export_data.py records --start 2025-01-01 --end 2025-02-01 --output exports/records.csv
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.export_service import (
+    EXPORT_BATCH_SIZE, ExportService, ORDER_EXPORT_COLUMNS, VERIFICATION_RECORD_EXPORT_COLUMNS
+)
+from utils.export import EXPORT_FORMATS, encode_rows, export_filename
+from utils.logger import setup_logger
+
+
+def _parse_time(value):
+    """YYYY-MM-DD 或 ISO 格式时间"""
+    return datetime.fromisoformat(value) if value else None
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="流式导出订单或核销记录")
+    parser.add_argument("table", choices=("orders", "records"), help="导出订单或核销记录")
+    parser.add_argument("--start", help="开始时间（含），YYYY-MM-DD 或 ISO 格式")
+    parser.add_argument("--end", help="结束时间（不含），YYYY-MM-DD 或 ISO 格式")
+    parser.add_argument("--status", type=int, help="订单状态；导出核销记录时 1=成功、0=失败")
+    parser.add_argument("--shop", help="店铺ID")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="csv", help="导出格式")
+    parser.add_argument("--gzip", action="store_true", help="gzip 压缩")
+    parser.add_argument("--batch-size", type=int, default=EXPORT_BATCH_SIZE, help="每批读取行数")
+    parser.add_argument("--output", help="输出文件路径，默认 exports/<表名>_<时间>.<格式>")
+    args = parser.parse_args()
+    
+    setup_logger()
+    
+    start_time, end_time = _parse_time(args.start), _parse_time(args.end)
+    service = ExportService(read_only=True)
+    if args.table == "orders":
+        name, columns = "orders", ORDER_EXPORT_COLUMNS
+        rows = service.iter_orders(start_time, end_time, status=args.status, shop_id=args.shop,
+                                   batch_size=args.batch_size)
+    else:
+        name, columns = "verification_records", VERIFICATION_RECORD_EXPORT_COLUMNS
+        verification_status = None if args.status is None else bool(args.status)
+        rows = service.iter_verification_records(start_time, end_time, verification_status=verification_status,
+                                                 shop_id=args.shop, batch_size=args.batch_size)
+    
+    output = args.output or os.path.join("exports", export_filename(name, args.format, args.gzip))
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    
+    count = 0
+    
+    def counted(iterator):
+        nonlocal count
+        for row in iterator:
+            count += 1
+            yield row
+    
+    started = time.perf_counter()
+    try:
+        with open(output, "wb") as file:
+            for chunk in encode_rows(counted(rows), columns, args.format, args.gzip):
+                file.write(chunk)
+    finally:
+        service.close()
+    
+    elapsed = time.perf_counter() - started
+    print(f"导出 {count} 行到 {output}，耗时 {elapsed:.1f} 秒")
+
+
+if __name__ == "__main__":
+    main()
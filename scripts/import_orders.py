@@ -0,0 +1,90 @@
+"""
+订单批量导入脚本
+
+从旧系统导出的 NDJSON / CSV（可为 .gz）批量导入历史订单，或生成压测用的模拟订单。
+已存在的订单号跳过，同一文件可以重复执行。
+
+用法:
+    python scripts/import_orders.py orders.ndjson
+    python scripts/import_orders.py orders.csv.gz --batch-size 10000 --defer-indexes
+    python scripts/import_orders.py --generate 1000000 --defer-indexes      # 生成压测订单
+"""
+import argparse
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.order import OrderStatus, VIRTUAL_GOODS_TYPES
+from services.import_service import IMPORT_BATCH_SIZE, IMPORT_FORMATS, OrderImportService
+from utils.logger import setup_logger
+
+
+def generate_orders(count: int, prefix: str = "LOAD"):
+    """生成模拟订单（近一年内，终态订单居多）"""
+    start = datetime.now() - timedelta(days=365)
+    statuses = [OrderStatus.FINISHED.value] * 6 + [OrderStatus.SHIPPED.value] * 2 + [
+        OrderStatus.PAID.value, OrderStatus.REFUNDED.value
+    ]
+    for i in range(count):
+        created_at = start + timedelta(seconds=i * 365 * 86400 // max(count, 1))
+        status = random.choice(statuses)
+        amount = round(random.uniform(10, 100), 2)
+        shipped_at = created_at + timedelta(minutes=5) if status != OrderStatus.PAID.value else None
+        verified = status == OrderStatus.FINISHED.value
+        yield {
+            "order_sn": f"{prefix}{i:012d}",
+            "buyer_id": f"buyer_{i % 100000}",
+            "buyer_name": f"买家{i % 100000}",
+            "order_status": status,
+            "order_amount": amount,
+            "pay_time": created_at,
+            "shipped_at": shipped_at,
+            "finished_at": created_at + timedelta(days=1) if verified else None,
+            "verification_status": verified,
+            "verification_time": created_at + timedelta(days=1) if verified else None,
+            "verification_code": f"{prefix}{i:012d}",
+            "goods_list": [{
+                "goods_id": f"goods_{i % 50}",
+                "goods_name": f"虚拟商品{i % 50}",
+                "goods_type": random.choice(VIRTUAL_GOODS_TYPES),
+                "quantity": 1,
+                "price": amount,
+            }],
+            "created_at": created_at,
+        }
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="批量导入历史订单")
+    parser.add_argument("path", nargs="?", help="导入文件（.ndjson / .csv，可加 .gz）")
+    parser.add_argument("--format", choices=IMPORT_FORMATS, help="文件格式，默认按扩展名判断")
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE, help="每批插入行数")
+    parser.add_argument("--defer-indexes", action="store_true", help="导入期间删除非唯一索引，完成后重建")
+    parser.add_argument("--generate", type=int, help="不读取文件，生成指定数量的模拟订单")
+    args = parser.parse_args()
+    if not args.path and not args.generate:
+        parser.error("需要指定导入文件或 --generate")
+    
+    setup_logger()
+    
+    service = OrderImportService(batch_size=args.batch_size)
+    try:
+        if args.generate:
+            result = service.import_rows(generate_orders(args.generate), defer_indexes=args.defer_indexes)
+        else:
+            result = service.import_file(args.path, args.format, defer_indexes=args.defer_indexes)
+    finally:
+        service.close()
+    
+    print(f"读取 {result['read']} 行，插入 {result['inserted']}，重复跳过 {result['duplicates']}，"
+          f"无效 {result['invalid']}，商品明细 {result['items']}")
+    print(f"耗时 {result['seconds']} 秒，{result['rows_per_second']} 行/秒")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+"""
+重建统计计数脚本
+
+从订单和核销记录（包括按月归档表）重新计算 stat_counters 中的全部计数器，
+用于计数器与业务数据不一致时（如直接改库、导入数据后）校正。
+
+用法:
+    python scripts/rebuild_stats.py
+"""
+import os
+import sys
+import time
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.stats_service import StatsService
+from utils.logger import setup_logger
+
+
+def main():
+    """主函数"""
+    setup_logger()
+    
+    stats_service = StatsService()
+    try:
+        start = time.perf_counter()
+        count = stats_service.rebuild_counters()
+        print(f"统计计数重建完成: {count} 个计数器，耗时 {time.perf_counter() - start:.2f} 秒")
+    finally:
+        stats_service.close()
+
+
+if __name__ == "__main__":
+    main()
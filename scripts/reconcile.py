@@ -0,0 +1,53 @@
+"""
+核销对账脚本
+
+用法:
+    python scripts/reconcile.py                       # 对账最近1天
+    python scripts/reconcile.py --days 90 --repair    # 对账最近90天并修复本地数据
+    python scripts/reconcile.py --start 2025-01-01 --end 2025-04-01 --output reports/q1.ndjson
+"""
+import argparse
+import os
+import sys
+from datetime import datetime, timedelta
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.reconciliation import VerificationReconciler
+from utils.logger import setup_logger
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="比对平台核销记录与本地核销状态")
+    parser.add_argument("--start", help="开始日期 YYYY-MM-DD")
+    parser.add_argument("--end", help="结束日期 YYYY-MM-DD（不含）")
+    parser.add_argument("--days", type=int, default=1, help="未指定开始日期时，对账最近N天")
+    parser.add_argument("--window-hours", type=int, help="对账窗口小时数")
+    parser.add_argument("--repair", action="store_true", help="按平台结果修复本地数据")
+    parser.add_argument("--output", help="差异报告文件路径")
+    args = parser.parse_args()
+    
+    setup_logger()
+    
+    end_time = datetime.strptime(args.end, "%Y-%m-%d") if args.end else datetime.now()
+    if args.start:
+        start_time = datetime.strptime(args.start, "%Y-%m-%d")
+    else:
+        start_time = end_time - timedelta(days=args.days)
+    
+    reconciler = VerificationReconciler(window_hours=args.window_hours)
+    try:
+        summary = reconciler.reconcile(start_time, end_time, repair=args.repair, report_file=args.output)
+    finally:
+        reconciler.close()
+    
+    print(f"对账区间: {summary['start_time']} - {summary['end_time']}")
+    print(f"平台记录: {summary['remote_records']}，本地已核销订单: {summary['local_orders']}")
+    print(f"一致: {summary['matched']}，差异: {summary['diffs']}，已修复: {summary['repaired']}")
+    print(f"差异报告: {summary['report_file']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -43,8 +43,8 @@ def setup_test_environment():
     # 初始化数据库
     print("初始化数据库...")
     try:
-        from models.database import engine, Base
-        Base.metadata.create_all(bind=engine)
+        from models.database import init_database
+        init_database()
         print("✓ 数据库初始化完成")
     except Exception as e:
         print(f"✗ 数据库初始化失败: {e}")
@@ -14,6 +14,8 @@ from config.settings import settings
 from utils.test_data_generator import TestDataGenerator
 from core.order_manager import OrderManager
 from core.verification import VirtualGoodsVerifier
+from models.order import OrderStatus
+from services.order_service import OrderService
 from utils.logger import setup_logger
 
 
@@ -73,8 +75,10 @@ class TestModeRunner:
         logger.info("开始测试核销功能")
         
         try:
-            # 获取未核销的订单
-            unverified_orders = self.verifier.verification_service.get_unverified_orders()
+            # 获取未核销的订单（测试前3个）
+            unverified_orders = OrderService(self.verifier.verification_service.db).list_orders(
+                page_size=3, status=OrderStatus.SHIPPED.value, verification_status=False
+            ).items
             logger.info(f"获取到 {len(unverified_orders)} 个未核销订单")
             
             # 测试单个核销
@@ -0,0 +1,150 @@
+"""
+订单归档服务模块
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from loguru import logger
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+
+from config.settings import settings
+from models.archive import OrderArchiveIndex, archive_month, ensure_archive_tables
+from models.cache_invalidation import CACHE_ORDER, CACHE_STATS, DASHBOARD_STATS_KEY, invalidate_after_commit
+from models.database import get_engine
+from models.order import Order, OrderItem, OrderStatus, VerificationRecord
+from models.stats import add_state, apply_counter_deltas, new_counter_deltas, order_state_counter
+from core.exceptions import DatabaseException
+from services.base import BaseService
+
+# 可以归档的订单状态（终态）
+ARCHIVABLE_STATUSES = (
+    OrderStatus.FINISHED.value,
+    OrderStatus.CANCELLED.value,
+    OrderStatus.REFUNDED.value,
+)
+
+# (结果计数键, 业务表)，顺序与 archive_tables() 返回的归档表一致
+ORDER_TABLES = (
+    ("orders", Order.__table__),
+    ("records", VerificationRecord.__table__),
+    ("items", OrderItem.__table__),
+)
+
+
+class ArchiveService(BaseService):
+    """订单归档服务
+
+    每批订单在一个事务中完成: 连同核销记录和商品明细复制到归档表、写入归档索引、从业务表删除，并扣减订单状态计数
+    （事件计数保留，日报历史不受影响；重建计数时事件计数也统计归档表）。配置了单独的归档库时，归档库先提交，
+    主库事务失败后重新执行会覆盖归档库中已复制的同一批数据，不会重复。
+    """
+
+    def __init__(self, db: Optional[Session] = None, archive_url: Optional[str] = None):
+        super().__init__(db)
+        archive_url = archive_url or settings.archive_database_url
+        self.archive_engine = get_engine(archive_url) if archive_url else None
+
+    def archive_orders(self,
+                       older_than_days: Optional[int] = None,
+                       batch_size: Optional[int] = None,
+                       max_batches: int = 0) -> Dict[str, int]:
+        """归档超过指定天数的终态订单及其核销记录、商品明细，返回各自的归档行数和批次数"""
+        older_than_days = settings.archive_after_days if older_than_days is None else older_than_days
+        batch_size = batch_size or settings.archive_batch_size
+        result = {"orders": 0, "records": 0, "items": 0, "batches": 0}
+        if older_than_days <= 0:
+            logger.info("未启用订单归档（ARCHIVE_AFTER_DAYS=0）")
+            return result
+
+        cutoff = datetime.now() - timedelta(days=older_than_days)
+        logger.info(f"开始归档 {cutoff:%Y-%m-%d %H:%M:%S} 之前的终态订单")
+        while True:
+            counts = self._archive_batch(cutoff, batch_size)
+            if counts["orders"] == 0:
+                break
+            for key, count in counts.items():
+                result[key] += count
+            result["batches"] += 1
+            if counts["orders"] < batch_size or (max_batches and result["batches"] >= max_batches):
+                break
+
+        logger.info(
+            f"订单归档完成: {result['orders']} 个订单，{result['records']} 条核销记录，"
+            f"{result['items']} 条商品明细，{result['batches']} 批"
+        )
+        return result
+
+    def _archive_batch(self, cutoff: datetime, batch_size: int) -> Dict[str, int]:
+        orders_table = Order.__table__
+        try:
+            # 状态+创建时间走 ix_orders_status_verified_created，再按完成/更新时间过滤
+            orders = self.db.execute(
+                select(orders_table).where(
+                    orders_table.c.order_status.in_(ARCHIVABLE_STATUSES),
+                    orders_table.c.created_at < cutoff,
+                    func.coalesce(orders_table.c.finished_at, orders_table.c.updated_at) < cutoff,
+                ).order_by(orders_table.c.id).limit(batch_size)
+            ).mappings().all()
+            if not orders:
+                return {"orders": 0}
+
+            # 核销记录和商品明细跟随订单，按订单创建月份分组
+            order_sns = [row["order_sn"] for row in orders]
+            months = {row["order_sn"]: archive_month(row["created_at"]) for row in orders}
+            rows_by_table = {"orders": orders}
+            for key, table in ORDER_TABLES[1:]:
+                rows_by_table[key] = self.db.execute(
+                    select(table).where(table.c.order_sn.in_(order_sns))
+                ).mappings().all()
+
+            grouped: Dict[str, List[List[dict]]] = defaultdict(lambda: [[] for _ in ORDER_TABLES])
+            for position, (key, _) in enumerate(ORDER_TABLES):
+                for row in rows_by_table[key]:
+                    grouped[months[row["order_sn"]]][position].append(dict(row))
+
+            if self.archive_engine is None:
+                self._copy_to_archive(self.db.connection(), grouped)
+            else:
+                with self.archive_engine.begin() as archive_connection:
+                    self._copy_to_archive(archive_connection, grouped)
+
+            index_table = OrderArchiveIndex.__table__
+            archived_at = datetime.now()
+            self.db.execute(delete(index_table).where(index_table.c.order_sn.in_(order_sns)))
+            self.db.execute(insert(index_table), [
+                {"order_sn": order_sn, "archive_month": month, "archived_at": archived_at}
+                for order_sn, month in months.items()
+            ])
+            # 先删子表，最后删订单
+            for key, table in reversed(ORDER_TABLES):
+                rows = rows_by_table[key]
+                if rows:
+                    self.db.execute(delete(table).where(table.c.id.in_([row["id"] for row in rows])))
+
+            deltas = new_counter_deltas()
+            for row in orders:
+                add_state(deltas, order_state_counter(row["order_status"], row["verification_status"]), -1)
+            apply_counter_deltas(self.db.connection(), deltas)
+
+            # Core 写入不触发 ORM 事件，提交后删除订单详情和统计缓存
+            invalidate_after_commit(self.db, CACHE_ORDER, order_sns)
+            invalidate_after_commit(self.db, CACHE_STATS, [DASHBOARD_STATS_KEY])
+            self.db.commit()
+            return {key: len(rows) for key, rows in rows_by_table.items()}
+        except Exception as e:
+            self.db.rollback()
+            raise DatabaseException(f"归档订单失败: {e}")
+
+    @staticmethod
+    def _copy_to_archive(connection, grouped: Dict[str, List[List[dict]]]):
+        """写入按月归档表（先按主键删除，重复执行时不会产生重复行）"""
+        for month, rows_per_table in grouped.items():
+            for archive_table, rows in zip(ensure_archive_tables(connection, month), rows_per_table):
+                if not rows:
+                    continue
+                connection.execute(delete(archive_table).where(
+                    archive_table.c.id.in_([row["id"] for row in rows])
+                ))
+                connection.execute(insert(archive_table), rows)
@@ -0,0 +1,217 @@
+"""
+异步数据库服务模块
+
+供 FastAPI 异步处理函数直接 await 的查询服务，基于 AsyncSession（SQLite 使用 aiosqlite），
+查询不再占用线程池，也不会阻塞事件循环。筛选条件和统计整理逻辑与同步服务共用。
+"""
+from contextlib import asynccontextmanager
+from datetime import date, datetime
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config.settings import settings
+from models.archive import get_order_archive
+from models.cache_invalidation import CACHE_ORDER, CACHE_STATS, DASHBOARD_STATS_KEY
+from models.database import ensure_schema, get_async_engine, get_engine
+from models.list_rows import (
+    ORDER_LIST_COLUMNS, VERIFICATION_RECORD_LIST_COLUMNS, order_list_rows, verification_record_list_rows
+)
+from models.order import Order, OrderItem, VerificationRecord
+from models.read_routing import get_read_router
+from core.exceptions import DatabaseException, PddAutoVerifyException
+from services.order_service import (
+    ORDER_STATS_STATEMENT, goods_sales_statement, order_list_filters, summarize_goods_sales,
+    summarize_order_stats
+)
+from services.stats_service import (
+    DASHBOARD_COUNTERS_STATEMENT, daily_report_statements, summarize_daily_report,
+    summarize_dashboard_counters
+)
+from services.verification_service import (
+    VERIFICATION_STATS_STATEMENT, summarize_verification_stats, verification_record_filters
+)
+from utils.cache import get_cache
+from utils.pagination import Page, apply_keyset, to_page
+
+
+class AsyncBaseService:
+    """异步数据库服务基类
+    
+    未传入会话时每次调用创建一个短生命周期的 AsyncSession，用完立即归还连接，
+    同一个服务实例可以被并发的请求共享；传入的会话由调用方负责关闭。
+    read_only=True 时每次调用由只读路由选择副本或主库。
+    """
+    
+    def __init__(self, session: Optional[AsyncSession] = None, read_only: bool = False):
+        ensure_schema(get_engine())
+        self.read_only = read_only
+        self.session = session
+    
+    def _bind(self):
+        if self.read_only:
+            return get_read_router().async_engine()
+        return get_async_engine()
+    
+    @asynccontextmanager
+    async def session_scope(self) -> AsyncIterator[AsyncSession]:
+        """获取本次调用使用的会话"""
+        if self.session is not None:
+            yield self.session
+            return
+        async with AsyncSession(self._bind(), expire_on_commit=False) as session:
+            yield session
+
+
+class AsyncOrderService(AsyncBaseService):
+    """异步订单查询服务"""
+    
+    async def get_order_by_sn(self, order_sn: str, include_archive: bool = True) -> Optional[Order]:
+        """根据订单号获取订单（业务表中没有时查找已归档订单）"""
+        try:
+            async with self.session_scope() as session:
+                result = await session.execute(select(Order).where(Order.order_sn == order_sn).limit(1))
+                order = result.scalars().first()
+                if order is None and include_archive:
+                    order = await session.run_sync(
+                        lambda sync_session: get_order_archive().load_order(sync_session.connection(), order_sn)
+                    )
+                return order
+        except Exception as e:
+            raise DatabaseException(f"获取订单失败: {e}")
+    
+    async def get_order_detail(self, order_sn: str) -> Optional[Dict[str, Any]]:
+        """订单详情（订单字段、是否已归档和商品明细），结果按订单号缓存，订单写入提交后失效"""
+        cache = get_cache()
+        detail = await cache.get_async(CACHE_ORDER, order_sn)
+        if detail is not None:
+            return detail
+        
+        order = await self.get_order_by_sn(order_sn)
+        if order is None:
+            return None
+        try:
+            async with self.session_scope() as session:
+                items = (await session.execute(
+                    select(OrderItem).where(OrderItem.order_sn == order_sn).order_by(OrderItem.id)
+                )).scalars().all()
+        except Exception as e:
+            raise DatabaseException(f"获取订单商品明细失败: {e}")
+        detail = order.to_dict()
+        detail["archived"] = bool(getattr(order, "archived", False))
+        detail["items"] = [item.to_dict() for item in items]
+        await cache.set_async(CACHE_ORDER, order_sn, detail, settings.cache_order_ttl)
+        return detail
+    
+    async def list_orders(self,
+                          cursor: Optional[str] = None,
+                          page_size: int = 20,
+                          status: Optional[int] = None,
+                          verification_status: Optional[bool] = None,
+                          order_sn: Optional[str] = None,
+                          goods_id: Optional[str] = None,
+                          goods_type: Optional[int] = None) -> Page:
+        """按创建时间倒序分页获取订单（键集分页，返回 OrderListRow）"""
+        try:
+            statement = apply_keyset(
+                select(*ORDER_LIST_COLUMNS).where(
+                    *order_list_filters(status, verification_status, order_sn, goods_id, goods_type)
+                ),
+                Order.created_at, Order.id, cursor, page_size
+            )
+            async with self.session_scope() as session:
+                rows = (await session.execute(statement)).all()
+            return to_page(order_list_rows(rows), page_size)
+        except PddAutoVerifyException:
+            raise
+        except Exception as e:
+            raise DatabaseException(f"获取订单列表失败: {e}")
+    
+    async def get_order_stats(self) -> Dict[str, Any]:
+        """统计订单数（一次 GROUP BY 聚合）"""
+        try:
+            async with self.session_scope() as session:
+                rows = (await session.execute(ORDER_STATS_STATEMENT)).all()
+        except Exception as e:
+            raise DatabaseException(f"统计订单失败: {e}")
+        return summarize_order_stats(rows)
+    
+    async def get_goods_sales(self,
+                              start_time: Optional[datetime] = None,
+                              end_time: Optional[datetime] = None,
+                              goods_type: Optional[int] = None,
+                              limit: int = 50) -> List[Dict[str, Any]]:
+        """按商品统计销量"""
+        try:
+            async with self.session_scope() as session:
+                rows = (await session.execute(goods_sales_statement(start_time, end_time, goods_type, limit))).all()
+        except Exception as e:
+            raise DatabaseException(f"统计商品销量失败: {e}")
+        return summarize_goods_sales(rows)
+
+
+class AsyncVerificationService(AsyncBaseService):
+    """异步核销记录查询服务"""
+    
+    async def list_verification_records(self,
+                                        cursor: Optional[str] = None,
+                                        page_size: int = 20,
+                                        order_sn: Optional[str] = None,
+                                        start_time: Optional[str] = None,
+                                        end_time: Optional[str] = None,
+                                        verification_status: Optional[bool] = None) -> Page:
+        """按创建时间倒序分页获取核销记录（键集分页，返回 VerificationRecordListRow）"""
+        try:
+            statement = apply_keyset(
+                select(*VERIFICATION_RECORD_LIST_COLUMNS).where(*verification_record_filters(
+                    order_sn, start_time, end_time, verification_status
+                )),
+                VerificationRecord.created_at, VerificationRecord.id, cursor, page_size
+            )
+            async with self.session_scope() as session:
+                rows = (await session.execute(statement)).all()
+            return to_page(verification_record_list_rows(rows), page_size)
+        except PddAutoVerifyException:
+            raise
+        except Exception as e:
+            raise DatabaseException(f"获取核销记录失败: {e}")
+    
+    async def get_verification_stats(self) -> Dict[str, int]:
+        """统计核销记录数（按核销状态一次 GROUP BY）"""
+        try:
+            async with self.session_scope() as session:
+                rows = (await session.execute(VERIFICATION_STATS_STATEMENT)).all()
+        except Exception as e:
+            raise DatabaseException(f"统计核销记录失败: {e}")
+        return summarize_verification_stats(rows)
+
+
+class AsyncStatsService(AsyncBaseService):
+    """异步统计服务（读取增量维护的计数器）"""
+    
+    async def get_dashboard_stats(self) -> Dict[str, Any]:
+        """仪表板统计（缓存 CACHE_STATS_TTL 秒，订单和核销记录写入提交后失效）"""
+        cache = get_cache()
+        stats = await cache.get_async(CACHE_STATS, DASHBOARD_STATS_KEY)
+        if stats is not None:
+            return stats
+        try:
+            async with self.session_scope() as session:
+                rows = (await session.execute(DASHBOARD_COUNTERS_STATEMENT)).all()
+        except Exception as e:
+            raise DatabaseException(f"获取统计计数失败: {e}")
+        stats = summarize_dashboard_counters(rows)
+        await cache.set_async(CACHE_STATS, DASHBOARD_STATS_KEY, stats, settings.cache_stats_ttl)
+        return stats
+    
+    async def get_daily_report(self, day: date) -> Dict[str, Any]:
+        """日报统计（当天的天桶和24个小时桶）"""
+        day_statement, hour_statement = daily_report_statements(day)
+        try:
+            async with self.session_scope() as session:
+                day_rows = (await session.execute(day_statement)).all()
+                hour_rows = (await session.execute(hour_statement)).all()
+        except Exception as e:
+            raise DatabaseException(f"获取日报统计失败: {e}")
+        return summarize_daily_report(day, day_rows, hour_rows)
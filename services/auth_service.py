@@ -4,21 +4,13 @@
 from datetime import datetime, timedelta
 from typing import Optional
 
-from sqlalchemy import create_engine, desc
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import desc
 
-from config.settings import settings
-from models.database import Base
 from models.auth import ShopAuth
+from services.base import BaseService
 
 
-class AuthService:
-    def __init__(self) -> None:
-        self.engine = create_engine(settings.database_url)
-        Base.metadata.create_all(bind=self.engine)
-        SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
-        self.db = SessionLocal()
-
+class AuthService(BaseService):
     def get_active_auth(self) -> Optional[ShopAuth]:
         return (
             self.db.query(ShopAuth)
@@ -59,8 +51,3 @@ class AuthService:
     def deactivate_all(self) -> None:
         self.db.query(ShopAuth).update({ShopAuth.is_active: False})
         self.db.commit()
-
-    def close(self) -> None:
-        self.db.close()
-
-
@@ -0,0 +1,40 @@
+"""
+数据库服务基类
+"""
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from models.database import ensure_schema, get_engine, get_session_factory
+from models.read_routing import get_read_session_factory
+
+
+class BaseService:
+    """数据库服务基类
+    
+    所有服务共享进程级的引擎和连接池，表结构在进程内只检查一次。
+    未传入会话时由服务自行创建并在 close() 时关闭；传入的会话由调用方负责关闭。
+    read_only=True 时会话只用于查询，由只读路由选择副本或主库，写入会被拒绝。
+    """
+    
+    def __init__(self, db: Optional[Session] = None, read_only: bool = False):
+        self.engine = get_engine()
+        ensure_schema(self.engine)
+        self.read_only = read_only
+        self._owns_session = db is None
+        if db is not None:
+            self.db = db
+        elif read_only:
+            self.db = get_read_session_factory()()
+        else:
+            self.db = get_session_factory()()
+    
+    def end_read(self):
+        """结束只读会话当前的事务并归还连接，下次查询重新选择副本或主库"""
+        if self.read_only:
+            self.db.rollback()
+    
+    def close(self):
+        """关闭数据库连接"""
+        if self._owns_session:
+            self.db.close()
@@ -0,0 +1,96 @@
+"""
+数据导出服务模块
+
+按 (created_at, id) 正序分批读取订单和核销记录，每批一次键集查询、只取导出列，
+不经过 ORM 会话的身份映射，导出几百万行时内存占用保持平稳。
+"""
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+from sqlalchemy import select, tuple_
+
+from models.order import Order, VerificationRecord
+from core.exceptions import DatabaseException
+from services.base import BaseService
+
+# 导出列（不含核销码、发货内容等敏感字段）
+ORDER_EXPORT_COLUMNS = (
+    "id", "order_sn", "shop_id", "buyer_id", "buyer_name", "order_status", "order_amount",
+    "pay_time", "shipped_at", "received_at", "finished_at",
+    "verification_status", "verification_time", "created_at", "updated_at",
+)
+VERIFICATION_RECORD_EXPORT_COLUMNS = (
+    "id", "order_sn", "verification_status", "verification_time",
+    "verification_method", "verification_result", "created_at",
+)
+
+EXPORT_BATCH_SIZE = 1000
+
+
+class ExportService(BaseService):
+    """数据导出服务（建议以 read_only=True 创建，每批查询后归还连接）"""
+    
+    def iter_orders(self,
+                    start_time: Optional[datetime] = None,
+                    end_time: Optional[datetime] = None,
+                    status: Optional[int] = None,
+                    shop_id: Optional[str] = None,
+                    batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[Dict[str, Any]]:
+        """按创建时间正序逐行产出订单（end_time 不含）"""
+        table = Order.__table__
+        filters = self._time_filters(table, start_time, end_time)
+        if status is not None:
+            filters.append(table.c.order_status == status)
+        if shop_id:
+            filters.append(table.c.shop_id == shop_id)
+        return self._iter_rows(table, ORDER_EXPORT_COLUMNS, filters, batch_size)
+    
+    def iter_verification_records(self,
+                                  start_time: Optional[datetime] = None,
+                                  end_time: Optional[datetime] = None,
+                                  verification_status: Optional[bool] = None,
+                                  shop_id: Optional[str] = None,
+                                  batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[Dict[str, Any]]:
+        """按创建时间正序逐行产出核销记录（end_time 不含），店铺按所属订单筛选"""
+        table = VerificationRecord.__table__
+        filters = self._time_filters(table, start_time, end_time)
+        if verification_status is not None:
+            filters.append(table.c.verification_status == verification_status)
+        if shop_id:
+            orders = Order.__table__
+            filters.append(table.c.order_sn.in_(
+                select(orders.c.order_sn).where(orders.c.shop_id == shop_id)
+            ))
+        return self._iter_rows(table, VERIFICATION_RECORD_EXPORT_COLUMNS, filters, batch_size)
+    
+    @staticmethod
+    def _time_filters(table, start_time: Optional[datetime], end_time: Optional[datetime]) -> List:
+        filters = []
+        if start_time:
+            filters.append(table.c.created_at >= start_time)
+        if end_time:
+            filters.append(table.c.created_at < end_time)
+        return filters
+    
+    def _iter_rows(self, table, columns, filters: List, batch_size: int) -> Iterator[Dict[str, Any]]:
+        statement = select(*[table.c[name] for name in columns]).where(*filters).order_by(
+            table.c.created_at, table.c.id
+        ).limit(batch_size)
+        last_key = None
+        while True:
+            batch_statement = statement
+            if last_key is not None:
+                batch_statement = statement.where(tuple_(table.c.created_at, table.c.id) > tuple_(*last_key))
+            try:
+                rows = self.db.execute(batch_statement).mappings().all()
+            except Exception as e:
+                raise DatabaseException(f"导出 {table.name} 失败: {e}")
+            finally:
+                # 批与批之间不持有读事务，长时间导出不阻塞 WAL 检查点
+                self.end_read()
+            
+            for row in rows:
+                yield dict(row)
+            if len(rows) < batch_size:
+                return
+            last_key = (rows[-1]["created_at"], rows[-1]["id"])
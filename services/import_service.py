@@ -0,0 +1,287 @@
+"""
+订单批量导入服务模块
+
+流式读取 NDJSON 或 CSV（可为 .gz），逐行校验后按批插入，每批一个事务:
+- 订单号或核销码已存在的行跳过（ON CONFLICT DO NOTHING），重复执行同一文件不会产生重复订单
+- 商品明细和统计计数只按实际插入的订单写入
+- 可选在导入期间删除订单表的非唯一索引，导入完成后重建
+
+内存占用只与批大小有关，与文件行数无关。
+"""
+import csv
+import gzip
+import io
+import json
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, TextIO
+
+from loguru import logger
+from sqlalchemy import insert, select
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from models.cache_invalidation import CACHE_STATS, DASHBOARD_STATS_KEY, invalidate_after_commit
+from models.database import sqlite_pragmas
+from models.order import Order, OrderItem, OrderStatus, order_item_values, parse_goods_list
+from models.stats import ORDER_EVENT_FIELDS, add_new_order, apply_counter_deltas, new_counter_deltas
+from core.exceptions import DatabaseException
+from core.priority import compute_verify_priority
+from services.base import BaseService
+
+IMPORT_FORMATS = ("ndjson", "csv")
+IMPORT_BATCH_SIZE = 5000
+
+# 可导入的订单字段（其余字段忽略，如导出文件中的 id）
+_REQUIRED_FIELDS = ("order_sn", "buyer_id", "buyer_name", "order_status", "order_amount")
+_TIME_FIELDS = ("pay_time", "shipped_at", "received_at", "finished_at", "verification_time",
+                "created_at", "updated_at")
+_TEXT_FIELDS = ("shop_id", "delivery_info", "verification_code")
+
+# 导入错误日志最多记录的条数
+_MAX_LOGGED_ERRORS = 20
+
+
+def open_import_file(path: str) -> TextIO:
+    """以文本方式打开导入文件，.gz 结尾时解压读取"""
+    if path.endswith(".gz"):
+        return io.TextIOWrapper(gzip.open(path, "rb"), encoding="utf-8-sig", newline="")
+    return open(path, "r", encoding="utf-8-sig", newline="")
+
+
+def detect_format(path: str) -> str:
+    """按扩展名判断导入格式"""
+    name = path[:-3] if path.endswith(".gz") else path
+    return "csv" if name.endswith(".csv") else "ndjson"
+
+
+def iter_import_rows(stream: TextIO, fmt: str) -> Iterator[Any]:
+    """逐行产出原始行（NDJSON 解析失败的行原样产出字符串，由校验计为无效行）"""
+    if fmt == "csv":
+        yield from csv.DictReader(stream)
+        return
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield line
+
+
+def _blank(value: Any) -> bool:
+    return value is None or (isinstance(value, str) and value.strip() == "")
+
+
+def _parse_bool(value: Any) -> bool:
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return bool(value)
+    text = str(value).strip().lower()
+    if text in ("1", "true", "yes", "y", "t"):
+        return True
+    if text in ("0", "false", "no", "n", "f", ""):
+        return False
+    raise ValueError(f"无效的布尔值: {value}")
+
+
+def validate_order_row(raw: Any) -> Dict[str, Any]:
+    """校验并转换一行导入数据，返回 orders 行（附带 _goods 商品列表），无效时抛出 ValueError"""
+    if not isinstance(raw, dict):
+        raise ValueError("不是 JSON 对象")
+    missing = [field for field in _REQUIRED_FIELDS if _blank(raw.get(field))]
+    if missing:
+        raise ValueError(f"缺少字段: {', '.join(missing)}")
+
+    row: Dict[str, Any] = {
+        "order_sn": str(raw["order_sn"]).strip(),
+        "buyer_id": str(raw["buyer_id"]),
+        "buyer_name": str(raw["buyer_name"]),
+    }
+    try:
+        row["order_status"] = int(raw["order_status"])
+        OrderStatus(row["order_status"])
+    except ValueError:
+        raise ValueError(f"无效的订单状态: {raw['order_status']}")
+    try:
+        row["order_amount"] = float(raw["order_amount"])
+    except (TypeError, ValueError):
+        raise ValueError(f"无效的订单金额: {raw['order_amount']}")
+
+    for field in _TIME_FIELDS:
+        value = raw.get(field)
+        if _blank(value):
+            row[field] = None
+        elif isinstance(value, datetime):
+            row[field] = value
+        else:
+            try:
+                row[field] = datetime.fromisoformat(str(value).strip())
+            except ValueError:
+                raise ValueError(f"无效的时间 {field}: {value}")
+    for field in _TEXT_FIELDS:
+        value = raw.get(field)
+        row[field] = None if _blank(value) else str(value)
+    row["verification_status"] = _parse_bool(raw.get("verification_status") or False)
+
+    now = datetime.now()
+    row["created_at"] = row["created_at"] or row["pay_time"] or now
+    row["updated_at"] = row["updated_at"] or now
+    if row["order_status"] == OrderStatus.SHIPPED.value and not row["verification_status"]:
+        row["verify_priority"] = compute_verify_priority(row["shipped_at"], row["order_amount"])
+    else:
+        row["verify_priority"] = None
+
+    # 商品列表可以是 goods_list（JSON 数组或其文本），也可以是 goods_info 文本
+    goods = raw.get("goods_list")
+    if _blank(goods):
+        goods = raw.get("goods_info")
+    goods_list = parse_goods_list(goods)
+    row["goods_info"] = json.dumps(goods_list, ensure_ascii=False) if goods_list else (
+        None if _blank(goods) else str(goods)
+    )
+    row["_goods"] = goods_list
+    return row
+
+
+def _insert_ignore(table, dialect_name: str):
+    """忽略唯一约束冲突的 INSERT"""
+    if dialect_name == "sqlite":
+        return sqlite.insert(table).on_conflict_do_nothing()
+    if dialect_name == "postgresql":
+        return postgresql.insert(table).on_conflict_do_nothing()
+    if dialect_name in ("mysql", "mariadb"):
+        return mysql.insert(table).prefix_with("IGNORE")
+    raise DatabaseException(f"批量导入不支持该数据库: {dialect_name}")
+
+
+class OrderImportService(BaseService):
+    """订单批量导入服务"""
+
+    def __init__(self, db: Optional[Session] = None, batch_size: int = IMPORT_BATCH_SIZE):
+        super().__init__(db)
+        self.batch_size = batch_size
+
+    def import_file(self, path: str, fmt: Optional[str] = None, defer_indexes: bool = False) -> Dict[str, Any]:
+        """导入文件，fmt 为空时按扩展名判断"""
+        with open_import_file(path) as stream:
+            return self.import_rows(iter_import_rows(stream, fmt or detect_format(path)), defer_indexes)
+
+    def import_rows(self, rows: Iterable[Any], defer_indexes: bool = False) -> Dict[str, Any]:
+        """按批导入订单，返回读取、插入、重复跳过、无效行数和每秒行数"""
+        result = {"read": 0, "inserted": 0, "duplicates": 0, "invalid": 0, "items": 0}
+        started = time.perf_counter()
+        dropped = self._drop_secondary_indexes() if defer_indexes else []
+        try:
+            batch: List[Dict[str, Any]] = []
+            batches = 0
+            for line_number, raw in enumerate(rows, 1):
+                result["read"] += 1
+                try:
+                    batch.append(validate_order_row(raw))
+                except ValueError as e:
+                    result["invalid"] += 1
+                    if result["invalid"] <= _MAX_LOGGED_ERRORS:
+                        logger.warning(f"导入第 {line_number} 行无效: {e}")
+                    continue
+                if len(batch) >= self.batch_size:
+                    self._insert_batch(batch, result)
+                    batch = []
+                    batches += 1
+                    if batches % 20 == 0:
+                        elapsed = time.perf_counter() - started
+                        logger.info(f"已读取 {result['read']} 行，插入 {result['inserted']}，"
+                                    f"{result['read'] / elapsed:.0f} 行/秒")
+            if batch:
+                self._insert_batch(batch, result)
+        finally:
+            if dropped:
+                self._create_indexes(dropped)
+
+        result["seconds"] = round(time.perf_counter() - started, 2)
+        result["rows_per_second"] = round(result["read"] / result["seconds"]) if result["seconds"] else result["read"]
+        logger.info(
+            f"订单导入完成: 读取 {result['read']} 行，插入 {result['inserted']}，"
+            f"重复跳过 {result['duplicates']}，无效 {result['invalid']}，"
+            f"{result['rows_per_second']} 行/秒"
+        )
+        return result
+
+    def _insert_batch(self, batch: List[Dict[str, Any]], result: Dict[str, Any]):
+        """插入一批订单及其商品明细，并累加统计计数（同一事务）"""
+        # 同一批内重复的订单号只保留第一行
+        rows: Dict[str, Dict[str, Any]] = {}
+        for row in batch:
+            rows.setdefault(row["order_sn"], row)
+        goods_by_sn = {order_sn: row.pop("_goods") for order_sn, row in rows.items()}
+        values = list(rows.values())
+        orders = Order.__table__
+        try:
+            connection = self.db.connection()
+            statement = _insert_ignore(orders, connection.dialect.name)
+            if connection.dialect.insert_executemany_returning:
+                inserted = set(connection.execute(statement.returning(orders.c.order_sn), values).scalars())
+            else:
+                # 不支持批量 RETURNING 时插入前后各查一次订单号：插入后才出现的是本批插入的，
+                # 因核销码等其他唯一约束冲突被跳过的行插入后仍查不到
+                existing = set(connection.execute(
+                    select(orders.c.order_sn).where(orders.c.order_sn.in_(list(rows)))
+                ).scalars())
+                connection.execute(statement, values)
+                inserted = set(connection.execute(
+                    select(orders.c.order_sn).where(orders.c.order_sn.in_([
+                        order_sn for order_sn in rows if order_sn not in existing
+                    ]))
+                ).scalars())
+
+            items = [
+                order_item_values(order_sn, goods, rows[order_sn]["created_at"])
+                for order_sn in inserted for goods in goods_by_sn[order_sn]
+            ]
+            if items:
+                connection.execute(insert(OrderItem.__table__), items)
+
+            deltas = new_counter_deltas()
+            for order_sn in inserted:
+                row = rows[order_sn]
+                add_new_order(deltas, row["order_status"], row["verification_status"], row["created_at"],
+                              {field: row[field] for field in ORDER_EVENT_FIELDS.values()})
+            apply_counter_deltas(connection, deltas)
+            invalidate_after_commit(self.db, CACHE_STATS, [DASHBOARD_STATS_KEY])
+            self.db.commit()
+        except Exception as e:
+            self.db.rollback()
+            raise DatabaseException(f"批量导入订单失败: {e}")
+
+        result["inserted"] += len(inserted)
+        result["duplicates"] += len(batch) - len(inserted)
+        result["items"] += len(items)
+
+    def _drop_secondary_indexes(self) -> list:
+        """删除订单表和商品明细表的非唯一索引（唯一索引用于冲突判断，保留）"""
+        indexes = [
+            index for table in (Order.__table__, OrderItem.__table__)
+            for index in table.indexes if not index.unique
+        ]
+        with self.engine.begin() as connection:
+            for index in indexes:
+                index.drop(connection, checkfirst=True)
+        logger.info(f"导入期间暂时删除 {len(indexes)} 个索引")
+        return indexes
+
+    def _create_indexes(self, indexes: list):
+        started = time.perf_counter()
+        with self.engine.begin() as connection:
+            # SQLite 建索引的排序使用临时存储，TEMP_STORE=MEMORY 时大表排序会占满内存，建索引期间改用临时文件
+            temp_store = sqlite_pragmas().get("temp_store") if connection.dialect.name == "sqlite" else None
+            if temp_store:
+                connection.exec_driver_sql("PRAGMA temp_store=FILE")
+            try:
+                for index in indexes:
+                    index.create(connection, checkfirst=True)
+            finally:
+                if temp_store:
+                    connection.exec_driver_sql(f"PRAGMA temp_store={temp_store}")
+        logger.info(f"重建 {len(indexes)} 个索引，耗时 {time.perf_counter() - started:.1f} 秒")
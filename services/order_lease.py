@@ -0,0 +1,138 @@
+"""
+订单租约模块：多个进程通过条件UPDATE认领订单，避免重复处理
+"""
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from sqlalchemy import and_, or_, select, true, update
+
+from config.settings import settings
+from core.exceptions import DatabaseException
+from models.order import Order, OrderStatus
+
+
+def new_lease_owner() -> str:
+    """生成当前进程的租约持有者标识"""
+    return f"{settings.worker_id}:{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def lease_available(now: datetime):
+    """租约空闲或已过期的条件"""
+    return or_(Order.lease_expires_at == None, Order.lease_expires_at < now)
+
+
+class OrderLeaseMixin:
+    """订单租约操作（要求服务类提供 self.db 会话）"""
+    
+    def claim_unverified_orders(self,
+                                owner: str,
+                                after_id: int = 0,
+                                limit: int = 500,
+                                lease_seconds: Optional[int] = None,
+                                by_priority: bool = False,
+                                after_priority: Optional[float] = None) -> Tuple[List[Tuple[int, str, Optional[float]]], datetime]:
+        """认领一批已发货未核销、且已到重试时间的订单
+        
+        by_priority 为 False 时按主键顺序，以 after_id 为游标；为 True 时按 (核销优先级键, 主键) 顺序，
+        以 (after_priority, after_id) 为游标，排序直接走 ix_orders_verify_queue 索引。
+        优先级键为空的订单（绕过ORM写入的）不参与按优先级认领，由下次运行开始时的补算处理。
+        先查出候选订单主键，再用条件UPDATE原子地写入租约持有者和到期时间（只认领租约仍空闲的订单），返回认领到的 (id, 订单号, 优先级键) 列表及租约到期时间。
+        """
+        lease_seconds = lease_seconds or settings.order_lease_seconds
+        now = datetime.now()
+        expires_at = now + timedelta(seconds=lease_seconds)
+        
+        if by_priority:
+            ordering = (Order.verify_priority, Order.id)
+            if after_priority is None:
+                after = and_(Order.verify_priority != None, Order.id > after_id if after_id else true())
+            else:
+                after = or_(
+                    Order.verify_priority > after_priority,
+                    and_(Order.verify_priority == after_priority, Order.id > after_id)
+                )
+        else:
+            ordering = (Order.id,)
+            after = Order.id > after_id
+        
+        try:
+            # 先选出候选订单再按主键列表UPDATE（MySQL 不支持在 UPDATE 的 IN 子查询中使用 LIMIT）
+            candidate_ids = self.db.execute(
+                select(Order.id).where(
+                    and_(
+                        Order.order_status == OrderStatus.SHIPPED.value,
+                        Order.verification_status == False,
+                        after,
+                        Order.verify_dead_letter == False,
+                        or_(Order.next_verify_at == None, Order.next_verify_at <= now),
+                        lease_available(now)
+                    )
+                ).order_by(*ordering).limit(limit)
+            ).scalars().all()
+            
+            if candidate_ids:
+                # 选出后可能已被其他进程认领，UPDATE 时再次检查租约，只认领仍然空闲的订单
+                self.db.execute(
+                    update(Order)
+                    .where(and_(Order.id.in_(candidate_ids), lease_available(now)))
+                    .values(lease_owner=owner, lease_expires_at=expires_at)
+                    .execution_options(synchronize_session=False)
+                )
+            self.db.commit()
+            if not candidate_ids:
+                return [], expires_at
+            
+            # 按持有者读回（不比较到期时间，部分数据库会截断或舍入秒以下的精度）
+            rows = self.db.query(Order.id, Order.order_sn, Order.verify_priority).filter(
+                and_(Order.id.in_(candidate_ids), Order.lease_owner == owner)
+            ).order_by(*ordering).all()
+            return [(row.id, row.order_sn, row.verify_priority) for row in rows], expires_at
+        except Exception as e:
+            self.db.rollback()
+            raise DatabaseException(f"认领订单失败: {e}")
+    
+    def try_claim_order(self,
+                        order_id: int,
+                        owner: str,
+                        order_status: int,
+                        lease_seconds: Optional[int] = None) -> bool:
+        """认领单个指定状态的订单，已被其他进程持有时返回False"""
+        lease_seconds = lease_seconds or settings.order_lease_seconds
+        now = datetime.now()
+        
+        try:
+            result = self.db.execute(
+                update(Order)
+                .where(and_(
+                    Order.id == order_id,
+                    Order.order_status == order_status,
+                    lease_available(now)
+                ))
+                .values(lease_owner=owner, lease_expires_at=now + timedelta(seconds=lease_seconds))
+                .execution_options(synchronize_session=False)
+            )
+            self.db.commit()
+            return result.rowcount == 1
+        except Exception as e:
+            self.db.rollback()
+            raise DatabaseException(f"认领订单失败: {e}")
+    
+    def release_orders(self, owner: str, order_ids: List[int]):
+        """释放本进程持有的订单租约"""
+        if not order_ids:
+            return
+        
+        try:
+            self.db.execute(
+                update(Order)
+                .where(and_(Order.id.in_(order_ids), Order.lease_owner == owner))
+                .values(lease_owner=None, lease_expires_at=None)
+                .execution_options(synchronize_session=False)
+            )
+            self.db.commit()
+        except Exception as e:
+            self.db.rollback()
+            raise DatabaseException(f"释放订单租约失败: {e}")
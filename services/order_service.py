@@ -1,31 +1,119 @@
 """
 订单服务模块
 """
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from datetime import datetime
-from sqlalchemy.orm import Session
-from sqlalchemy import create_engine, and_
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import func, select
 
-from models.order import Order, OrderStatus
-from models.database import Base
-from config.settings import settings
-from core.exceptions import DatabaseException
+from models.archive import get_order_archive
+from models.list_rows import ORDER_LIST_COLUMNS, order_list_rows
+from models.order import VIRTUAL_GOODS_TYPES, Order, OrderItem, OrderStatus
+from core.exceptions import DatabaseException, PddAutoVerifyException
+from services.base import BaseService
+from services.order_lease import OrderLeaseMixin
+from utils.pagination import Page, keyset_paginate
 
 
-class OrderService:
-    """订单服务"""
+# 订单统计：按订单状态 x 核销状态一次 GROUP BY，走 ix_orders_status_verified_created 覆盖索引
+ORDER_STATS_STATEMENT = select(
+    Order.order_status, Order.verification_status, func.count()
+).group_by(Order.order_status, Order.verification_status)
+
+
+def order_list_filters(status: Optional[int] = None,
+                       verification_status: Optional[bool] = None,
+                       order_sn: Optional[str] = None,
+                       goods_id: Optional[str] = None,
+                       goods_type: Optional[int] = None) -> list:
+    """订单列表的筛选条件（同步和异步服务共用）"""
+    filters = []
+    if status is not None:
+        filters.append(Order.order_status == status)
+    if verification_status is not None:
+        filters.append(Order.verification_status == verification_status)
+    if order_sn:
+        filters.append(Order.order_sn == order_sn)
+    if goods_id is not None or goods_type is not None:
+        # 走 order_items 的 (goods_id, order_sn) / (goods_type, order_sn) 索引
+        items = select(OrderItem.order_sn)
+        if goods_id is not None:
+            items = items.where(OrderItem.goods_id == goods_id)
+        if goods_type is not None:
+            items = items.where(OrderItem.goods_type == goods_type)
+        filters.append(Order.order_sn.in_(items))
+    return filters
+
+
+def goods_sales_statement(start_time: Optional[datetime] = None,
+                          end_time: Optional[datetime] = None,
+                          goods_type: Optional[int] = None,
+                          limit: int = 50):
+    """按商品统计订单数、销量和销售额（按销售额倒序）"""
+    amount = func.sum(OrderItem.quantity * func.coalesce(OrderItem.price, 0))
+    statement = select(
+        OrderItem.goods_id,
+        func.max(OrderItem.goods_name),
+        func.max(OrderItem.goods_type),
+        func.count(func.distinct(OrderItem.order_sn)),
+        func.sum(OrderItem.quantity),
+        amount,
+    ).group_by(OrderItem.goods_id).order_by(amount.desc(), OrderItem.goods_id).limit(limit)
+    if start_time:
+        statement = statement.where(OrderItem.created_at >= start_time)
+    if end_time:
+        statement = statement.where(OrderItem.created_at <= end_time)
+    if goods_type is not None:
+        statement = statement.where(OrderItem.goods_type == goods_type)
+    return statement
+
+
+def summarize_goods_sales(rows) -> List[Dict[str, Any]]:
+    """把 goods_sales_statement 的结果整理为商品销量列表"""
+    return [
+        {
+            "goods_id": goods_id,
+            "goods_name": goods_name,
+            "goods_type": goods_type,
+            "order_count": order_count,
+            "quantity": quantity or 0,
+            "amount": round(amount or 0, 2),
+        }
+        for goods_id, goods_name, goods_type, order_count, quantity, amount in rows
+    ]
+
+
+def summarize_order_stats(rows) -> Dict[str, Any]:
+    """把 ORDER_STATS_STATEMENT 的结果整理为仪表板统计"""
+    status_counts: Dict[int, int] = {}
+    verified_orders = 0
+    verifiable_orders = 0
+    for order_status, verification_status, count in rows:
+        status_counts[order_status] = status_counts.get(order_status, 0) + count
+        if verification_status:
+            verified_orders += count
+        elif order_status == OrderStatus.SHIPPED.value:
+            verifiable_orders += count
     
-    def __init__(self):
-        self.engine = create_engine(settings.database_url)
-        Base.metadata.create_all(bind=self.engine)
-        SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
-        self.db = SessionLocal()
+    return {
+        "total_orders": sum(status_counts.values()),
+        "pending_orders": status_counts.get(OrderStatus.PAID.value, 0),
+        "shipped_orders": status_counts.get(OrderStatus.SHIPPED.value, 0),
+        "finished_orders": status_counts.get(OrderStatus.FINISHED.value, 0),
+        "verified_orders": verified_orders,
+        "verifiable_orders": verifiable_orders,  # 已发货且未核销
+        "status_counts": status_counts
+    }
+
+
+class OrderService(BaseService, OrderLeaseMixin):
+    """订单服务"""
     
-    def create_order(self, order: Order) -> Order:
-        """创建订单"""
+    def create_order(self, order: Order, items: Optional[List[OrderItem]] = None) -> Order:
+        """创建订单（商品明细在同一事务中写入）"""
         try:
             self.db.add(order)
+            if items:
+                self.db.add_all(items)
             self.db.commit()
             self.db.refresh(order)
             return order
@@ -33,13 +121,35 @@ class OrderService:
             self.db.rollback()
             raise DatabaseException(f"创建订单失败: {e}")
     
-    def get_order_by_sn(self, order_sn: str) -> Optional[Order]:
-        """根据订单号获取订单"""
+    def get_order_by_sn(self, order_sn: str, include_archive: bool = True) -> Optional[Order]:
+        """根据订单号获取订单（业务表中没有时经归档索引查找已归档订单，归档订单只读）"""
         try:
-            return self.db.query(Order).filter(Order.order_sn == order_sn).first()
+            order = self.db.query(Order).filter(Order.order_sn == order_sn).first()
+            if order is None and include_archive:
+                order = get_order_archive().load_order(self.db.connection(), order_sn)
+            return order
         except Exception as e:
             raise DatabaseException(f"获取订单失败: {e}")
     
+    def get_order_items(self, order_sn: str) -> List[OrderItem]:
+        """获取订单的商品明细"""
+        try:
+            return self.db.query(OrderItem).filter(OrderItem.order_sn == order_sn).order_by(OrderItem.id).all()
+        except Exception as e:
+            raise DatabaseException(f"获取订单商品明细失败: {e}")
+    
+    def is_virtual_order(self, order_sn: str) -> bool:
+        """订单是否包含虚拟商品（按 order_items 判断，不解析 goods_info）"""
+        try:
+            return bool(self.db.execute(
+                select(select(OrderItem.id).where(
+                    OrderItem.order_sn == order_sn,
+                    OrderItem.goods_type.in_(VIRTUAL_GOODS_TYPES),
+                ).exists())
+            ).scalar())
+        except Exception as e:
+            raise DatabaseException(f"判断虚拟商品订单失败: {e}")
+    
     def update_order(self, order: Order) -> Order:
         """更新订单"""
         try:
@@ -58,18 +168,46 @@ class OrderService:
         except Exception as e:
             raise DatabaseException(f"获取订单列表失败: {e}")
     
-    def get_unverified_orders(self) -> List[Order]:
-        """获取未核销的订单"""
+    def list_orders(self,
+                    cursor: Optional[str] = None,
+                    page_size: int = 20,
+                    status: Optional[int] = None,
+                    verification_status: Optional[bool] = None,
+                    order_sn: Optional[str] = None,
+                    goods_id: Optional[str] = None,
+                    goods_type: Optional[int] = None) -> Page:
+        """按创建时间倒序分页获取订单（键集分页，cursor 为上一页返回的 next_cursor）
+        
+        只查询列表列，返回 OrderListRow（只读），需要修改订单时用 get_order_by_sn 取 ORM 对象。
+        """
         try:
-            return self.db.query(Order).filter(
-                and_(
-                    Order.order_status == OrderStatus.SHIPPED.value,
-                    Order.verification_status == False
-                )
-            ).all()
+            query = self.db.query(*ORDER_LIST_COLUMNS).filter(
+                *order_list_filters(status, verification_status, order_sn, goods_id, goods_type)
+            )
+            page = keyset_paginate(query, Order.created_at, Order.id, cursor, page_size)
+            page.items = order_list_rows(page.items)
+            return page
+        except PddAutoVerifyException:
+            raise
         except Exception as e:
-            raise DatabaseException(f"获取未核销订单失败: {e}")
+            raise DatabaseException(f"获取订单列表失败: {e}")
+    
+    def get_order_stats(self) -> Dict[str, Any]:
+        """统计订单数（一次 GROUP BY 聚合）"""
+        try:
+            rows = self.db.execute(ORDER_STATS_STATEMENT).all()
+        except Exception as e:
+            raise DatabaseException(f"统计订单失败: {e}")
+        return summarize_order_stats(rows)
     
-    def close(self):
-        """关闭数据库连接"""
-        self.db.close()
+    def get_goods_sales(self,
+                        start_time: Optional[datetime] = None,
+                        end_time: Optional[datetime] = None,
+                        goods_type: Optional[int] = None,
+                        limit: int = 50) -> List[Dict[str, Any]]:
+        """按商品统计销量（一次 GROUP BY 聚合 order_items）"""
+        try:
+            rows = self.db.execute(goods_sales_statement(start_time, end_time, goods_type, limit)).all()
+        except Exception as e:
+            raise DatabaseException(f"统计商品销量失败: {e}")
+        return summarize_goods_sales(rows)
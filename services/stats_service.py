@@ -0,0 +1,126 @@
+"""
+统计服务模块
+"""
+from datetime import date, datetime, timedelta
+from typing import Any, Dict
+
+from sqlalchemy import and_, select
+
+from config.settings import settings
+from models.database import get_engine
+from models.order import OrderStatus
+from models.stats import (
+    BUCKET_DAY, BUCKET_HOUR, BUCKET_TOTAL, ORDERS_CREATED, ORDERS_FINISHED, ORDERS_SHIPPED,
+    ORDERS_VERIFIED, VERIFICATIONS_FAILED, VERIFICATIONS_SUCCESS, StatCounter, rebuild_stat_counters
+)
+from core.exceptions import DatabaseException
+from services.base import BaseService
+
+
+# 仪表板读取的总计数器
+DASHBOARD_COUNTERS_STATEMENT = select(StatCounter.name, StatCounter.value).where(
+    StatCounter.bucket == BUCKET_TOTAL
+)
+
+
+def daily_report_statements(day: date):
+    """日报查询：当天的天桶、当天24个小时桶"""
+    day_start = datetime(day.year, day.month, day.day)
+    day_statement = select(StatCounter.name, StatCounter.value).where(
+        and_(StatCounter.bucket == BUCKET_DAY, StatCounter.bucket_start == day_start)
+    )
+    hour_statement = select(StatCounter.bucket_start, StatCounter.name, StatCounter.value).where(
+        and_(
+            StatCounter.bucket == BUCKET_HOUR,
+            StatCounter.bucket_start >= day_start,
+            StatCounter.bucket_start < day_start + timedelta(days=1)
+        )
+    )
+    return day_statement, hour_statement
+
+
+def summarize_dashboard_counters(rows) -> Dict[str, Any]:
+    """把总计数器整理为仪表板统计（同步和异步服务共用）"""
+    counters = {name: value for name, value in rows}
+    status_counts: Dict[int, int] = {}
+    verified_orders = 0
+    for name, value in counters.items():
+        if not name.startswith("orders:"):
+            continue
+        _, order_status, verified = name.split(":")
+        status_counts[int(order_status)] = status_counts.get(int(order_status), 0) + value
+        if verified == "1":
+            verified_orders += value
+    
+    successful = counters.get(VERIFICATIONS_SUCCESS, 0)
+    failed = counters.get(VERIFICATIONS_FAILED, 0)
+    return {
+        "total_orders": sum(status_counts.values()),
+        "pending_orders": status_counts.get(OrderStatus.PAID.value, 0),
+        "shipped_orders": status_counts.get(OrderStatus.SHIPPED.value, 0),
+        "finished_orders": status_counts.get(OrderStatus.FINISHED.value, 0),
+        "verified_orders": verified_orders,
+        "verifiable_orders": counters.get(f"orders:{OrderStatus.SHIPPED.value}:0", 0),
+        "total_verifications": successful + failed,
+        "successful_verifications": successful,
+        "failed_verifications": failed
+    }
+
+
+def summarize_daily_report(day: date, day_rows, hour_rows) -> Dict[str, Any]:
+    """把天桶和小时桶整理为日报（同步和异步服务共用）"""
+    counters = {name: value for name, value in day_rows}
+    hourly: Dict[int, Dict[str, int]] = {}
+    for bucket_start, name, value in hour_rows:
+        hourly.setdefault(bucket_start.hour, {})[name] = value
+    
+    successful = counters.get(VERIFICATIONS_SUCCESS, 0)
+    failed = counters.get(VERIFICATIONS_FAILED, 0)
+    return {
+        "date": day.isoformat(),
+        "total_orders": counters.get(ORDERS_CREATED, 0),
+        "shipped_orders": counters.get(ORDERS_SHIPPED, 0),
+        "success_orders": counters.get(ORDERS_FINISHED, 0),
+        "verified_orders": counters.get(ORDERS_VERIFIED, 0),
+        "total_verifications": successful + failed,
+        "success_verifications": successful,
+        "failed_verifications": failed,
+        "hourly": hourly,
+        "report_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    }
+
+
+class StatsService(BaseService):
+    """统计服务（读取增量维护的计数器，耗时与业务表大小无关）"""
+    
+    def get_dashboard_stats(self) -> Dict[str, Any]:
+        """仪表板统计"""
+        try:
+            rows = self.db.execute(DASHBOARD_COUNTERS_STATEMENT).all()
+        except Exception as e:
+            raise DatabaseException(f"获取统计计数失败: {e}")
+        return summarize_dashboard_counters(rows)
+    
+    def get_daily_report(self, day: date) -> Dict[str, Any]:
+        """日报统计（当天的天桶和24个小时桶）"""
+        day_statement, hour_statement = daily_report_statements(day)
+        try:
+            day_rows = self.db.execute(day_statement).all()
+            hour_rows = self.db.execute(hour_statement).all()
+        except Exception as e:
+            raise DatabaseException(f"获取日报统计失败: {e}")
+        return summarize_daily_report(day, day_rows, hour_rows)
+    
+    def rebuild_counters(self) -> int:
+        """从业务表和归档表重新计算全部计数器，返回写入的计数器行数"""
+        try:
+            if settings.archive_database_url:
+                with get_engine(settings.archive_database_url).connect() as archive_connection:
+                    count = rebuild_stat_counters(self.db.connection(), archive_connection=archive_connection)
+            else:
+                count = rebuild_stat_counters(self.db.connection())
+            self.db.commit()
+            return count
+        except Exception as e:
+            self.db.rollback()
+            raise DatabaseException(f"重建统计计数失败: {e}")
@@ -0,0 +1,237 @@
+"""
+核销记录缓冲写入模块
+"""
+import atexit
+import json
+import os
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+from sqlalchemy import insert
+from sqlalchemy.engine import Engine
+
+from config.settings import settings
+from models.cache_invalidation import invalidate_stats
+from models.order import VerificationRecord
+from models.stats import add_record_event, apply_counter_deltas, new_counter_deltas
+
+
+# 写入时需要保存的核销记录字段
+RECORD_FIELDS = (
+    "order_sn",
+    "verification_code",
+    "verification_status",
+    "verification_time",
+    "verification_method",
+    "verification_result",
+    "created_at",
+)
+
+# 需要在溢出文件中以ISO格式保存的时间字段
+DATETIME_FIELDS = ("verification_time", "created_at")
+
+
+class BufferedVerificationRecordWriter:
+    """核销记录缓冲写入器
+    
+    在内存中累积核销记录，达到数量阈值或时间阈值时用多行INSERT一次写入。
+    写库失败（如数据库被锁定）时把记录追加到本地溢出文件，下次写入时优先回放，
+    进程退出时自动刷新，保证核销记录不丢失。
+    """
+    
+    # 单条INSERT语句的最大行数（避免超出SQLite绑定参数上限）
+    MAX_ROWS_PER_STATEMENT = 100
+    
+    def __init__(self,
+                 engine: Engine,
+                 max_size: Optional[int] = None,
+                 flush_interval: Optional[float] = None,
+                 spool_file: Optional[str] = None):
+        self.engine = engine
+        self.max_size = max_size or settings.verification_record_buffer_size
+        self.flush_interval = flush_interval or settings.verification_record_flush_interval
+        self.spool_file = spool_file or settings.verification_record_spool_file
+        
+        self._buffer: List[Dict[str, Any]] = []
+        self._buffer_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._closed = False
+        
+        # 定时刷新线程
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="verification-record-writer", daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.close)
+    
+    def add(self, record: VerificationRecord):
+        """加入一条核销记录，缓冲区满时立即刷新"""
+        row = {field: getattr(record, field) for field in RECORD_FIELDS}
+        if row["created_at"] is None:
+            row["created_at"] = datetime.now()
+        
+        with self._buffer_lock:
+            self._buffer.append(row)
+            full = len(self._buffer) >= self.max_size
+        
+        if full:
+            self.flush()
+    
+    def pending_count(self) -> int:
+        """内存中尚未写入的记录数"""
+        with self._buffer_lock:
+            return len(self._buffer)
+    
+    def flush(self) -> int:
+        """将溢出文件和缓冲区中的记录写入数据库，返回写入条数
+        
+        回放前先把溢出文件原子改名为本进程的回放文件，回放期间其他进程追加的记录
+        写入新的溢出文件，不会随回放文件一起删除。
+        """
+        with self._flush_lock:
+            with self._buffer_lock:
+                rows, self._buffer = self._buffer, []
+            
+            replay_file = None
+            spooled = None
+            try:
+                replay_file = self._claim_spool()
+                spooled = self._load_spool(replay_file) if replay_file else []
+                pending = spooled + rows
+                if pending:
+                    self._insert_rows(pending)
+            except Exception as e:
+                # 任何原因写库失败都落盘，等待下次回放
+                self._respool(rows, spooled, replay_file, e)
+                return 0
+            
+            if replay_file:
+                os.remove(replay_file)
+            if spooled:
+                logger.info(f"已回放溢出文件中的 {len(spooled)} 条核销记录")
+            if pending:
+                logger.debug(f"批量写入核销记录 {len(pending)} 条")
+            return len(pending)
+    
+    def close(self):
+        """停止定时刷新并写入剩余记录"""
+        if self._closed:
+            return
+        self._closed = True
+        self._stop_event.set()
+        self._thread.join(timeout=self.flush_interval + 1)
+        self.flush()
+    
+    def _run(self):
+        """按时间阈值定时刷新"""
+        while not self._stop_event.wait(self.flush_interval):
+            if not self.pending_count() and not os.path.exists(self.spool_file):
+                continue
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"定时刷新核销记录失败: {e}")
+    
+    def _insert_rows(self, rows: List[Dict[str, Any]]):
+        """在一个事务内用多行INSERT写入，并更新统计计数"""
+        deltas = new_counter_deltas()
+        for row in rows:
+            add_record_event(deltas, row["verification_status"], row["created_at"])
+        
+        with self.engine.begin() as conn:
+            for start in range(0, len(rows), self.MAX_ROWS_PER_STATEMENT):
+                chunk = rows[start:start + self.MAX_ROWS_PER_STATEMENT]
+                conn.execute(insert(VerificationRecord).values(chunk))
+            apply_counter_deltas(conn, deltas)
+        invalidate_stats()
+    
+    def _append_spool(self, rows: List[Dict[str, Any]]):
+        """追加记录到溢出文件（每行一条JSON）"""
+        if not rows:
+            return
+        spool_dir = os.path.dirname(self.spool_file)
+        if spool_dir and not os.path.exists(spool_dir):
+            os.makedirs(spool_dir)
+        
+        with open(self.spool_file, "a", encoding="utf-8") as f:
+            for row in rows:
+                data = dict(row)
+                for field in DATETIME_FIELDS:
+                    if data[field] is not None:
+                        data[field] = data[field].isoformat()
+                f.write(json.dumps(data, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+    
+    def _claim_spool(self) -> Optional[str]:
+        """把溢出文件改名为本进程的回放文件，没有溢出文件时返回 None"""
+        replay_file = f"{self.spool_file}.{os.getpid()}.replay"
+        if os.path.exists(replay_file):
+            # 上次放回失败遗留的回放文件，先把它放回溢出文件
+            self._return_spool(replay_file)
+        try:
+            os.replace(self.spool_file, replay_file)
+        except FileNotFoundError:
+            return None
+        return replay_file
+    
+    def _return_spool(self, replay_file: str):
+        """把回放文件的内容原样追加回溢出文件"""
+        with open(replay_file, "rb") as src, open(self.spool_file, "ab") as dst:
+            dst.write(src.read())
+            dst.flush()
+            os.fsync(dst.fileno())
+        os.remove(replay_file)
+    
+    def _respool(self,
+                 rows: List[Dict[str, Any]],
+                 spooled: Optional[List[Dict[str, Any]]],
+                 replay_file: Optional[str],
+                 error: Exception):
+        """写库失败时把缓冲区和回放文件中的记录放回溢出文件"""
+        try:
+            if spooled is None and replay_file:
+                # 回放文件未能读取，原样放回
+                self._return_spool(replay_file)
+                self._append_spool(rows)
+            else:
+                self._append_spool((spooled or []) + rows)
+                if replay_file:
+                    os.remove(replay_file)
+        except Exception as e:
+            # 溢出文件也写不了时放回缓冲区，回放文件保留到下次刷新
+            with self._buffer_lock:
+                self._buffer[:0] = rows
+            logger.error(f"核销记录写入溢出文件失败，{len(rows)} 条记录保留在内存中: {e}")
+            return
+        logger.warning(
+            f"核销记录写入失败，{len(spooled or []) + len(rows)} 条记录已写入溢出文件: {error}"
+        )
+    
+    def _load_spool(self, path: str) -> List[Dict[str, Any]]:
+        """读取溢出文件中的记录，无法解析的行移到 .bad 文件"""
+        rows = []
+        bad_lines = []
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    data = json.loads(line)
+                    for field in DATETIME_FIELDS:
+                        if data.get(field):
+                            data[field] = datetime.fromisoformat(data[field])
+                except ValueError:
+                    bad_lines.append(line)
+                    continue
+                rows.append(data)
+        
+        if bad_lines:
+            with open(f"{self.spool_file}.bad", "a", encoding="utf-8") as f:
+                f.write("\n".join(bad_lines) + "\n")
+            logger.error(f"溢出文件中有 {len(bad_lines)} 行无法解析，已移到 {self.spool_file}.bad")
+        return rows
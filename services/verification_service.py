@@ -1,27 +1,62 @@
 """
 核销服务模块
 """
-from typing import List, Optional
+from typing import Dict, List, Optional, Set, Tuple
 from datetime import datetime
-from sqlalchemy.orm import Session
-from sqlalchemy import create_engine, and_
-from sqlalchemy.orm import sessionmaker
+from loguru import logger
+from sqlalchemy import and_, func, select, update
 
-from models.order import Order, VerificationRecord
-from models.database import Base
-from config.settings import settings
-from core.exceptions import DatabaseException
+from models.archive import get_order_archive
+from models.list_rows import VERIFICATION_RECORD_LIST_COLUMNS, verification_record_list_rows
+from models.order import Order, OrderStatus, VerificationRecord
+from models.job import JobCursor
+from core.exceptions import DatabaseException, PddAutoVerifyException
+from core.priority import compute_verify_priority, priority_rules_version
+from services.base import BaseService
+from services.order_lease import OrderLeaseMixin
+from utils.pagination import Page, keyset_paginate
 
 
-class VerificationService:
+# 保存上次计算优先级键所用规则版本的任务游标
+PRIORITY_RULES_CURSOR = "verify_priority_rules"
+
+# 核销记录统计：按核销状态一次 GROUP BY
+VERIFICATION_STATS_STATEMENT = select(
+    VerificationRecord.verification_status, func.count()
+).group_by(VerificationRecord.verification_status)
+
+
+def verification_record_filters(order_sn: Optional[str] = None,
+                                start_time: Optional[str] = None,
+                                end_time: Optional[str] = None,
+                                verification_status: Optional[bool] = None) -> list:
+    """核销记录列表的筛选条件（同步和异步服务共用）"""
+    filters = []
+    if order_sn:
+        filters.append(VerificationRecord.order_sn == order_sn)
+    if start_time:
+        filters.append(VerificationRecord.created_at >= datetime.fromisoformat(start_time))
+    if end_time:
+        filters.append(VerificationRecord.created_at <= datetime.fromisoformat(end_time))
+    if verification_status is not None:
+        filters.append(VerificationRecord.verification_status == verification_status)
+    return filters
+
+
+def summarize_verification_stats(rows) -> Dict[str, int]:
+    """把 VERIFICATION_STATS_STATEMENT 的结果整理为核销统计"""
+    successful = sum(count for status, count in rows if status)
+    total = sum(count for _, count in rows)
+    return {
+        "total_verifications": total,
+        "successful_verifications": successful,
+        "failed_verifications": total - successful
+    }
+
+
+class VerificationService(BaseService, OrderLeaseMixin):
     """核销服务"""
     
-    def __init__(self):
-        self.engine = create_engine(settings.database_url)
-        Base.metadata.create_all(bind=self.engine)
-        SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
-        self.db = SessionLocal()
-    
     def create_verification_record(self, record: VerificationRecord) -> VerificationRecord:
         """创建核销记录"""
         try:
@@ -33,40 +68,67 @@ class VerificationService:
             self.db.rollback()
             raise DatabaseException(f"创建核销记录失败: {e}")
     
-    def get_verification_records(self, 
-                                order_sn: Optional[str] = None,
-                                start_time: Optional[str] = None,
-                                end_time: Optional[str] = None,
-                                page: int = 1,
-                                page_size: int = 20) -> List[VerificationRecord]:
-        """获取核销记录"""
+    def save_verification(self, order: Order, record: VerificationRecord) -> VerificationRecord:
+        """在同一事务中更新订单核销状态并写入核销记录（不回读）"""
         try:
-            query = self.db.query(VerificationRecord)
-            
-            if order_sn:
-                query = query.filter(VerificationRecord.order_sn == order_sn)
-            
-            if start_time:
-                start_dt = datetime.fromisoformat(start_time)
-                query = query.filter(VerificationRecord.created_at >= start_dt)
-            
-            if end_time:
-                end_dt = datetime.fromisoformat(end_time)
-                query = query.filter(VerificationRecord.created_at <= end_dt)
-            
-            offset = (page - 1) * page_size
-            return query.offset(offset).limit(page_size).all()
-            
+            order.updated_at = datetime.now()
+            self.db.add(record)
+            self.db.commit()
+            return record
+        except Exception as e:
+            self.db.rollback()
+            raise DatabaseException(f"保存核销结果失败: {e}")
+    
+    def list_verification_records(self,
+                                  cursor: Optional[str] = None,
+                                  page_size: int = 20,
+                                  order_sn: Optional[str] = None,
+                                  start_time: Optional[str] = None,
+                                  end_time: Optional[str] = None,
+                                  verification_status: Optional[bool] = None) -> Page:
+        """按创建时间倒序分页获取核销记录（键集分页，cursor 为上一页返回的 next_cursor，返回 VerificationRecordListRow）"""
+        try:
+            query = self.db.query(*VERIFICATION_RECORD_LIST_COLUMNS).filter(*verification_record_filters(
+                order_sn, start_time, end_time, verification_status
+            ))
+            page = keyset_paginate(
+                query, VerificationRecord.created_at, VerificationRecord.id, cursor, page_size
+            )
+            page.items = verification_record_list_rows(page.items)
+            return page
+        except PddAutoVerifyException:
+            raise
         except Exception as e:
             raise DatabaseException(f"获取核销记录失败: {e}")
     
-    def get_order_by_sn(self, order_sn: str) -> Optional[Order]:
-        """根据订单号获取订单"""
+    def get_verification_stats(self) -> Dict[str, int]:
+        """统计核销记录数（按核销状态一次 GROUP BY）"""
         try:
-            return self.db.query(Order).filter(Order.order_sn == order_sn).first()
+            rows = self.db.execute(VERIFICATION_STATS_STATEMENT).all()
+        except Exception as e:
+            raise DatabaseException(f"统计核销记录失败: {e}")
+        return summarize_verification_stats(rows)
+    
+    def get_order_by_sn(self, order_sn: str, include_archive: bool = True) -> Optional[Order]:
+        """根据订单号获取订单（业务表中没有时经归档索引查找已归档订单，归档订单只读）"""
+        try:
+            order = self.db.query(Order).filter(Order.order_sn == order_sn).first()
+            if order is None and include_archive:
+                order = get_order_archive().load_order(self.db.connection(), order_sn)
+            return order
         except Exception as e:
             raise DatabaseException(f"获取订单失败: {e}")
     
+    def get_order_sn_by_code(self, verification_code: str) -> Optional[str]:
+        """根据核销码获取订单号（走核销码唯一索引）"""
+        try:
+            row = self.db.query(Order.order_sn).filter(
+                Order.verification_code == verification_code
+            ).first()
+            return row.order_sn if row else None
+        except Exception as e:
+            raise DatabaseException(f"根据核销码获取订单失败: {e}")
+    
     def update_order(self, order: Order) -> Order:
         """更新订单"""
         try:
@@ -78,18 +140,201 @@ class VerificationService:
             self.db.rollback()
             raise DatabaseException(f"更新订单失败: {e}")
     
-    def get_unverified_orders(self) -> List[Order]:
-        """获取未核销的订单"""
+    def get_verified_order_page(self,
+                                start_time: datetime,
+                                end_time: datetime,
+                                after_order_sn: str = "",
+                                limit: int = 500) -> List[Tuple[str, str, datetime]]:
+        """按订单号顺序分页获取时间范围内已核销的订单（键集分页）"""
         try:
-            return self.db.query(Order).filter(
+            rows = self.db.query(
+                Order.order_sn, Order.verification_code, Order.verification_time
+            ).filter(
                 and_(
-                    Order.order_status == 2,  # 已发货状态
-                    Order.verification_status == False
+                    Order.verification_status == True,
+                    Order.verification_time >= start_time,
+                    Order.verification_time < end_time,
+                    Order.order_sn > after_order_sn
                 )
-            ).all()
+            ).order_by(Order.order_sn).limit(limit).all()
+            return [tuple(row) for row in rows]
         except Exception as e:
-            raise DatabaseException(f"获取未核销订单失败: {e}")
+            raise DatabaseException(f"获取已核销订单失败: {e}")
+    
+    def get_order_states(self, order_sns: List[str]) -> Dict[str, Tuple]:
+        """批量获取订单核销状态：订单号 -> (订单状态, 核销状态, 核销码, 核销时间)"""
+        if not order_sns:
+            return {}
+        try:
+            rows = self.db.query(
+                Order.order_sn, Order.order_status, Order.verification_status,
+                Order.verification_code, Order.verification_time
+            ).filter(Order.order_sn.in_(order_sns)).all()
+            return {row.order_sn: tuple(row)[1:] for row in rows}
+        except Exception as e:
+            raise DatabaseException(f"获取订单核销状态失败: {e}")
+    
+    def get_recorded_order_sns(self, order_sns: List[str]) -> Set[str]:
+        """批量获取存在成功核销记录的订单号"""
+        if not order_sns:
+            return set()
+        try:
+            rows = self.db.query(VerificationRecord.order_sn).filter(
+                and_(
+                    VerificationRecord.order_sn.in_(order_sns),
+                    VerificationRecord.verification_status == True
+                )
+            ).distinct().all()
+            return {row.order_sn for row in rows}
+        except Exception as e:
+            raise DatabaseException(f"获取核销记录失败: {e}")
+    
+    def mark_order_verified(self,
+                            order_sn: str,
+                            verification_code: str,
+                            verification_time: datetime,
+                            method: str) -> bool:
+        """按平台核销结果修复本地订单：标记为已核销并补写核销记录"""
+        order = self.get_order_by_sn(order_sn)
+        if not order or order.archived:
+            return False
+        
+        order.verification_status = True
+        order.verification_time = verification_time
+        if order.order_status in (OrderStatus.SHIPPED.value, OrderStatus.RECEIVED.value):
+            order.order_status = OrderStatus.FINISHED.value
+            order.finished_at = verification_time
+        
+        record = VerificationRecord(
+            order_sn=order_sn,
+            verification_code=verification_code or order.verification_code or "",
+            verification_status=True,
+            verification_time=verification_time,
+            verification_method=method,
+            verification_result="对账修复"
+        )
+        self.save_verification(order, record)
+        return True
+    
+    def add_reconciled_record(self,
+                              order_sn: str,
+                              verification_code: str,
+                              verification_time: datetime) -> bool:
+        """为已核销但缺少核销记录的订单补写核销记录"""
+        record = VerificationRecord(
+            order_sn=order_sn,
+            verification_code=verification_code or "",
+            verification_status=True,
+            verification_time=verification_time,
+            verification_method="reconcile",
+            verification_result="对账修复"
+        )
+        self.create_verification_record(record)
+        return True
+    
+    def backfill_verify_priority(self, recompute: bool = False, batch_size: int = 1000) -> int:
+        """为待核销订单补算核销优先级键，recompute 为 True 时按当前规则全部重算"""
+        try:
+            updated = 0
+            after_id = 0
+            while True:
+                query = self.db.query(
+                    Order.id, Order.shipped_at, Order.created_at, Order.order_amount
+                ).filter(
+                    and_(
+                        Order.order_status == OrderStatus.SHIPPED.value,
+                        Order.verification_status == False,
+                        Order.id > after_id
+                    )
+                )
+                if not recompute:
+                    query = query.filter(Order.verify_priority == None)
+                rows = query.order_by(Order.id).limit(batch_size).all()
+                if not rows:
+                    break
+                
+                self.db.execute(update(Order), [
+                    {
+                        "id": row.id,
+                        "verify_priority": compute_verify_priority(
+                            row.shipped_at or row.created_at, row.order_amount
+                        )
+                    }
+                    for row in rows
+                ])
+                self.db.commit()
+                updated += len(rows)
+                after_id = rows[-1].id
+            return updated
+        except Exception as e:
+            self.db.rollback()
+            raise DatabaseException(f"补算核销优先级失败: {e}")
+    
+    def refresh_verify_priority(self) -> int:
+        """补算缺失的核销优先级键；优先级规则配置变化后（与上次保存的规则版本不同）按新规则全部重算"""
+        version = priority_rules_version()
+        if self.get_job_cursor(PRIORITY_RULES_CURSOR) == version:
+            return self.backfill_verify_priority()
+        
+        updated = self.backfill_verify_priority(recompute=True)
+        self.save_job_cursor(PRIORITY_RULES_CURSOR, version)
+        logger.info(f"核销优先级规则已变化（{version}），重算 {updated} 个订单的优先级键")
+        return updated
+    
+    def get_verify_attempts(self, order_id: int) -> int:
+        """获取订单的自动核销失败次数"""
+        try:
+            row = self.db.query(Order.verify_attempts).filter(Order.id == order_id).first()
+            return (row.verify_attempts or 0) if row else 0
+        except Exception as e:
+            raise DatabaseException(f"获取核销失败次数失败: {e}")
+    
+    def schedule_verification_retry(self,
+                                    order_id: int,
+                                    attempts: int,
+                                    error_class: str,
+                                    next_verify_at: Optional[datetime],
+                                    dead_letter: bool):
+        """记录自动核销失败并安排下次核销时间"""
+        try:
+            self.db.execute(
+                update(Order)
+                .where(Order.id == order_id)
+                .values(
+                    verify_attempts=attempts,
+                    next_verify_at=next_verify_at,
+                    last_verify_error=error_class,
+                    verify_dead_letter=dead_letter
+                )
+                .execution_options(synchronize_session=False)
+            )
+            self.db.commit()
+        except Exception as e:
+            self.db.rollback()
+            raise DatabaseException(f"安排核销重试失败: {e}")
+    
+    def get_job_cursor(self, name: str) -> Optional[str]:
+        """获取任务游标"""
+        try:
+            cursor = self.db.query(JobCursor).filter(JobCursor.name == name).first()
+            return cursor.position if cursor else None
+        except Exception as e:
+            raise DatabaseException(f"获取任务游标失败: {e}")
+    
+    def save_job_cursor(self, name: str, position: Optional[str]):
+        """保存任务游标并提交"""
+        try:
+            cursor = self.db.query(JobCursor).filter(JobCursor.name == name).first()
+            if cursor is None:
+                cursor = JobCursor(name=name)
+                self.db.add(cursor)
+            cursor.position = position
+            cursor.updated_at = datetime.now()
+            self.db.commit()
+        except Exception as e:
+            self.db.rollback()
+            raise DatabaseException(f"保存任务游标失败: {e}")
     
-    def close(self):
-        """关闭数据库连接"""
-        self.db.close()
+    def release(self):
+        """释放会话中已加载的对象"""
+        self.db.expunge_all()
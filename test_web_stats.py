@@ -13,10 +13,11 @@ verification_service = VerificationService()
 print("测试Web界面数据获取逻辑:")
 
 # 获取订单统计
-pending_orders = len(order_service.get_orders_by_status(1, limit=1000))  # 已支付
-shipped_orders = len(order_service.get_orders_by_status(2, limit=1000))  # 已发货
-finished_orders = len(order_service.get_orders_by_status(4, limit=1000))  # 已完成
-total_orders = pending_orders + shipped_orders + finished_orders
+order_stats = order_service.get_order_stats()
+pending_orders = order_stats["pending_orders"]  # 已支付
+shipped_orders = order_stats["shipped_orders"]  # 已发货
+finished_orders = order_stats["finished_orders"]  # 已完成
+total_orders = order_stats["total_orders"]
 
 print(f"已支付订单: {pending_orders}")
 print(f"已发货订单: {shipped_orders}")
@@ -24,9 +25,9 @@ print(f"已完成订单: {finished_orders}")
 print(f"总订单数: {total_orders}")
 
 # 获取核销统计
-verification_records = verification_service.get_verification_records(page=1, page_size=1000)
-total_verifications = len(verification_records)
-successful_verifications = len([r for r in verification_records if r.verification_status])
+verification_stats = verification_service.get_verification_stats()
+total_verifications = verification_stats["total_verifications"]
+successful_verifications = verification_stats["successful_verifications"]
 
 print(f"总核销记录数: {total_verifications}")
 print(f"成功核销数: {successful_verifications}")
@@ -0,0 +1,53 @@
+"""
+测试基类
+"""
+import os
+import tempfile
+import unittest
+from unittest.mock import Mock
+
+from config.settings import settings
+from models.database import dispose_engines
+from models.order import Order, OrderStatus
+from core.verification import VirtualGoodsVerifier
+from utils.cache import reset_cache
+
+
+class VerificationTestCase(unittest.TestCase):
+    """使用临时SQLite数据库的核销测试基类"""
+    
+    def setUp(self):
+        """测试前准备"""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.original_database_url = settings.database_url
+        settings.database_url = f"sqlite:///{os.path.join(self.tmp_dir.name, 'test.db')}"
+        
+        self.verifier = VirtualGoodsVerifier()
+        self.verifier.api_client = Mock()
+        self.verifier.api_client.verify_virtual_goods.return_value = {
+            "virtual_goods_verify_response": {"success": True}
+        }
+        self.service = self.verifier.verification_service
+    
+    def tearDown(self):
+        """测试后清理"""
+        self.service.close()
+        dispose_engines()
+        reset_cache()
+        settings.database_url = self.original_database_url
+        self.tmp_dir.cleanup()
+    
+    def create_orders(self, count: int, status: int = OrderStatus.SHIPPED.value):
+        """批量创建订单，核销码为订单号后8位"""
+        for i in range(count):
+            order_sn = f"TEST{i:012d}"
+            self.service.db.add(Order(
+                order_sn=order_sn,
+                buyer_id=f"buyer_{i}",
+                buyer_name=f"买家{i}",
+                order_status=status,
+                order_amount=10.0,
+                verification_code=order_sn[-8:],
+                verification_status=False
+            ))
+        self.service.db.commit()
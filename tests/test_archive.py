@@ -0,0 +1,140 @@
+"""
+订单归档测试
+"""
+import asyncio
+import os
+import unittest
+from datetime import datetime, timedelta
+
+from sqlalchemy import inspect
+
+from config.settings import settings
+from models import archive
+from models.order import OrderItem, OrderStatus
+from services.archive_service import ArchiveService
+from services.async_service import AsyncOrderService
+from services.order_service import OrderService
+from services.stats_service import StatsService
+from tests.base import VerificationTestCase
+
+
+class TestOrderArchival(VerificationTestCase):
+    """订单归档测试"""
+    
+    def setUp(self):
+        super().setUp()
+        self.create_orders(6)
+        self.verifier.verify_order("TEST000000000000", "00000000")
+        old = datetime.now() - timedelta(days=120)
+        # 0、1、2 为超期的终态订单，3 已完成但未超期，4、5 为已发货订单
+        for i, status in enumerate((OrderStatus.FINISHED, OrderStatus.CANCELLED, OrderStatus.REFUNDED,
+                                    OrderStatus.FINISHED)):
+            order = self.service.get_order_by_sn(f"TEST{i:012d}")
+            order.order_status = status.value
+            order.created_at = old
+            order.finished_at = old if i < 3 else datetime.now()
+        self.service.db.add(OrderItem(order_sn="TEST000000000001", goods_id="goods_1", goods_type=1,
+                                      quantity=1, price=10.0, created_at=old))
+        self.service.db.commit()
+    
+    def daily_reports(self, stats_service):
+        reports = []
+        for day in (datetime.now() - timedelta(days=120), datetime.now()):
+            report = stats_service.get_daily_report(day.date())
+            del report["report_time"]
+            reports.append(report)
+        return reports
+    
+    def assert_archived(self, archive_service):
+        stats_service = StatsService()
+        try:
+            # 修改创建时间不移动已计数的事件，先重建得到与业务数据一致的基线
+            stats_service.rebuild_counters()
+            reports = self.daily_reports(stats_service)
+            self.assertEqual(reports[0]["total_orders"], 4)
+        finally:
+            stats_service.close()
+        
+        result = archive_service.archive_orders(older_than_days=90, batch_size=2)
+        self.assertEqual(result, {"orders": 3, "records": 1, "items": 1, "batches": 2})
+        
+        order_service = OrderService()
+        try:
+            remaining = [order.order_sn for order in order_service.list_orders(page_size=10).items]
+            self.assertEqual(sorted(remaining), [f"TEST{i:012d}" for i in range(3, 6)])
+            self.assertEqual(self.service.get_verification_stats()["total_verifications"], 0)
+            
+            # 按订单号查询透明回查归档，归档订单只读
+            order = order_service.get_order_by_sn("TEST000000000000")
+            self.assertTrue(order.archived)
+            self.assertTrue(order.verification_status)
+            self.assertIsNone(order_service.get_order_by_sn("TEST000000000000", include_archive=False))
+            self.assertFalse(self.service.mark_order_verified("TEST000000000001", "00000001",
+                                                              datetime.now(), "reconcile"))
+            
+            # 订单状态计数只统计业务表，与重建结果一致
+            stats_service = StatsService(order_service.db)
+            dashboard = stats_service.get_dashboard_stats()
+            self.assertEqual(dashboard["total_orders"], 3)
+            stats_service.rebuild_counters()
+            self.assertEqual(stats_service.get_dashboard_stats()["total_orders"], 3)
+            # 重建时事件计数也统计归档表，日报历史不变
+            self.assertEqual(self.daily_reports(stats_service), reports)
+        finally:
+            order_service.close()
+        
+        # 再次执行没有可归档的订单
+        self.assertEqual(archive_service.archive_orders(older_than_days=90)["orders"], 0)
+    
+    def test_archive_to_monthly_tables(self):
+        """归档到主库的按月归档表"""
+        archive_service = ArchiveService()
+        try:
+            self.assert_archived(archive_service)
+            month = (datetime.now() - timedelta(days=120)).strftime("%Y%m")
+            tables = inspect(self.service.engine).get_table_names()
+            self.assertIn(f"orders_archive_{month}", tables)
+            self.assertIn(f"verification_records_archive_{month}", tables)
+            self.assertIn(f"order_items_archive_{month}", tables)
+        finally:
+            archive_service.close()
+    
+    def test_lookup_in_archive_table_missing_new_columns(self):
+        """归档表缺少业务表后来新增的列时（如 0006 之前创建的归档表没有 shop_id），按订单号回查仍可读取"""
+        archive_service = ArchiveService()
+        try:
+            archive_service.archive_orders(older_than_days=90)
+        finally:
+            archive_service.close()
+        month = (datetime.now() - timedelta(days=120)).strftime("%Y%m")
+        with self.service.engine.begin() as connection:
+            connection.exec_driver_sql(f"ALTER TABLE orders_archive_{month} DROP COLUMN shop_id")
+        archive._columns.clear()
+        
+        order_service = OrderService()
+        try:
+            order = order_service.get_order_by_sn("TEST000000000000")
+        finally:
+            order_service.close()
+        self.assertTrue(order.archived)
+        self.assertIsNone(order.shop_id)
+    
+    def test_archive_to_separate_database(self):
+        """归档到单独的归档库，索引保留在主库"""
+        archive_url = f"sqlite:///{os.path.join(self.tmp_dir.name, 'archive.db')}"
+        original = settings.archive_database_url
+        settings.archive_database_url = archive_url
+        archive_service = ArchiveService()
+        try:
+            self.assert_archived(archive_service)
+            self.assertFalse(any(name.startswith("orders_archive_")
+                                 for name in inspect(self.service.engine).get_table_names()))
+            order = asyncio.run(AsyncOrderService().get_order_by_sn("TEST000000000002"))
+            self.assertEqual(order.order_status, OrderStatus.REFUNDED.value)
+        finally:
+            archive_service.close()
+            settings.archive_database_url = original
+
+
+if __name__ == "__main__":
+    unittest.main()
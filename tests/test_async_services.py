@@ -0,0 +1,53 @@
+"""
+异步服务测试
+"""
+import asyncio
+import unittest
+
+from core.exceptions import PddAutoVerifyException
+from services.async_service import AsyncOrderService, AsyncStatsService, AsyncVerificationService
+from services.order_service import OrderService
+from services.stats_service import StatsService
+from tests.base import VerificationTestCase
+
+
+class TestAsyncServices(VerificationTestCase):
+    """异步查询服务测试"""
+    
+    def test_async_queries_match_sync_services(self):
+        """异步服务的分页和统计结果与同步服务一致"""
+        self.create_orders(5)
+        self.verifier.verify_order("TEST000000000001", "00000001")
+        
+        async def query():
+            orders = AsyncOrderService(read_only=True)
+            first = await orders.list_orders(page_size=3)
+            second = await orders.list_orders(cursor=first.next_cursor, page_size=3)
+            records = await AsyncVerificationService().list_verification_records(page_size=10)
+            return (
+                [order.order_sn for order in first.items + second.items],
+                second.has_more,
+                [record.order_sn for record in records.items],
+                await orders.get_order_stats(),
+                await AsyncStatsService().get_dashboard_stats(),
+                await orders.get_order_by_sn("TEST000000000004"),
+            )
+        
+        order_sns, has_more, record_sns, order_stats, dashboard, order = asyncio.run(query())
+        
+        self.assertEqual(order_sns, [f"TEST{i:012d}" for i in reversed(range(5))])
+        self.assertFalse(has_more)
+        self.assertEqual(record_sns, ["TEST000000000001"])
+        self.assertEqual(order_stats, OrderService(self.service.db).get_order_stats())
+        self.assertEqual(dashboard, StatsService(self.service.db).get_dashboard_stats())
+        self.assertEqual(order.order_sn, "TEST000000000004")
+    
+    def test_async_invalid_cursor(self):
+        """无效游标抛出业务异常而不是数据库异常"""
+        with self.assertRaises(PddAutoVerifyException) as context:
+            asyncio.run(AsyncOrderService().list_orders(cursor="not-a-cursor"))
+        self.assertEqual(context.exception.error_code, "INVALID_CURSOR")
+
+
+if __name__ == "__main__":
+    unittest.main()
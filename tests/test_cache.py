@@ -0,0 +1,151 @@
+"""
+共享缓存测试
+"""
+import asyncio
+import threading
+import time
+import unittest
+from unittest.mock import Mock, patch
+
+from services.async_service import AsyncOrderService, AsyncStatsService
+from core.api_client import PddAPIClient
+from utils.cache import Cache, MemoryCacheBackend, RedisCacheBackend, create_cache_backend, reset_cache
+from tests.base import VerificationTestCase
+
+
+class FakeRedis:
+    """测试用的 Redis 客户端（只实现缓存用到的命令）"""
+    
+    def __init__(self):
+        self.data = {}
+        self.ttls = {}
+        self.fail = False
+    
+    def get(self, key):
+        if self.fail:
+            raise ConnectionError("redis down")
+        return self.data.get(key)
+    
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+        self.ttls[key] = ex
+    
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+    
+    def close(self):
+        pass
+
+
+class TestCache(VerificationTestCase):
+    """共享缓存测试"""
+    
+    def setUp(self):
+        super().setUp()
+        self.redis = FakeRedis()
+        reset_cache(Cache(RedisCacheBackend(self.redis), prefix="test:"))
+    
+    def test_namespaced_keys_ttl_and_errors(self):
+        """键带前缀和命名空间，未命中时加载并按 TTL 写入，Redis 出错按未命中处理"""
+        cache = Cache(RedisCacheBackend(self.redis), prefix="test:")
+        loader = Mock(return_value={"order_sn": "A"})
+        
+        self.assertEqual(cache.get_or_load("order", "A", loader, 30), {"order_sn": "A"})
+        self.assertEqual(cache.get_or_load("order", "A", loader, 30), {"order_sn": "A"})
+        self.assertEqual(loader.call_count, 1)
+        self.assertEqual(self.redis.ttls, {"test:order:A": 30})
+        
+        self.redis.fail = True
+        self.assertIsNone(cache.get("order", "A"))
+        self.redis.fail = False
+        # 出错后一段时间内不再访问 Redis
+        self.assertIsNone(cache.get("order", "A"))
+        
+        memory = Cache(MemoryCacheBackend(), prefix="test:")
+        memory.set("order", "A", {"order_sn": "A"}, 30)
+        memory.get("order", "A")["order_sn"] = "B"
+        self.assertEqual(memory.get("order", "A"), {"order_sn": "A"})
+    
+    def test_redis_unreachable_falls_back_with_capped_ttl(self):
+        """连不上 Redis 时回退到进程内缓存：过期时间受限，使用时记录警告，健康检查可见"""
+        from web.interface import create_web_interface
+        
+        with patch.object(RedisCacheBackend, "from_url", side_effect=ConnectionError("redis down")), \
+                patch("utils.cache.settings.cache_memory_max_ttl", 5):
+            backend = create_cache_backend("redis")
+        self.assertEqual((backend.name, backend.fallback, backend.max_ttl), ("memory", True, 5))
+        
+        cache = Cache(backend, prefix="test:")
+        with patch("utils.cache.logger") as logger:
+            cache.set("order", "A", {"order_sn": "A"}, 60)
+            cache.get("order", "A")
+        # 同一段时间内只警告一次
+        self.assertEqual(logger.warning.call_count, 1)
+        _, expires_at = backend._cache._data["test:order:A"]
+        self.assertLessEqual(expires_at - time.monotonic(), 5)
+        
+        # 显式配置的进程内缓存不是回退，不限制时按调用方的 TTL
+        memory = MemoryCacheBackend(max_ttl=0)
+        memory.set("A", b"1", 60)
+        self.assertGreater(memory._cache._data["A"][1] - time.monotonic(), 5)
+        
+        reset_cache(cache)
+        health = next(route for route in create_web_interface().app.routes if route.path == "/api/health")
+        self.assertEqual(asyncio.run(health.endpoint())["cache"],
+                         {"backend": "memory", "fallback": True, "max_ttl": 5})
+    
+    def test_order_detail_and_stats_invalidated_on_commit(self):
+        """订单详情和仪表板统计命中缓存，核销提交后失效"""
+        self.create_orders(2)
+        order_service = AsyncOrderService(read_only=True)
+        stats_service = AsyncStatsService(read_only=True)
+        
+        async def query():
+            return (await order_service.get_order_detail("TEST000000000001"),
+                    await stats_service.get_dashboard_stats())
+        
+        detail, stats = asyncio.run(query())
+        self.assertFalse(detail["verification_status"])
+        self.assertIn("test:order:TEST000000000001", self.redis.data)
+        self.assertIn("test:stats:dashboard", self.redis.data)
+        
+        self.verifier.verify_order("TEST000000000001", "00000001")
+        self.assertNotIn("test:order:TEST000000000001", self.redis.data)
+        self.assertNotIn("test:stats:dashboard", self.redis.data)
+        
+        detail, stats = asyncio.run(query())
+        self.assertTrue(detail["verification_status"])
+        self.assertEqual(stats["verified_orders"], 1)
+        self.assertIsNone(asyncio.run(order_service.get_order_detail("MISSING")))
+    
+    def test_async_services_access_redis_off_event_loop(self):
+        """异步服务在线程池中读写 Redis，不阻塞事件循环"""
+        self.create_orders(1)
+        threads = []
+        get, set_ = self.redis.get, self.redis.set
+        self.redis.get = lambda key: threads.append(threading.get_ident()) or get(key)
+        self.redis.set = lambda key, value, ex=None: threads.append(threading.get_ident()) or set_(key, value, ex)
+        
+        async def query():
+            await AsyncOrderService(read_only=True).get_order_detail("TEST000000000000")
+            await AsyncStatsService(read_only=True).get_dashboard_stats()
+            return threading.get_ident()
+        
+        loop_thread = asyncio.run(query())
+        self.assertEqual(len(threads), 4)
+        self.assertNotIn(loop_thread, threads)
+    
+    def test_api_order_detail_not_cached(self):
+        """平台订单详情每次都请求接口（退款、取消等状态在平台侧变化，不能读到旧值）"""
+        client = PddAPIClient()
+        response = {"order_detail_get_response": {"order": {"order_sn": "A", "order_status": 1}}}
+        with patch.object(client, "_make_request", return_value=response) as make_request:
+            client.get_order_detail("A")
+            client.get_order_detail("A")
+            self.assertEqual(make_request.call_count, 2)
+        self.assertEqual(self.redis.data, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
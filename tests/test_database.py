@@ -0,0 +1,32 @@
+"""
+共享数据库引擎测试
+"""
+import unittest
+
+from services.order_service import OrderService
+from services.verification_service import VerificationService
+from tests.base import VerificationTestCase
+
+
+class TestSharedEngine(VerificationTestCase):
+    """进程级共享引擎测试"""
+    
+    def test_services_share_engine(self):
+        """不同服务共享同一个引擎，各自持有独立会话"""
+        order_service = OrderService()
+        try:
+            self.assertIs(order_service.engine, self.service.engine)
+            self.assertIsNot(order_service.db, self.service.db)
+        finally:
+            order_service.close()
+    
+    def test_injected_session_not_closed(self):
+        """传入的会话由调用方管理，服务关闭时不关闭它"""
+        service = VerificationService(db=self.service.db)
+        self.create_orders(1)
+        service.close()
+        self.assertIsNotNone(self.service.get_order_by_sn("TEST000000000000"))
+
+
+if __name__ == "__main__":
+    unittest.main()
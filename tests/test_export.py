@@ -0,0 +1,56 @@
+"""
+数据导出测试
+"""
+import csv
+import gzip
+import io
+import json
+import unittest
+from datetime import datetime, timedelta
+
+from models.order import Order
+from core.exceptions import PddAutoVerifyException
+from services.export_service import ExportService, ORDER_EXPORT_COLUMNS
+from utils.export import encode_rows
+from tests.base import VerificationTestCase
+
+
+class TestExport(VerificationTestCase):
+    """流式导出测试"""
+    
+    def test_export_orders_and_records(self):
+        """跨批次按键集顺序导出，按时间、状态、店铺筛选，CSV 可 gzip 压缩"""
+        self.create_orders(5)
+        base_time = datetime(2024, 1, 31, 23, 0, 0)
+        for i, order in enumerate(self.service.db.query(Order).order_by(Order.id)):
+            order.created_at = base_time + timedelta(hours=i // 2)  # 每两个订单同一时间
+            order.shop_id = "shop_a" if i % 2 == 0 else "shop_b"
+        self.service.db.commit()
+        self.verifier.verify_order("TEST000000000000", "00000000")
+        self.verifier.verify_order("TEST000000000001", "00000001")
+        
+        service = ExportService(read_only=True)
+        try:
+            rows = list(service.iter_orders(batch_size=2))
+            self.assertEqual([row["order_sn"] for row in rows], [f"TEST{i:012d}" for i in range(5)])
+            february = list(service.iter_orders(start_time=datetime(2024, 2, 1), end_time=datetime(2024, 2, 1, 1),
+                                                shop_id="shop_a", batch_size=1))
+            self.assertEqual([row["order_sn"] for row in february], ["TEST000000000002"])
+            records = list(service.iter_verification_records(verification_status=True, shop_id="shop_b"))
+            self.assertEqual([row["order_sn"] for row in records], ["TEST000000000001"])
+            
+            data = gzip.decompress(b"".join(encode_rows(iter(rows), ORDER_EXPORT_COLUMNS, "csv", compress=True)))
+            table = list(csv.reader(io.StringIO(data.decode("utf-8-sig"))))
+            self.assertEqual(table[0], list(ORDER_EXPORT_COLUMNS))
+            self.assertEqual(len(table), 6)
+            lines = b"".join(encode_rows(iter(records), ("order_sn", "verification_time"), "ndjson")).splitlines()
+            self.assertEqual(json.loads(lines[0])["order_sn"], "TEST000000000001")
+        finally:
+            service.close()
+        
+        with self.assertRaises(PddAutoVerifyException):
+            encode_rows(iter(rows), ORDER_EXPORT_COLUMNS, "xlsx")
+
+
+if __name__ == "__main__":
+    unittest.main()
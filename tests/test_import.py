@@ -0,0 +1,97 @@
+"""
+订单批量导入测试
+"""
+import json
+import os
+import unittest
+from unittest.mock import patch
+
+from sqlalchemy import inspect
+
+from models.order import OrderStatus
+from services.export_service import ExportService, ORDER_EXPORT_COLUMNS
+from services.import_service import OrderImportService
+from services.order_service import OrderService
+from services.stats_service import StatsService
+from utils.export import encode_rows
+from tests.base import VerificationTestCase
+
+
+class TestOrderImport(VerificationTestCase):
+    """订单批量导入测试"""
+    
+    def test_import_ndjson_and_csv(self):
+        """批量导入跳过重复和无效行，写入商品明细和统计计数，导出文件可以重新导入"""
+        self.create_orders(1)
+        goods = [{"goods_id": "goods_1", "goods_type": 1, "quantity": 2, "price": 5.0}]
+        lines = [
+            {"order_sn": f"IMP{i}", "buyer_id": "b", "buyer_name": "买家", "order_status": OrderStatus.SHIPPED.value,
+             "order_amount": 10.0, "shipped_at": "2024-01-01 10:00:00", "created_at": "2024-01-01T09:00:00",
+             "goods_list": goods}
+            for i in range(5)
+        ]
+        lines.append(dict(lines[0]))  # 同批重复
+        lines.append({"order_sn": "TEST000000000000", "buyer_id": "b", "buyer_name": "买家",
+                      "order_status": 2, "order_amount": 1})  # 已存在
+        lines.append({"order_sn": "BAD", "order_status": 2})
+        path = os.path.join(self.tmp_dir.name, "orders.ndjson")
+        with open(path, "w", encoding="utf-8") as file:
+            file.write("\n".join(json.dumps(line, ensure_ascii=False) for line in lines) + "\nnot json\n")
+        
+        importer = OrderImportService(batch_size=3)
+        try:
+            result = importer.import_file(path, defer_indexes=True)
+            self.assertEqual({key: result[key] for key in ("read", "inserted", "duplicates", "invalid", "items")},
+                             {"read": 9, "inserted": 5, "duplicates": 2, "invalid": 2, "items": 5})
+            indexes = {index["name"] for index in inspect(self.service.engine).get_indexes("orders")}
+            self.assertIn("ix_orders_pending_verify", indexes)
+            
+            order_service = OrderService(self.service.db)
+            self.assertEqual(order_service.get_goods_sales()[0]["quantity"], 10)
+            self.assertIsNotNone(order_service.get_order_by_sn("IMP0").verify_priority)
+            stats_service = StatsService(self.service.db)
+            imported = stats_service.get_dashboard_stats()
+            stats_service.rebuild_counters()
+            self.assertEqual(stats_service.get_dashboard_stats(), imported)
+            
+            # 导出的 CSV 重新导入时全部为重复行
+            csv_path = os.path.join(self.tmp_dir.name, "orders.csv.gz")
+            exporter = ExportService()
+            with open(csv_path, "wb") as file:
+                for chunk in encode_rows(exporter.iter_orders(), ORDER_EXPORT_COLUMNS, "csv", compress=True):
+                    file.write(chunk)
+            exporter.close()
+            again = importer.import_file(csv_path)
+            self.assertEqual((again["read"], again["duplicates"], again["invalid"]), (6, 6, 0))
+        finally:
+            importer.close()
+
+    
+    def test_import_skips_duplicate_verification_code(self):
+        """核销码与已有订单重复的行计为重复，不写入商品明细和统计计数（含不支持批量 RETURNING 的数据库）"""
+        self.create_orders(1)
+        goods = [{"goods_id": "goods_1", "goods_type": 1, "quantity": 1, "price": 5.0}]
+        
+        for returning in (True, False):
+            lines = [
+                {"order_sn": f"CODE{returning}", "buyer_id": "b", "buyer_name": "买家", "order_status": 2,
+                 "order_amount": 1, "verification_code": "00000000", "goods_list": goods},
+                {"order_sn": f"NEW{returning}", "buyer_id": "b", "buyer_name": "买家", "order_status": 2,
+                 "order_amount": 1, "verification_code": f"NEW{returning}", "goods_list": goods},
+            ]
+            importer = OrderImportService()
+            try:
+                with patch.object(importer.engine.dialect, "insert_executemany_returning", returning):
+                    result = importer.import_rows(lines)
+                self.assertEqual((result["inserted"], result["duplicates"], result["items"]), (1, 1, 1))
+                
+                stats_service = StatsService(importer.db)
+                imported = stats_service.get_dashboard_stats()
+                stats_service.rebuild_counters()
+                self.assertEqual(stats_service.get_dashboard_stats(), imported)
+            finally:
+                importer.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+"""
+数据库迁移测试
+"""
+import os
+import tempfile
+import unittest
+from datetime import datetime
+
+from alembic.config import Config
+from alembic.script import ScriptDirectory
+from sqlalchemy import create_engine, inspect, select
+
+from models.database import ALEMBIC_INI, init_database
+from models.stats import StatCounter, rebuild_stat_counters
+
+
+class TestMigrations(unittest.TestCase):
+    """数据库迁移测试"""
+    
+    def test_upgrade_legacy_database(self):
+        """旧版本数据库升级后补齐列和索引，并记录迁移版本"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            engine = create_engine(f"sqlite:///{os.path.join(tmp_dir, 'legacy.db')}")
+            with engine.begin() as conn:
+                conn.exec_driver_sql(
+                    "CREATE TABLE orders (id INTEGER PRIMARY KEY, order_sn VARCHAR(50) NOT NULL, "
+                    "buyer_id VARCHAR(50) NOT NULL, buyer_name VARCHAR(100) NOT NULL, "
+                    "order_status INTEGER NOT NULL, order_amount FLOAT NOT NULL, "
+                    "verification_code VARCHAR(100), verification_status BOOLEAN, goods_info TEXT, "
+                    "created_at DATETIME)"
+                )
+                conn.exec_driver_sql(
+                    "INSERT INTO orders (order_sn, buyer_id, buyer_name, order_status, order_amount, goods_info, "
+                    "created_at) VALUES ('LEGACY1', 'b', '买家', 2, 1.0, "
+                    "'[{\"goods_id\": \"g1\", \"goods_type\": 1, \"quantity\": \"2\"}]', '2024-01-01 10:30:00')"
+                )
+            
+            init_database(engine)
+            init_database(engine)
+            
+            inspector = inspect(engine)
+            columns = {column["name"] for column in inspector.get_columns("orders")}
+            indexes = {index["name"] for index in inspector.get_indexes("orders")}
+            self.assertIn("verify_attempts", columns)
+            self.assertIn("ix_orders_pending_verify", indexes)
+            with engine.connect() as conn:
+                self.assertEqual(conn.exec_driver_sql("SELECT verify_attempts FROM orders").scalar(), 0)
+                version = conn.exec_driver_sql("SELECT version_num FROM alembic_version").scalar()
+                self.assertEqual(
+                    conn.exec_driver_sql("SELECT goods_id, goods_type, quantity FROM order_items").all(),
+                    [("g1", 1, 2)]
+                )
+                # 迁移中固定的回填与当前的重建逻辑口径一致
+                counters = set(conn.execute(select(StatCounter.bucket, StatCounter.bucket_start,
+                                                   StatCounter.name, StatCounter.value)))
+                self.assertIn(("day", datetime(2024, 1, 1), "orders_created", 1), counters)
+                rebuild_stat_counters(conn)
+                self.assertEqual(set(conn.execute(select(StatCounter.bucket, StatCounter.bucket_start,
+                                                         StatCounter.name, StatCounter.value))), counters)
+            head = ScriptDirectory.from_config(Config(ALEMBIC_INI)).get_current_head()
+            self.assertEqual(version, head)
+            engine.dispose()
+
+
+if __name__ == "__main__":
+    unittest.main()
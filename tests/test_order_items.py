@@ -0,0 +1,78 @@
+"""
+订单商品明细测试
+"""
+import asyncio
+import unittest
+from unittest.mock import Mock
+
+from models.order import Order, OrderStatus, backfill_order_items
+from core.order_manager import OrderManager
+from services.async_service import AsyncOrderService
+from services.order_service import OrderService
+from tests.base import VerificationTestCase
+
+
+class TestOrderItems(VerificationTestCase):
+    """订单商品明细测试"""
+    
+    def order_info(self, order_sn: str, goods_list: list) -> dict:
+        return {
+            "order_sn": order_sn,
+            "buyer_id": "buyer",
+            "buyer_name": "买家",
+            "order_status": OrderStatus.PAID.value,
+            "pay_time": "2024-01-01 10:00:00",
+            "order_amount": 30.0,
+            "goods_list": goods_list,
+        }
+    
+    def test_ingest_writes_order_items(self):
+        """订单入库时拆出商品明细，按商品筛选订单和统计销量走 order_items"""
+        manager = OrderManager(self.service.db)
+        manager.api_client = Mock(shop_id="shop_1")
+        manager.api_client.send_order_goods.return_value = {"order_goods_send_response": {"success": True}}
+        goods = [
+            {"goods_id": "goods_1", "goods_name": "充值卡", "goods_type": 1, "quantity": 2, "price": 10.0},
+            {"goods_id": "goods_2", "goods_name": "实物", "goods_type": 0, "quantity": 1, "price": 5.0},
+        ]
+        for order_sn, goods_list in (("ITEM1", goods), ("ITEM2", goods[:1])):
+            manager.api_client.get_order_detail.return_value = {
+                "order_detail_get_response": {"order": self.order_info(order_sn, goods_list)}
+            }
+            self.assertTrue(manager.process_order({"order_sn": order_sn}))
+        
+        order_service = manager.order_service
+        self.assertEqual([item.goods_id for item in order_service.get_order_items("ITEM1")], ["goods_1", "goods_2"])
+        self.assertTrue(order_service.is_virtual_order("ITEM2"))
+        # 发货内容写入 delivery_info，goods_info 保留商品列表
+        order = order_service.get_order_by_sn("ITEM1")
+        self.assertIn("goods_2", order.goods_info)
+        self.assertIn("card_password", order.delivery_info)
+        
+        page = order_service.list_orders(goods_id="goods_2")
+        self.assertEqual([order.order_sn for order in page.items], ["ITEM1"])
+        sales = order_service.get_goods_sales()
+        self.assertEqual(sales[0], {"goods_id": "goods_1", "goods_name": "充值卡", "goods_type": 1,
+                                    "order_count": 2, "quantity": 4, "amount": 40.0})
+        self.assertEqual(asyncio.run(AsyncOrderService().get_goods_sales(goods_type=0))[0]["goods_id"], "goods_2")
+    
+    def test_backfill_from_goods_info(self):
+        """迁移从已有订单的 goods_info 回填商品明细，无法解析的跳过"""
+        self.create_orders(3)
+        orders = self.service.db.query(Order).order_by(Order.id).all()
+        orders[0].goods_info = '[{"goods_id": "goods_1", "goods_type": "2", "quantity": 3}]'
+        orders[1].goods_info = '{"goods_type": "virtual"}'
+        self.service.db.commit()
+        
+        with self.service.engine.begin() as connection:
+            self.assertEqual(backfill_order_items(connection), 1)
+            self.assertEqual(backfill_order_items(connection), 0)
+        
+        order_service = OrderService(self.service.db)
+        items = order_service.get_order_items(orders[0].order_sn)
+        self.assertEqual([(item.goods_type, item.quantity) for item in items], [(2, 3)])
+        self.assertFalse(order_service.is_virtual_order(orders[1].order_sn))
+
+
+if __name__ == "__main__":
+    unittest.main()
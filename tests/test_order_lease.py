@@ -0,0 +1,86 @@
+"""
+订单租约测试
+"""
+import unittest
+from unittest.mock import patch
+
+from sqlalchemy import text
+
+from services.verification_service import VerificationService
+from tests.base import VerificationTestCase
+
+
+class TestOrderLease(VerificationTestCase):
+    """订单租约测试"""
+    
+    def test_workers_claim_without_overlap(self):
+        """测试两个进程认领的订单互不重叠"""
+        self.create_orders(5)
+        
+        first, _ = self.service.claim_unverified_orders("worker-a", limit=3)
+        second, _ = self.service.claim_unverified_orders("worker-b", limit=3)
+        
+        self.assertEqual(len(first), 3)
+        self.assertEqual(len(second), 2)
+        self.assertFalse({sn for _, sn, _ in first} & {sn for _, sn, _ in second})
+    
+    def test_concurrent_claims_without_overlap(self):
+        """测试另一进程在候选查询和UPDATE之间抢先认领时，两边认领的订单互不重叠"""
+        self.create_orders(5)
+        other = VerificationService()
+        execute = self.service.db.execute
+        other_claimed = []
+        
+        def claim_between_select_and_update(statement, *args, **kwargs):
+            if statement.is_dml and not other_claimed:
+                other_claimed.extend(other.claim_unverified_orders("worker-b", limit=3)[0])
+            return execute(statement, *args, **kwargs)
+        
+        try:
+            with patch.object(self.service.db, "execute", side_effect=claim_between_select_and_update):
+                claimed, _ = self.service.claim_unverified_orders("worker-a", limit=4)
+        finally:
+            other.close()
+        
+        self.assertEqual(len(other_claimed), 3)
+        self.assertEqual(len(claimed), 1)
+        self.assertFalse({order_id for order_id, _, _ in claimed} & {order_id for order_id, _, _ in other_claimed})
+    
+    def test_claim_when_database_truncates_fractional_seconds(self):
+        """测试数据库截断租约到期时间的秒以下部分时（如 MySQL DATETIME），仍能读回认领到的订单"""
+        self.create_orders(2)
+        execute = self.service.db.execute
+        
+        def truncate_after_update(statement, *args, **kwargs):
+            result = execute(statement, *args, **kwargs)
+            if statement.is_dml:
+                execute(text("UPDATE orders SET lease_expires_at = substr(lease_expires_at, 1, 19)"))
+            return result
+        
+        with patch.object(self.service.db, "execute", side_effect=truncate_after_update):
+            claimed, _ = self.service.claim_unverified_orders("worker-a", limit=2)
+        
+        self.assertEqual(len(claimed), 2)
+    
+    def test_expired_lease_can_be_reclaimed(self):
+        """测试租约到期后订单可被其他进程认领"""
+        self.create_orders(2)
+        
+        claimed, _ = self.service.claim_unverified_orders("worker-a", limit=2, lease_seconds=-1)
+        reclaimed, _ = self.service.claim_unverified_orders("worker-b", limit=2)
+        
+        self.assertEqual(claimed, reclaimed)
+    
+    def test_release_orders(self):
+        """测试释放租约后订单可被再次认领"""
+        self.create_orders(2)
+        
+        claimed, _ = self.service.claim_unverified_orders("worker-a", limit=2)
+        self.service.release_orders("worker-a", [order_id for order_id, _, _ in claimed])
+        reclaimed, _ = self.service.claim_unverified_orders("worker-b", limit=2)
+        
+        self.assertEqual(claimed, reclaimed)
+
+
+if __name__ == "__main__":
+    unittest.main()
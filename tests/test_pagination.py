@@ -0,0 +1,134 @@
+"""
+键集分页测试
+"""
+import asyncio
+import json
+import unittest
+from datetime import datetime
+
+from sqlalchemy import event
+
+from models.order import Order, OrderStatus, VerificationRecord
+from core.exceptions import PddAutoVerifyException
+from services.order_service import OrderService
+from utils.pagination import MAX_PAGE_SIZE
+from utils.serialization import dumps, rows_to_dicts
+from tests.base import VerificationTestCase
+
+
+class TestKeysetPagination(VerificationTestCase):
+    """键集分页测试"""
+    
+    def test_list_orders_pages_without_gaps(self):
+        """逐页翻完所有订单，不重复不遗漏，创建时间相同的订单按ID排序"""
+        self.create_orders(25)
+        created_at = datetime(2026, 1, 1)
+        self.service.db.query(Order).update({Order.created_at: created_at})
+        self.service.db.commit()
+        
+        order_service = OrderService()
+        try:
+            seen, cursor = [], None
+            while True:
+                page = order_service.list_orders(cursor=cursor, page_size=10)
+                seen.extend(order.order_sn for order in page.items)
+                cursor = page.next_cursor
+                if not page.has_more:
+                    break
+        finally:
+            order_service.close()
+        
+        self.assertEqual(seen, [f"TEST{i:012d}" for i in reversed(range(25))])
+    
+    def test_status_filtered_list_uses_index_order(self):
+        """按订单状态筛选的列表沿 (order_status, created_at, id) 索引读取，不额外排序"""
+        plans = []
+        
+        def explain(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().startswith("SELECT") and "FROM orders" in statement:
+                plans.extend(row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters))
+        
+        order_service = OrderService()
+        engine = order_service.db.get_bind()
+        event.listen(engine, "before_cursor_execute", explain)
+        try:
+            order_service.list_orders(status=OrderStatus.SHIPPED.value)
+        finally:
+            event.remove(engine, "before_cursor_execute", explain)
+            order_service.close()
+        
+        self.assertTrue(any("ix_orders_status_created_at_id" in plan for plan in plans), plans)
+        self.assertFalse(any("TEMP B-TREE" in plan for plan in plans), plans)
+    
+    def test_list_verification_records_with_filter(self):
+        """按核销状态筛选核销记录并翻页"""
+        self.create_orders(6)
+        for i in range(6):
+            if i % 2:
+                self.verifier.verify_order(f"TEST{i:012d}", f"TEST{i:012d}"[-8:])
+        
+        page = self.service.list_verification_records(page_size=2, verification_status=True)
+        self.assertEqual(len(page.items), 2)
+        self.assertTrue(page.has_more)
+        
+        page = self.service.list_verification_records(cursor=page.next_cursor, page_size=2,
+                                                      verification_status=True)
+        self.assertEqual([record.order_sn for record in page.items], ["TEST000000000001"])
+        self.assertFalse(page.has_more)
+    
+    def test_list_rows_serialize_like_to_dict(self):
+        """列表行对象的序列化结果与 to_dict() 相同（不含大文本列）"""
+        self.create_orders(1)
+        order_service = OrderService()
+        try:
+            row = order_service.list_orders(page_size=1).items[0]
+            expected = order_service.get_order_by_sn(row.order_sn).to_dict()
+        finally:
+            order_service.close()
+        del expected["goods_info"], expected["delivery_info"]
+        
+        self.assertEqual(json.loads(dumps(rows_to_dicts([row], row._fields)))[0], expected)
+    
+    def test_verifier_records_match_to_dict(self):
+        """核销器返回的核销记录与 VerificationRecord.to_dict() 相同"""
+        self.create_orders(1)
+        self.verifier.verify_order("TEST000000000000", "00000000")
+        
+        result = self.verifier.get_verification_records(order_sn="TEST000000000000")
+        expected = [record.to_dict() for record in self.service.db.query(VerificationRecord).all()]
+        self.assertEqual(result["records"], expected)
+        self.assertFalse(result["has_more"])
+    
+    def test_page_size_clamped_and_null_created_at_skipped(self):
+        """返回实际使用的每页条数；created_at 为空的行不在列表中，翻到它时不会因无法编码游标而出错"""
+        from web.interface import create_web_interface
+        
+        self.create_orders(3)
+        self.service.db.query(Order).filter(Order.order_sn == "TEST000000000001").update({Order.created_at: None})
+        self.service.db.commit()
+        
+        order_service = OrderService()
+        try:
+            page = order_service.list_orders(page_size=1)
+            self.assertEqual(page.page_size, 1)
+            page = order_service.list_orders(cursor=page.next_cursor, page_size=1)
+            self.assertEqual([order.order_sn for order in page.items], ["TEST000000000000"])
+            self.assertFalse(page.has_more)
+        finally:
+            order_service.close()
+        
+        api_get_orders = next(route.endpoint for route in create_web_interface().app.routes
+                              if route.path == "/api/orders")
+        body = json.loads(asyncio.run(api_get_orders(page_size=1000)).body)
+        self.assertEqual(body["page_size"], MAX_PAGE_SIZE)
+        self.assertEqual(len(body["orders"]), 2)
+    
+    def test_invalid_cursor(self):
+        """无效游标抛出 INVALID_CURSOR"""
+        with self.assertRaises(PddAutoVerifyException) as context:
+            self.service.list_verification_records(cursor="not-a-cursor")
+        self.assertEqual(context.exception.error_code, "INVALID_CURSOR")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+"""
+SQL 执行统计测试
+"""
+import asyncio
+import unittest
+from unittest.mock import patch
+
+from config.settings import settings
+from models.query_stats import statement_shape, track_queries
+from services.order_service import OrderService
+from tests.base import VerificationTestCase
+from utils.cache import Cache, reset_cache
+
+
+async def asgi_get(app, path: str) -> dict:
+    """向 ASGI 应用发送一个 GET 请求，返回响应头（响应结束后才报告客户端断开）"""
+    messages = []
+    finished = asyncio.Event()
+    requested = False
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        messages.append(message)
+        if message["type"] == "http.response.body" and not message.get("more_body"):
+            finished.set()
+
+    await app({"type": "http", "method": "GET", "path": path, "raw_path": path.encode(),
+               "query_string": b"", "headers": [], "root_path": ""}, receive, send)
+    return dict(messages[0]["headers"])
+
+
+class TestQueryStats(VerificationTestCase):
+    """SQL 执行统计测试"""
+
+    def test_track_queries_counts_statements(self):
+        """范围内按语句形状计数，范围外不计入，慢查询按阈值计数"""
+        self.create_orders(3)
+        order_service = OrderService(self.service.db)
+        with patch.object(settings, "slow_query_threshold_ms", 0), track_queries() as queries:
+            for i in range(3):
+                order_service.get_order_by_sn(f"TEST{i:012d}", include_archive=False)
+        self.assertEqual(queries.count, 3)
+        self.assertEqual(queries.slow, 0)
+        self.assertEqual(queries.most_repeated()[1], 3)
+        self.assertIn("执行最多的语句（3 次）", queries.summary(3))
+
+        order_service.get_order_by_sn("TEST000000000000", include_archive=False)
+        self.assertEqual(queries.count, 3)
+
+        with patch.object(settings, "slow_query_threshold_ms", 1e-9), track_queries() as queries:
+            order_service.get_order_stats()
+        self.assertEqual((queries.count, queries.slow), (1, 1))
+
+        self.assertEqual(
+            statement_shape("SELECT id\n  FROM orders WHERE id IN (?, ?, ?, ?, ?, ?)"),
+            "SELECT id FROM orders WHERE id IN (?, ...)"
+        )
+
+    def test_query_count_header(self):
+        """Web 请求的响应头带本次请求执行的SQL数"""
+        from web.interface import create_web_interface
+
+        self.create_orders(2)
+        reset_cache(Cache(None))
+        app = create_web_interface().app
+
+        headers = asyncio.run(asgi_get(app, "/api/orders"))
+        self.assertEqual(headers[b"x-query-count"], b"1")
+        headers = asyncio.run(asgi_get(app, "/api/orders/TEST000000000001"))
+        self.assertEqual(headers[b"x-query-count"], b"2")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+"""
+只读副本路由测试
+"""
+import os
+import unittest
+from unittest.mock import patch
+
+from config.settings import settings
+from models.order import Order
+from models.read_routing import ReadRouter, ReplicaHeartbeat
+from core.exceptions import DatabaseException
+from tests.base import VerificationTestCase
+
+
+class TestReadRouting(VerificationTestCase):
+    """只读查询路由测试"""
+    
+    def test_readonly_connection_rejects_writes(self):
+        """只读连接读到主库最新数据，写入被拒绝"""
+        router = ReadRouter(settings.database_url, sqlite_mode="readonly", check_interval=0)
+        session = router.session_factory()
+        try:
+            self.create_orders(3)
+            self.assertIs(router.engine(), router.replica)
+            self.assertEqual(session.query(Order).count(), 3)
+            
+            session.add(Order(order_sn="RO", buyer_id="b", buyer_name="n", order_amount=1.0))
+            with self.assertRaises(DatabaseException):
+                session.flush()
+        finally:
+            session.close()
+            router.close()
+    
+    def test_snapshot_staleness_falls_back_to_primary(self):
+        """快照只包含刷新前的数据，超过延迟上限时回退主库"""
+        with patch.object(settings, "sqlite_snapshot_path", os.path.join(self.tmp_dir.name, "snapshot.db")):
+            router = ReadRouter(settings.database_url, sqlite_mode="snapshot", check_interval=0)
+        session = router.session_factory()
+        try:
+            self.create_orders(2)
+            self.assertEqual(session.query(Order).count(), 0)
+            session.rollback()
+            
+            router.snapshotter.refresh()
+            self.assertEqual(session.query(Order).count(), 2)
+            session.rollback()
+            
+            router.max_staleness = -1
+            self.assertIs(router.engine(), router.primary)
+        finally:
+            session.close()
+            router.close()
+    
+    def test_replica_without_heartbeat_uses_primary(self):
+        """副本没有心跳时无法判断延迟，回退主库；写入心跳后切到副本"""
+        router = ReadRouter(settings.database_url, read_url=settings.database_url, check_interval=0)
+        try:
+            self.assertIs(router.engine(), router.primary)
+            ReplicaHeartbeat(self.service.engine, interval=60).beat()
+            self.assertIs(router.engine(), router.replica)
+            self.assertLess(router.staleness(), 5)
+        finally:
+            router.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
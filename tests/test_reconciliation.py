@@ -0,0 +1,57 @@
+"""
+核销对账测试
+"""
+import os
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import Mock
+
+from core.reconciliation import VerificationReconciler
+from tests.base import VerificationTestCase
+
+
+class TestVerificationReconciler(VerificationTestCase):
+    """核销对账测试"""
+    
+    def test_reconcile_and_repair(self):
+        """测试归并对账的差异分类和修复"""
+        self.create_orders(3)
+        self.verifier.verify_order("TEST000000000000", "00000000")
+        order = self.service.get_order_by_sn("TEST000000000002")
+        order.verification_status = True
+        order.verification_time = datetime.now()
+        self.service.db.commit()
+        
+        now = datetime.now()
+        remote_records = [
+            {"order_sn": "UNKNOWN00000001", "verification_code": "x", "success": True, "time": now.strftime("%Y-%m-%d %H:%M:%S")},
+            {"order_sn": "TEST000000000001", "verification_code": "00000001", "success": True, "time": now.strftime("%Y-%m-%d %H:%M:%S")},
+            {"order_sn": "TEST000000000000", "verification_code": "00000000", "success": True, "time": now.strftime("%Y-%m-%d %H:%M:%S")},
+        ]
+        reconciler = VerificationReconciler(window_hours=24, page_size=2)
+        reconciler.api_client = Mock()
+        reconciler.api_client.get_verification_record.side_effect = lambda page, page_size, **kwargs: {
+            "verification_record_get_response": {
+                "records": remote_records[(page - 1) * page_size:page * page_size]
+            }
+        }
+        
+        report_file = os.path.join(self.tmp_dir.name, "report.ndjson")
+        summary = reconciler.reconcile(now - timedelta(hours=1), now + timedelta(hours=1),
+                                       repair=True, report_file=report_file)
+        reconciler.close()
+        
+        self.assertEqual(summary["matched"], 1)
+        self.assertEqual(summary["diffs"], {
+            "missing_record": 1, "missing_remote": 1, "missing_local": 1, "unknown_order": 1
+        })
+        self.assertEqual(summary["repaired"], 2)
+        self.service.release()
+        self.assertTrue(self.service.get_order_by_sn("TEST000000000001").verification_status)
+        self.assertEqual(len(self.service.list_verification_records(order_sn="TEST000000000002").items), 1)
+        with open(report_file, encoding="utf-8") as f:
+            self.assertEqual(len(f.readlines()), 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+"""
+核销记录缓冲写入测试
+"""
+import os
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+
+from sqlalchemy.exc import OperationalError
+
+from services.verification_record_writer import RECORD_FIELDS, BufferedVerificationRecordWriter
+from tests.base import VerificationTestCase
+
+
+class TestBufferedVerificationRecordWriter(VerificationTestCase):
+    """核销记录缓冲写入测试"""
+    
+    def setUp(self):
+        super().setUp()
+        self.spool_file = os.path.join(self.tmp_dir.name, "records.spool")
+        self.writer = BufferedVerificationRecordWriter(
+            self.service.engine, max_size=3, flush_interval=60, spool_file=self.spool_file
+        )
+    
+    def tearDown(self):
+        self.writer.close()
+        super().tearDown()
+    
+    def add_records(self, count: int):
+        for i in range(count):
+            self.writer.add(self.verifier._build_verification_record(
+                f"TEST{i:012d}", f"{i:08d}", False, "api", "API核销失败"
+            ))
+    
+    def test_flush_on_size(self):
+        """测试达到数量阈值时批量写入"""
+        self.add_records(2)
+        self.assertEqual(self.service.list_verification_records(page_size=100).items, [])
+        
+        self.add_records(1)
+        self.assertEqual(self.writer.pending_count(), 0)
+        self.assertEqual(len(self.service.list_verification_records(page_size=100).items), 3)
+    
+    def test_spool_when_locked(self):
+        """测试数据库锁定时写入溢出文件并在下次刷新时回放"""
+        self.add_records(2)
+        locked = OperationalError("INSERT", {}, Exception("database is locked"))
+        with patch.object(self.writer, "_insert_rows", side_effect=locked):
+            self.assertEqual(self.writer.flush(), 0)
+        self.assertTrue(os.path.exists(self.spool_file))
+        
+        self.add_records(1)
+        self.assertEqual(self.writer.flush(), 3)
+        self.assertFalse(os.path.exists(self.spool_file))
+        self.assertEqual(len(self.service.list_verification_records(page_size=100).items), 3)
+    
+    def test_respool_pending_on_any_error(self):
+        """测试非数据库异常时缓冲区和已回放的记录都放回溢出文件"""
+        self.add_records(2)
+        with patch.object(self.writer, "_insert_rows", side_effect=OperationalError("INSERT", {}, Exception("locked"))):
+            self.writer.flush()
+        
+        self.add_records(1)
+        with patch.object(self.writer, "_insert_rows", side_effect=RuntimeError("连接断开")):
+            self.assertEqual(self.writer.flush(), 0)
+        self.assertEqual(self.writer.pending_count(), 0)
+        
+        self.assertEqual(self.writer.flush(), 3)
+        self.assertEqual(len(self.service.list_verification_records(page_size=100).items), 3)
+    
+    def test_spool_appended_during_replay_kept(self):
+        """测试回放期间其他进程追加到溢出文件的记录不会被删除"""
+        self.add_records(2)
+        with patch.object(self.writer, "_insert_rows", side_effect=OperationalError("INSERT", {}, Exception("locked"))):
+            self.writer.flush()
+        with open(self.spool_file, "a", encoding="utf-8") as f:
+            f.write("not json\n")
+        
+        other = {field: None for field in RECORD_FIELDS}
+        other.update(order_sn="TEST000000000099", verification_code="00000099",
+                     verification_status=True, created_at=datetime.now())
+        insert_rows = self.writer._insert_rows
+        
+        def insert_while_other_process_spools(rows):
+            self.writer._append_spool([other])
+            insert_rows(rows)
+        
+        with patch.object(self.writer, "_insert_rows", side_effect=insert_while_other_process_spools):
+            self.assertEqual(self.writer.flush(), 2)
+        self.assertTrue(os.path.exists(f"{self.spool_file}.bad"))
+        self.assertEqual(self.writer.flush(), 1)
+        self.assertEqual(len(self.service.list_verification_records(page_size=100).items), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
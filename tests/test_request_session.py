@@ -0,0 +1,37 @@
+"""
+Web 请求会话测试
+"""
+import unittest
+
+from models.database import get_db
+from models.order import Order
+from tests.base import VerificationTestCase
+
+
+class TestRequestSession(VerificationTestCase):
+    """每个请求独立会话测试"""
+    
+    def test_request_session_scope(self):
+        """每个请求使用独立会话，核销器共享缓存但写入请求的会话"""
+        self.create_orders(1)
+        dependency = get_db()
+        db = next(dependency)
+        verifier = self.verifier.for_session(db)
+        self.assertIs(verifier.verification_service.db, db)
+        self.assertIsNot(self.verifier.verification_service.db, db)
+        self.assertIs(verifier.code_cache, self.verifier.code_cache)
+        
+        result = verifier.verify_order("TEST000000000000", "00000000")
+        self.assertTrue(result["success"])
+        
+        # 请求失败时回滚并关闭会话
+        db.add(Order(order_sn="BROKEN"))
+        with self.assertRaises(RuntimeError):
+            dependency.throw(RuntimeError("请求失败"))
+        self.assertFalse(db.in_transaction())
+        self.assertIsNone(self.service.get_order_by_sn("BROKEN"))
+        self.assertTrue(self.service.get_order_by_sn("TEST000000000000").verification_status)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,28 @@
+"""
+核销重试策略测试
+"""
+import unittest
+
+from core.retry_policy import RetryPolicy
+
+
+class TestRetryPolicy(unittest.TestCase):
+    """核销重试策略测试"""
+    
+    def test_exponential_backoff(self):
+        """测试指数退避和最大等待时间"""
+        policy = RetryPolicy(base_delay=60, max_delay=300, max_attempts=5)
+        
+        self.assertEqual([policy.next_delay(n) for n in range(1, 5)], [60, 120, 240, 300])
+    
+    def test_dead_letter(self):
+        """测试超过最大次数或不可恢复错误转入死信"""
+        policy = RetryPolicy(base_delay=60, max_delay=300, max_attempts=3)
+        
+        self.assertFalse(policy.schedule(2, "API_ERROR")[1])
+        self.assertEqual(policy.schedule(3, "API_ERROR"), (None, True))
+        self.assertEqual(policy.schedule(1, "CODE_MISMATCH"), (None, True))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,26 @@
+"""
+SQLite 调优测试
+"""
+import unittest
+
+from config.settings import settings
+from models.database import WalCheckpointer
+from tests.base import VerificationTestCase
+
+
+class TestSqlitePragmas(VerificationTestCase):
+    """SQLite 连接配置和WAL检查点测试"""
+    
+    def test_sqlite_pragmas_applied(self):
+        """SQLite连接按配置启用WAL和锁等待"""
+        with self.service.engine.connect() as conn:
+            self.assertEqual(conn.exec_driver_sql("PRAGMA journal_mode").scalar(), "wal")
+            self.assertEqual(conn.exec_driver_sql("PRAGMA busy_timeout").scalar(), settings.sqlite_busy_timeout)
+        
+        self.create_orders(10)
+        busy, _, _ = WalCheckpointer(self.service.engine, interval=60).checkpoint()
+        self.assertEqual(busy, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
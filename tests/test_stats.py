@@ -0,0 +1,85 @@
+"""
+统计测试
+"""
+import os
+import unittest
+from datetime import datetime
+
+from services.order_service import OrderService
+from services.stats_service import StatsService
+from services.verification_record_writer import BufferedVerificationRecordWriter
+from tests.base import VerificationTestCase
+
+
+class TestDashboardStats(VerificationTestCase):
+    """仪表板聚合统计测试"""
+    
+    def test_order_and_verification_stats(self):
+        """订单按状态和核销状态计数，核销记录按成功失败计数"""
+        self.create_orders(5)
+        self.verifier.verify_order("TEST000000000000", "00000000")
+        self.verifier.api_client.verify_virtual_goods.return_value = {
+            "virtual_goods_verify_response": {"success": False}
+        }
+        self.verifier.verify_order("TEST000000000001", "00000001")
+        
+        order_service = OrderService()
+        try:
+            order_stats = order_service.get_order_stats()
+        finally:
+            order_service.close()
+        self.assertEqual(order_stats["total_orders"], 5)
+        self.assertEqual(order_stats["shipped_orders"], 4)
+        self.assertEqual(order_stats["finished_orders"], 1)
+        self.assertEqual(order_stats["verified_orders"], 1)
+        self.assertEqual(order_stats["verifiable_orders"], 4)
+        
+        self.assertEqual(self.service.get_verification_stats(), {
+            "total_verifications": 2,
+            "successful_verifications": 1,
+            "failed_verifications": 1
+        })
+    
+    def test_stat_counters_match_tables(self):
+        """计数器随写入增量维护，与聚合查询和重建结果一致"""
+        self.create_orders(5)
+        self.verifier.verify_order("TEST000000000000", "00000000")
+        order = self.service.get_order_by_sn("TEST000000000001")
+        self.service.db.delete(order)
+        self.service.db.commit()
+        
+        writer = BufferedVerificationRecordWriter(self.service.engine, max_size=10, flush_interval=60,
+                                                  spool_file=os.path.join(self.tmp_dir.name, "spool"))
+        try:
+            self.verifier.record_writer = writer
+            self.verifier.api_client.verify_virtual_goods.return_value = {
+                "virtual_goods_verify_response": {"success": False}
+            }
+            self.verifier.verify_order("TEST000000000002", "00000002")
+            writer.flush()
+        finally:
+            writer.close()
+        
+        stats_service = StatsService()
+        order_service = OrderService()
+        try:
+            expected = dict(order_service.get_order_stats(), **self.service.get_verification_stats())
+            expected.pop("status_counts")
+            self.assertEqual(stats_service.get_dashboard_stats(), expected)
+            self.assertEqual(expected["total_orders"], 4)
+            self.assertEqual(expected["failed_verifications"], 1)
+            
+            report = stats_service.get_daily_report(datetime.now().date())
+            self.assertEqual(report["total_orders"], 5)
+            self.assertEqual(report["success_verifications"], 1)
+            self.assertEqual(report["failed_verifications"], 1)
+            
+            stats_service.rebuild_counters()
+            self.assertEqual(stats_service.get_dashboard_stats(), expected)
+        finally:
+            stats_service.close()
+            order_service.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,29 @@
+"""
+调度任务会话测试
+"""
+import unittest
+
+from models.database import unit_of_work
+from models.order import OrderStatus
+from services.order_service import OrderService
+from tests.base import VerificationTestCase
+
+
+class TestUnitOfWork(VerificationTestCase):
+    """任务级会话生命周期测试"""
+    
+    def test_unit_of_work_releases_objects(self):
+        """每次任务使用新会话，结束时提交并清空标识映射"""
+        self.create_orders(3)
+        with unit_of_work() as db:
+            orders = OrderService(db).get_orders_by_status(OrderStatus.SHIPPED.value)
+            orders[0].buyer_name = "已修改"
+            order_sn = orders[0].order_sn
+            self.assertEqual(len(db.identity_map), 3)
+        self.assertEqual(len(db.identity_map), 0)
+        self.service.db.expire_all()
+        self.assertEqual(self.service.get_order_by_sn(order_sn).buyer_name, "已修改")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,174 @@
+"""
+核销流程测试
+"""
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from sqlalchemy import event
+
+from config.settings import settings
+from models.order import Order, OrderStatus
+from core.exceptions import VerificationException
+from tests.base import VerificationTestCase
+
+
+class TestAutoVerifyOrders(VerificationTestCase):
+    """自动核销扫描测试"""
+    
+    def test_scan_in_batches(self):
+        """测试分批扫描核销全部订单"""
+        self.create_orders(7)
+        
+        result = self.verifier.auto_verify_orders(batch_size=3, max_orders=0, time_budget=0)
+        
+        self.assertEqual(result["processed"], 7)
+        self.assertEqual(result["verified"], 7)
+        self.assertTrue(result["finished"])
+        self.assertIsNone(self.service.get_job_cursor(self.verifier.cursor_name))
+        self.assertEqual(self.service.db.query(Order).filter(Order.verification_status == False).count(), 0)
+    
+    @patch.object(settings, "verify_priority_mode", "fifo")
+    def test_resume_from_cursor(self):
+        """测试按主键顺序扫描时，达到数量预算后从游标继续"""
+        self.create_orders(5)
+        
+        first = self.verifier.auto_verify_orders(batch_size=2, max_orders=3, time_budget=0)
+        self.assertEqual(first["processed"], 3)
+        self.assertFalse(first["finished"])
+        self.assertEqual(self.service.get_job_cursor(self.verifier.cursor_name), str(first["cursor"]))
+        
+        second = self.verifier.auto_verify_orders(batch_size=2, max_orders=0, time_budget=0)
+        self.assertEqual(second["processed"], 2)
+        self.assertTrue(second["finished"])
+        self.assertEqual(self.verifier.api_client.verify_virtual_goods.call_count, 5)
+
+    
+    def test_priority_order(self):
+        """测试按发货时长和订单金额的优先级顺序核销"""
+        self.create_orders(3)
+        now = datetime.now()
+        for order_sn, hours_ago, amount in (("TEST000000000000", 1, 10.0),
+                                             ("TEST000000000001", 48, 10.0),
+                                             ("TEST000000000002", 1, 5000.0)):
+            order = self.service.get_order_by_sn(order_sn)
+            order.shipped_at = now - timedelta(hours=hours_ago)
+            order.order_amount = amount
+        self.service.db.commit()
+        
+        self.verifier.auto_verify_orders(batch_size=1, max_orders=0, time_budget=0)
+        
+        verified = [call.args[0] for call in self.verifier.api_client.verify_virtual_goods.call_args_list]
+        self.assertEqual(verified, ["TEST000000000001", "TEST000000000002", "TEST000000000000"])
+    
+    def test_priority_computed_for_orders_written_mid_run(self):
+        """运行中写入的已发货订单带优先级键，按优先级认领时不会被游标跳过"""
+        self.create_orders(1)
+        first = self.service.get_order_by_sn("TEST000000000000")
+        self.assertIsNotNone(first.verify_priority)
+        
+        # 已认领到第一个订单后，同步写入新发货订单、已有订单改为已发货
+        self.service.db.add(Order(order_sn="LATE0001", buyer_id="buyer", buyer_name="买家",
+                                  order_status=OrderStatus.SHIPPED.value, order_amount=1.0,
+                                  shipped_at=datetime.now() + timedelta(minutes=1)))
+        paid = Order(order_sn="PAID0001", buyer_id="buyer", buyer_name="买家",
+                     order_status=OrderStatus.PAID.value, order_amount=1.0)
+        self.service.db.add(paid)
+        self.service.db.commit()
+        self.assertIsNone(paid.verify_priority)
+        paid.order_status = OrderStatus.SHIPPED.value
+        paid.shipped_at = datetime.now() + timedelta(minutes=2)
+        self.service.db.commit()
+        
+        batch, _ = self.service.claim_unverified_orders(
+            "worker", first.id, 10, by_priority=True, after_priority=first.verify_priority
+        )
+        self.assertEqual([order_sn for _, order_sn, _ in batch], ["LATE0001", "PAID0001"])
+    
+    def test_priority_recomputed_when_rules_change(self):
+        """测试优先级规则配置变化后按新规则重算全部待核销订单的优先级键"""
+        self.create_orders(2)
+        order = self.service.get_order_by_sn("TEST000000000001")
+        order.order_amount = 100.0
+        self.service.db.commit()
+        
+        self.assertEqual(self.service.refresh_verify_priority(), 2)
+        self.assertEqual(self.service.refresh_verify_priority(), 0)
+        before = self.service.get_order_by_sn("TEST000000000001").verify_priority
+        
+        with patch.object(settings, "verify_priority_amount_weight", 120.0):
+            self.assertEqual(self.service.refresh_verify_priority(), 2)
+            self.assertEqual(self.service.refresh_verify_priority(), 0)
+        self.service.db.expire_all()
+        self.assertAlmostEqual(before - self.service.get_order_by_sn("TEST000000000001").verify_priority, 6000.0)
+    
+    def test_failed_orders_wait_for_retry(self):
+        """测试核销失败的订单按退避时间重试，不可恢复的错误转入死信"""
+        self.create_orders(2)
+        order = self.service.get_order_by_sn("TEST000000000001")
+        order.verification_code = "WRONGCODE"
+        self.service.db.commit()
+        self.verifier.api_client.verify_virtual_goods.return_value = {
+            "virtual_goods_verify_response": {"success": False}
+        }
+        
+        first = self.verifier.auto_verify_orders(batch_size=10, max_orders=0, time_budget=0)
+        second = self.verifier.auto_verify_orders(batch_size=10, max_orders=0, time_budget=0)
+        
+        self.assertEqual(first["processed"], 2)
+        self.assertEqual(second["processed"], 0)
+        rejected = self.service.get_order_by_sn("TEST000000000000")
+        self.assertEqual(rejected.verify_attempts, 1)
+        self.assertEqual(rejected.last_verify_error, "VERIFY_REJECTED")
+        self.assertIsNotNone(rejected.next_verify_at)
+        self.assertFalse(rejected.verify_dead_letter)
+        mismatched = self.service.get_order_by_sn("TEST000000000001")
+        self.assertEqual(mismatched.last_verify_error, "CODE_MISMATCH")
+        self.assertTrue(mismatched.verify_dead_letter)
+
+
+class TestVerifyOrder(VerificationTestCase):
+    """单个订单核销测试"""
+    
+    def test_success_commits_once(self):
+        """测试核销成功时订单和核销记录在同一事务中提交"""
+        self.create_orders(1)
+        commits = []
+        event.listen(self.service.engine, "commit", lambda conn: commits.append(conn))
+        
+        result = self.verifier.verify_order("TEST000000000000", "00000000")
+        
+        self.assertTrue(result["success"])
+        self.assertEqual(len(commits), 1)
+        records = self.service.list_verification_records(order_sn="TEST000000000000").items
+        self.assertEqual(len(records), 1)
+        self.assertTrue(records[0].verification_status)
+        order = self.service.get_order_by_sn("TEST000000000000")
+        self.assertTrue(order.verification_status)
+        self.assertEqual(order.order_status, OrderStatus.FINISHED.value)
+
+    
+    def test_verify_by_code(self):
+        """测试根据核销码核销并缓存核销码对应的订单号"""
+        self.create_orders(2)
+        
+        result = self.verifier.verify_by_code("00000001")
+        
+        self.assertTrue(result["success"])
+        self.assertEqual(result["order_sn"], "TEST000000000001")
+        self.assertEqual(self.verifier.code_cache.get("00000001"), "TEST000000000001")
+    
+    def test_verify_by_unknown_code(self):
+        """测试未知核销码进入短期缓存，不再重复查库"""
+        self.create_orders(1)
+        
+        with patch.object(self.service, "get_order_sn_by_code", wraps=self.service.get_order_sn_by_code) as lookup:
+            for _ in range(3):
+                with self.assertRaises(VerificationException) as ctx:
+                    self.verifier.verify_by_code("99999999")
+                self.assertEqual(ctx.exception.error_code, "CODE_NOT_FOUND")
+            self.assertEqual(lookup.call_count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
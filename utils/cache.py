@@ -0,0 +1,245 @@
+"""
+共享缓存
+
+按 CACHE_BACKEND 选择后端:
+- redis（默认）: 使用 REDIS_URL 指向的 Redis，调度器和 Web 等多个进程共享缓存和失效；
+  启动时连不上 Redis（或未安装 redis 包）则回退到进程内缓存，使用期间定时记录警告
+- memory: 进程内 LRU 缓存，失效只对本进程有效，过期时间不超过 CACHE_MEMORY_MAX_TTL，
+  其他进程写入后最多在这段时间内读到旧值
+- none: 不缓存
+
+键为 <CACHE_KEY_PREFIX><命名空间>:<键>，值序列化为 JSON 保存，每次读取得到新的字典/列表，
+调用方修改返回值不会影响缓存。Redis 读写出错时记录警告并按未命中处理，之后一段时间内不再访问 Redis，
+避免 Redis 故障时每个请求都等待超时。Redis 客户端是同步的，异步处理函数中使用 get_async / set_async，
+在线程池中访问 Redis，不阻塞事件循环。
+"""
+import json
+import threading
+import time
+from typing import Any, Callable, Iterable, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from loguru import logger
+
+from config.settings import settings
+from utils.lru_cache import LRUCache
+from utils.serialization import dumps
+
+try:
+    import redis
+except ImportError:
+    # redis 为可选依赖，未安装时使用进程内缓存
+    redis = None
+
+CACHE_BACKENDS = ("redis", "memory", "none")
+
+# Redis 出错后暂停访问的秒数
+REDIS_RETRY_INTERVAL = 30
+# 回退到进程内缓存时，使用缓存期间记录警告的间隔秒数
+FALLBACK_WARNING_INTERVAL = 60
+
+_MISSING = object()
+
+
+class MemoryCacheBackend:
+    """进程内缓存后端"""
+
+    name = "memory"
+    blocking = False
+
+    def __init__(self, max_size: int = 10000, max_ttl: int = 0, fallback: bool = False):
+        self._cache = LRUCache(max_size)
+        # 失效不跨进程，限制过期时间（0 为不限制）
+        self.max_ttl = max_ttl
+        # 是否为连不上 Redis 时的回退
+        self.fallback = fallback
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._cache.get(key)
+
+    def set(self, key: str, value: bytes, ttl: int):
+        self._cache.set(key, value, ttl=min(ttl, self.max_ttl) if self.max_ttl else ttl)
+
+    def delete(self, keys: list):
+        for key in keys:
+            self._cache.delete(key)
+
+    def close(self):
+        self._cache.clear()
+
+
+class RedisCacheBackend:
+    """Redis 缓存后端（client 为 redis.Redis 或接口相同的对象）"""
+
+    name = "redis"
+    blocking = True
+
+    def __init__(self, client):
+        self.client = client
+
+    @classmethod
+    def from_url(cls, url: str, timeout: float) -> "RedisCacheBackend":
+        return cls(redis.Redis.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout))
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(key)
+
+    def set(self, key: str, value: bytes, ttl: int):
+        self.client.set(key, value, ex=ttl)
+
+    def delete(self, keys: list):
+        self.client.delete(*keys)
+
+    def close(self):
+        self.client.close()
+
+
+class Cache:
+    """按命名空间读写缓存，backend 为 None 时不缓存"""
+
+    def __init__(self, backend=None, prefix: Optional[str] = None):
+        self.backend = backend
+        self.prefix = settings.cache_key_prefix if prefix is None else prefix
+        self._retry_at = 0.0
+        self._fallback_warned_at: Optional[float] = None
+
+    def key(self, namespace: str, key: Any) -> str:
+        return f"{self.prefix}{namespace}:{key}"
+
+    def get(self, namespace: str, key: Any, default: Any = None) -> Any:
+        """读取缓存，未命中时返回默认值"""
+        if not self._available():
+            return default
+        try:
+            raw = self.backend.get(self.key(namespace, key))
+        except Exception as e:
+            self._on_error("读取", e)
+            return default
+        return default if raw is None else json.loads(raw)
+
+    def set(self, namespace: str, key: Any, value: Any, ttl: int):
+        """写入缓存（None 值和 ttl<=0 不缓存）"""
+        if value is None or ttl <= 0 or not self._available():
+            return
+        try:
+            self.backend.set(self.key(namespace, key), dumps(value), ttl)
+        except Exception as e:
+            self._on_error("写入", e)
+
+    async def get_async(self, namespace: str, key: Any, default: Any = None) -> Any:
+        """异步读取缓存（后端有网络IO时在线程池中执行）"""
+        if self._blocking():
+            return await run_in_threadpool(self.get, namespace, key, default)
+        return self.get(namespace, key, default)
+    
+    async def set_async(self, namespace: str, key: Any, value: Any, ttl: int):
+        """异步写入缓存（后端有网络IO时在线程池中执行）"""
+        if self._blocking():
+            await run_in_threadpool(self.set, namespace, key, value, ttl)
+        else:
+            self.set(namespace, key, value, ttl)
+    
+    def delete(self, namespace: str, *keys: Any):
+        """删除缓存"""
+        self.delete_keys([(namespace, key) for key in keys])
+
+    def delete_keys(self, keys: Iterable[tuple]):
+        """删除多个 (命名空间, 键)"""
+        if self.backend is None:
+            return
+        keys = [self.key(namespace, key) for namespace, key in keys]
+        if not keys:
+            return
+        try:
+            self.backend.delete(keys)
+        except Exception as e:
+            # 删除失败时旧值最多保留到过期
+            self._on_error("删除", e)
+
+    def get_or_load(self, namespace: str, key: Any, loader: Callable[[], Any], ttl: int) -> Any:
+        """读取缓存，未命中时调用 loader 并写入缓存"""
+        value = self.get(namespace, key, _MISSING)
+        if value is _MISSING:
+            value = loader()
+            self.set(namespace, key, value, ttl)
+        return value
+
+    def close(self):
+        if self.backend is not None:
+            self.backend.close()
+
+    def _blocking(self) -> bool:
+        return self._available() and getattr(self.backend, "blocking", True)
+    
+    def _available(self) -> bool:
+        if self.backend is None:
+            return False
+        if getattr(self.backend, "fallback", False):
+            self._warn_fallback()
+        return time.monotonic() >= self._retry_at
+    
+    def _warn_fallback(self):
+        now = time.monotonic()
+        if self._fallback_warned_at is not None and now - self._fallback_warned_at < FALLBACK_WARNING_INTERVAL:
+            return
+        self._fallback_warned_at = now
+        max_ttl = self.backend.max_ttl
+        logger.warning(
+            "Redis 不可用，正在使用进程内缓存，其他进程的写入不会使本进程的缓存失效"
+            + (f"，最多 {max_ttl} 秒内可能读到旧值" if max_ttl else "")
+        )
+    
+    def status(self) -> dict:
+        """缓存后端状态（用于健康检查）"""
+        return {
+            "backend": self.backend.name if self.backend is not None else "none",
+            "fallback": bool(getattr(self.backend, "fallback", False)),
+            "max_ttl": getattr(self.backend, "max_ttl", None) or None,
+        }
+
+    def _on_error(self, action: str, error: Exception):
+        self._retry_at = time.monotonic() + REDIS_RETRY_INTERVAL
+        logger.warning(f"缓存{action}失败，{REDIS_RETRY_INTERVAL} 秒内不使用缓存: {error}")
+
+
+_cache: Optional[Cache] = None
+_lock = threading.Lock()
+
+
+def create_cache_backend(name: Optional[str] = None):
+    """按配置创建缓存后端，Redis 不可用时回退到进程内缓存"""
+    name = (name or settings.cache_backend).lower()
+    if name not in CACHE_BACKENDS:
+        raise ValueError(f"不支持的缓存后端: {name}，可选 {', '.join(CACHE_BACKENDS)}")
+    if name == "none":
+        return None
+    if name == "redis":
+        if redis is None:
+            logger.warning("未安装 redis，使用进程内缓存")
+        else:
+            try:
+                backend = RedisCacheBackend.from_url(settings.redis_url, settings.cache_redis_timeout)
+                backend.client.ping()
+                logger.info("缓存使用 Redis")
+                return backend
+            except Exception as e:
+                logger.warning(f"连接 Redis 失败，使用进程内缓存: {e}")
+    return MemoryCacheBackend(settings.cache_memory_size, settings.cache_memory_max_ttl, fallback=name == "redis")
+
+
+def get_cache() -> Cache:
+    """获取进程内共享的缓存（首次调用时按配置创建）"""
+    global _cache
+    with _lock:
+        if _cache is None:
+            _cache = Cache(create_cache_backend())
+        return _cache
+
+
+def reset_cache(cache: Optional[Cache] = None):
+    """关闭当前缓存；传入 cache 时替换为该缓存，否则下次使用时按配置重新创建"""
+    global _cache
+    with _lock:
+        if _cache is not None and _cache is not cache:
+            _cache.close()
+        _cache = cache
@@ -0,0 +1,88 @@
+"""
+导出格式编码
+
+把逐行产生的字典编码为 CSV 或 NDJSON 字节块，可选 gzip 压缩。
+编码按批进行，每批产出一个字节块，内存占用只与批大小有关，与导出总行数无关。
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, Iterator, List, Sequence
+
+from core.exceptions import PddAutoVerifyException
+
+EXPORT_FORMATS = ("csv", "ndjson")
+
+# 每累积这么多字节产出一个数据块
+CHUNK_SIZE = 64 * 1024
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"无法序列化的类型: {type(value).__name__}")
+
+
+def _csv_value(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, bool):
+        return int(value)
+    return value
+
+
+def encode_csv(rows: Iterable[Dict[str, Any]], columns: Sequence[str]) -> Iterator[bytes]:
+    """编码为带表头的 CSV（UTF-8 BOM，Excel 可直接打开中文）"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write("\ufeff")
+    writer.writerow(columns)
+    for row in rows:
+        writer.writerow([_csv_value(row.get(column)) for column in columns])
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+
+def encode_ndjson(rows: Iterable[Dict[str, Any]], columns: Sequence[str]) -> Iterator[bytes]:
+    """编码为每行一个 JSON 对象的 NDJSON"""
+    lines: List[str] = []
+    size = 0
+    for row in rows:
+        line = json.dumps({column: row.get(column) for column in columns},
+                          ensure_ascii=False, default=_json_default)
+        lines.append(line)
+        size += len(line)
+        if size >= CHUNK_SIZE:
+            yield ("\n".join(lines) + "\n").encode("utf-8")
+            lines, size = [], 0
+    if lines:
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def gzip_chunks(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """对字节块做流式 gzip 压缩"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def encode_rows(rows: Iterable[Dict[str, Any]], columns: Sequence[str],
+                fmt: str = "csv", compress: bool = False) -> Iterator[bytes]:
+    """按格式编码导出行"""
+    if fmt not in EXPORT_FORMATS:
+        raise PddAutoVerifyException(f"不支持的导出格式: {fmt}", "INVALID_EXPORT_FORMAT")
+    chunks = encode_csv(rows, columns) if fmt == "csv" else encode_ndjson(rows, columns)
+    return gzip_chunks(chunks) if compress else chunks
+
+
+def export_filename(name: str, fmt: str, compress: bool = False) -> str:
+    """导出文件名，如 orders_20240101.csv.gz"""
+    return f"{name}_{datetime.now():%Y%m%d%H%M%S}.{fmt}" + (".gz" if compress else "")
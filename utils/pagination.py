@@ -0,0 +1,83 @@
+"""
+键集（游标）分页
+
+按 (created_at, id) 倒序翻页，下一页从上一页最后一行之后开始，
+查询可以直接沿 (created_at, id) 索引定位，翻到多深都不需要跳过前面的行。
+游标是对最后一行排序键的 base64 编码，调用方只需原样传回。
+created_at 为空的行无法编码为游标，各数据库对 NULL 的排序位置也不同，不出现在分页列表中
+（模型写入时默认填充创建时间，导入时补为付款时间或导入时间，只有绕过它们直接写库的行才会为空）。
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Query
+
+from core.exceptions import PddAutoVerifyException
+
+MAX_PAGE_SIZE = 200
+
+
+class Page:
+    """一页查询结果"""
+    
+    def __init__(self, items: List[Any], next_cursor: Optional[str] = None, page_size: Optional[int] = None):
+        self.items = items
+        self.next_cursor = next_cursor
+        # 实际使用的每页条数（请求值限制到 1 ~ MAX_PAGE_SIZE 之后）
+        self.page_size = page_size
+    
+    @property
+    def has_more(self) -> bool:
+        return self.next_cursor is not None
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    """把排序键编码为不透明游标"""
+    payload = json.dumps({"t": created_at.isoformat(), "id": row_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """解析游标，格式错误时抛出 INVALID_CURSOR 异常"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return datetime.fromisoformat(payload["t"]), int(payload["id"])
+    except (ValueError, KeyError, TypeError) as e:
+        raise PddAutoVerifyException(f"无效的分页游标: {e}", "INVALID_CURSOR")
+
+
+def clamp_page_size(page_size: int) -> int:
+    """限制每页条数在 1 ~ MAX_PAGE_SIZE 之间"""
+    return max(1, min(int(page_size), MAX_PAGE_SIZE))
+
+
+def apply_keyset(statement, created_column, id_column,
+                 cursor: Optional[str] = None, page_size: int = 20):
+    """为 Query 或 select() 加上游标条件和排序，多取一行用于判断是否还有下一页"""
+    statement = statement.filter(created_column != None)
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        statement = statement.filter(tuple_(created_column, id_column) < tuple_(created_at, row_id))
+    return statement.order_by(created_column.desc(), id_column.desc()).limit(clamp_page_size(page_size) + 1)
+
+
+def to_page(rows: List[Any], page_size: int) -> Page:
+    """把 apply_keyset 查询的结果整理为一页"""
+    page_size = clamp_page_size(page_size)
+    if len(rows) <= page_size:
+        return Page(list(rows), page_size=page_size)
+    
+    rows = list(rows[:page_size])
+    last = rows[-1]
+    return Page(rows, encode_cursor(last.created_at, last.id), page_size)
+
+
+def keyset_paginate(query: Query, created_column, id_column,
+                    cursor: Optional[str] = None, page_size: int = 20) -> Page:
+    """按 (created_at, id) 倒序取一页"""
+    rows = apply_keyset(query, created_column, id_column, cursor, page_size).all()
+    return to_page(rows, page_size)
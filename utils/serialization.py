@@ -0,0 +1,42 @@
+"""
+JSON 序列化
+
+安装了 orjson 时使用 orjson（直接序列化 datetime，不需要逐个调用 isoformat()），
+否则回退到标准库 json。两者输出的时间格式相同（naive datetime 的 ISO 8601）。
+"""
+import json
+from datetime import date, datetime
+from typing import Any, Iterable, List, Sequence
+
+try:
+    import orjson
+except ImportError:
+    # orjson 为可选依赖
+    orjson = None
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"无法序列化的类型: {type(value).__name__}")
+
+
+def dumps(obj: Any) -> bytes:
+    """序列化为 UTF-8 JSON 字节串"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+def rows_to_dicts(rows: Iterable[Sequence], fields: Sequence[str]) -> List[dict]:
+    """把 namedtuple 行对象转换为字典列表（字段值原样保留，由 dumps 统一处理时间）"""
+    return [dict(zip(fields, row)) for row in rows]
+
+
+def rows_to_plain_dicts(rows: Iterable[Sequence], fields: Sequence[str]) -> List[dict]:
+    """把 namedtuple 行对象转换为字典列表，时间转换为 ISO 8601 字符串（与模型的 to_dict() 相同）"""
+    return [
+        {field: value.isoformat() if isinstance(value, (datetime, date)) else value
+         for field, value in zip(fields, row)}
+        for row in rows
+    ]
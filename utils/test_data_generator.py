@@ -8,7 +8,8 @@ from typing import List, Dict, Any
 from loguru import logger
 
 from models.database import SessionLocal
-from models.order import Order, OrderStatus, Product, VerificationRecord
+from models.order import Order, OrderItem, OrderStatus, Product, VerificationRecord, build_order_items
+from core.priority import compute_verify_priority
 
 
 class TestDataGenerator:
@@ -43,12 +44,14 @@ class TestDataGenerator:
             
             if order.order_status == OrderStatus.SHIPPED.value:
                 order.shipped_at = base_time + timedelta(minutes=i*30 + 10)
+                order.verify_priority = compute_verify_priority(order.shipped_at, order.order_amount)
             
             orders.append(order)
         
         # 保存到数据库
         for order in orders:
             self.db.add(order)
+            self.db.add_all(build_order_items(order.order_sn, order.goods_info, order.created_at))
         
         self.db.commit()
         logger.info(f"成功生成 {count} 个测试订单")
@@ -141,6 +144,9 @@ class TestDataGenerator:
             for order in test_orders:
                 self.db.delete(order)
             
+            # 删除测试订单的商品明细
+            self.db.query(OrderItem).filter(OrderItem.order_sn.like("TEST%")).delete(synchronize_session=False)
+            
             # 删除测试商品
             test_products = self.db.query(Product).filter(Product.goods_id.like("goods_%")).all()
             for product in test_products:
@@ -2,8 +2,9 @@
 Web管理界面
 """
 import os
-from fastapi import FastAPI, Request, Form, HTTPException
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi import Depends, FastAPI, Request, Form, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import HTMLResponse, RedirectResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 try:
     from fastapi.templating import Jinja2Templates
@@ -11,16 +12,31 @@ except ImportError:
     # 如果Jinja2Templates不可用，使用简单的HTML响应
     Jinja2Templates = None
 from typing import Optional, List
+from sqlalchemy.orm import Session
 import json
 from datetime import datetime
+from loguru import logger
+from urllib.parse import urlencode
 
 from config.settings import settings
 from core.order_manager import OrderManager
 from core.verification import VirtualGoodsVerifier
-from services.order_service import OrderService
-from services.verification_service import VerificationService
+from core.exceptions import PddAutoVerifyException, VerificationException
+from models.database import dispose_engines, get_db
+from models.list_rows import OrderListRow, VerificationRecordListRow
+from models.query_stats import track_queries
+from services.async_service import AsyncOrderService, AsyncStatsService, AsyncVerificationService
 from services.auth_service import AuthService
+from services.export_service import ExportService, ORDER_EXPORT_COLUMNS, VERIFICATION_RECORD_EXPORT_COLUMNS
+from utils.export import EXPORT_FORMATS, encode_rows, export_filename
 from utils.logger import setup_logger
+from utils.cache import get_cache
+from utils.serialization import dumps, rows_to_dicts
+
+
+def json_response(payload) -> Response:
+    """用 utils.serialization.dumps 序列化的 JSON 响应（列表接口使用，跳过 FastAPI 的逐字段编码）"""
+    return Response(content=dumps(payload), media_type="application/json")
 
 
 class WebInterface:
@@ -33,9 +49,11 @@ class WebInterface:
         # 初始化组件
         self.order_manager = OrderManager()
         self.verifier = VirtualGoodsVerifier()
-        self.order_service = OrderService()
-        self.verification_service = VerificationService()
-        self.auth_service = AuthService()
+        # 页面和查询API使用异步只读服务，每次查询使用独立会话，按配置走只读副本
+        self.order_service = AsyncOrderService(read_only=True)
+        self.verification_service = AsyncVerificationService(read_only=True)
+        self.stats_service = AsyncStatsService(read_only=True)
+        # 写操作由 order_manager/verifier 在线程池中执行，通过 for_session() 绑定请求的会话（get_db 依赖）
         
         # 创建FastAPI应用
         self.app = FastAPI(title="拼多多自动核销系统", version="1.0.0")
@@ -49,7 +67,24 @@ class WebInterface:
         self.templates = None
         print("警告: 使用简单的HTML响应模式")
             
-        self.app.mount("/static", StaticFiles(directory=static_dir), name="static")
+        if os.path.isdir(static_dir):
+            self.app.mount("/static", StaticFiles(directory=static_dir), name="static")
+        
+        # 统计每个请求执行的SQL数，写入响应头 X-Query-Count（流式响应只统计响应开始前的SQL）
+        @self.app.middleware("http")
+        async def count_queries(request: Request, call_next):
+            with track_queries() as queries:
+                response = await call_next(request)
+            response.headers["X-Query-Count"] = str(queries.count)
+            threshold = settings.query_count_warn_threshold
+            if threshold and queries.count >= threshold:
+                logger.warning(f"{request.method} {request.url.path} {queries.summary(threshold)}")
+            return response
+        
+        # 关闭时归还所有连接（aiosqlite 连接线程不关闭会阻止进程退出）
+        @self.app.on_event("shutdown")
+        async def close_database():
+            await run_in_threadpool(dispose_engines)
         
         # 注册路由
         self._register_routes()
@@ -92,6 +127,18 @@ class WebInterface:
         </html>
         """
     
+    def _render_pager(self, path: str, cursor: Optional[str], next_cursor: Optional[str], **params) -> str:
+        """渲染键集分页的翻页链接（只支持回到第一页和下一页）"""
+        params = {key: value for key, value in params.items() if value is not None}
+        links = []
+        if cursor:
+            links.append(f'<a href="{path}?{urlencode(params)}">第一页</a>')
+        if next_cursor:
+            links.append(f'<a href="{path}?{urlencode(dict(params, cursor=next_cursor))}">下一页</a>')
+        if not links:
+            return ""
+        return f'<div style="margin-top: 20px;">{" | ".join(links)}</div>'
+    
     def _register_routes(self):
         """注册路由"""
         
@@ -138,25 +185,15 @@ class WebInterface:
                 return HTMLResponse(content=self._render_simple_html("错误", error_content))
         
         @self.app.get("/orders", response_class=HTMLResponse)
-        async def orders_page(request: Request, page: int = 1, page_size: int = 20):
+        async def orders_page(request: Request, cursor: Optional[str] = None, page_size: int = 20,
+                              status: Optional[int] = None):
             """订单管理页面"""
             try:
-                # 获取所有订单（分别获取不同状态的订单）
-                pending_orders = self.order_service.get_orders_by_status(1, limit=1000)  # 已支付
-                shipped_orders = self.order_service.get_orders_by_status(2, limit=1000)  # 已发货
-                finished_orders = self.order_service.get_orders_by_status(4, limit=1000)  # 已完成
-                
-                # 合并所有订单
-                all_orders = pending_orders + shipped_orders + finished_orders
-                
-                # 分页处理
-                start_idx = (page - 1) * page_size
-                end_idx = start_idx + page_size
-                page_orders = all_orders[start_idx:end_idx]
+                page = await self.order_service.list_orders(cursor=cursor, page_size=page_size, status=status)
                 
                 # 生成订单列表HTML
                 orders_html = ""
-                for order in page_orders:
+                for order in page.items:
                     status_text = {
                         1: "已支付",
                         2: "已发货", 
@@ -167,6 +204,13 @@ class WebInterface:
                     
                     verification_status = "已核销" if order.verification_status else "未核销"
                     
+                    verify_button = ""
+                    if order.order_status == 2 and not order.verification_status:
+                        verify_button = (
+                            f"<button onclick=\"verifyOrder('{order.order_sn}', '{order.verification_code}')\" "
+                            f"class=\"btn btn-sm btn-success\">核销</button>"
+                        )
+                    
                     orders_html += f"""
                     <tr>
                         <td>{order.order_sn}</td>
@@ -177,16 +221,19 @@ class WebInterface:
                         <td>{order.created_at.strftime('%Y-%m-%d %H:%M:%S')}</td>
                         <td>
                             <button onclick="viewOrder('{order.order_sn}')" class="btn btn-sm btn-info">查看</button>
-                            {f'<button onclick="verifyOrder(\'{order.order_sn}\', \'{order.verification_code}\')" class="btn btn-sm btn-success">核销</button>' if order.order_status == 2 and not order.verification_status else ''}
+                            {verify_button}
                         </td>
                     </tr>
                     """
                 
+                pager_html = self._render_pager("/orders", cursor, page.next_cursor,
+                                                page_size=page.page_size, status=status)
+                
                 content = f"""
                 <h2>订单管理</h2>
                 <div style="margin-bottom: 20px;">
                     <button onclick="refreshOrders()" class="btn btn-primary">刷新</button>
-                    <span style="margin-left: 20px;">共 {len(all_orders)} 个订单</span>
+                    <span style="margin-left: 20px;">本页 {len(page.items)} 个订单</span>
                 </div>
                 
                 <div style="overflow-x: auto;">
@@ -207,6 +254,7 @@ class WebInterface:
                         </tbody>
                     </table>
                 </div>
+                {pager_html}
                 
                 <script>
                 function viewOrder(orderSn) {{
@@ -252,16 +300,16 @@ class WebInterface:
                 return HTMLResponse(content=self._render_simple_html("错误", error_content))
         
         @self.app.get("/verification", response_class=HTMLResponse)
-        async def verification_page(request: Request, page: int = 1, page_size: int = 20):
+        async def verification_page(request: Request, cursor: Optional[str] = None, page_size: int = 20):
             """核销管理页面"""
             try:
-                records = self.verification_service.get_verification_records(
-                    page=page, page_size=page_size
+                page = await self.verification_service.list_verification_records(
+                    cursor=cursor, page_size=page_size
                 )
                 
                 # 生成核销记录列表HTML
                 records_html = ""
-                for record in records:
+                for record in page.items:
                     status_text = "成功" if record.verification_status else "失败"
                     status_color = "#4caf50" if record.verification_status else "#f44336"
                     
@@ -279,7 +327,7 @@ class WebInterface:
                 <h2>核销管理</h2>
                 <div style="margin-bottom: 20px;">
                     <button onclick="refreshRecords()" class="btn btn-primary">刷新</button>
-                    <span style="margin-left: 20px;">共 {len(records)} 条核销记录</span>
+                    <span style="margin-left: 20px;">本页 {len(page.items)} 条核销记录</span>
                 </div>
                 
                 <div style="overflow-x: auto;">
@@ -298,6 +346,7 @@ class WebInterface:
                         </tbody>
                     </table>
                 </div>
+                {self._render_pager("/verification", cursor, page.next_cursor, page_size=page.page_size)}
                 
                 <script>
                 function refreshRecords() {{
@@ -332,11 +381,11 @@ class WebInterface:
                 return HTMLResponse(content=self._render_simple_html("错误", str(e)), status_code=500)
 
         @self.app.get("/oauth/callback")
-        async def oauth_callback(code: str = "", state: str = ""):
+        async def oauth_callback(code: str = "", state: str = "", db: Session = Depends(get_db)):
             """拼多多授权回调，兑换 access_token"""
             try:
                 api = self.order_manager.api_client
-                result = api.exchange_token(code)
+                result = await run_in_threadpool(api.exchange_token, code)
                 access_token = (
                     result.get("access_token")
                     or result.get("pop_auth_token_create_response", {}).get("access_token")
@@ -355,7 +404,8 @@ class WebInterface:
                 if not access_token:
                     raise ValueError("授权失败：未获取到 access_token")
 
-                self.auth_service.save_or_update_auth(
+                await run_in_threadpool(
+                    AuthService(db).save_or_update_auth,
                     access_token=access_token,
                     refresh_token=refresh_token,
                     expires_in_seconds=expires_in,
@@ -369,10 +419,10 @@ class WebInterface:
                 return HTMLResponse(content=self._render_simple_html("错误", error_content), status_code=500)
         
         @self.app.get("/settings", response_class=HTMLResponse)
-        async def settings_page(request: Request):
+        async def settings_page(request: Request, db: Session = Depends(get_db)):
             """系统设置页面"""
             try:
-                auth = self.auth_service.get_active_auth()
+                auth = await run_in_threadpool(AuthService(db).get_active_auth)
                 bind_html = "未绑定"
                 if auth:
                     bind_html = f"已绑定{ '（将过期）' if auth.is_expired() else '' }，店铺ID: {auth.shop_id or '-'}"
@@ -483,7 +533,7 @@ class WebInterface:
             except Exception as e:
                 raise HTTPException(status_code=500, detail=str(e))
         @self.app.post("/api/verify")
-        async def api_verify_order(request: Request):
+        async def api_verify_order(request: Request, db: Session = Depends(get_db)):
             """手动核销订单API"""
             try:
                 # 从JSON请求体中获取数据
@@ -494,36 +544,91 @@ class WebInterface:
                 if not order_sn or not verification_code:
                     raise HTTPException(status_code=400, detail="缺少必要参数")
                 
-                result = self.verifier.verify_order(order_sn, verification_code)
+                result = await run_in_threadpool(self.verifier.for_session(db).verify_order, order_sn, verification_code)
                 return result
             except Exception as e:
                 raise HTTPException(status_code=400, detail=str(e))
         
+        @self.app.post("/api/scan")
+        async def api_scan_verify(request: Request, db: Session = Depends(get_db)):
+            """扫码核销API（收银设备只提交核销码）"""
+            try:
+                body = await request.json()
+                verification_code = body.get("verification_code")
+                
+                if not verification_code:
+                    raise HTTPException(status_code=400, detail="缺少核销码参数")
+                
+                return await run_in_threadpool(self.verifier.for_session(db).verify_by_code, verification_code)
+            except HTTPException:
+                raise
+            except VerificationException as e:
+                status_code = 404 if e.error_code == "CODE_NOT_FOUND" else 400
+                raise HTTPException(status_code=status_code, detail=str(e))
+            except Exception as e:
+                raise HTTPException(status_code=400, detail=str(e))
+        
         @self.app.get("/api/orders")
-        async def api_get_orders(page: int = 1, page_size: int = 20):
-            """获取订单列表API"""
+        async def api_get_orders(cursor: Optional[str] = None, page_size: int = 20,
+                                 status: Optional[int] = None,
+                                 verification_status: Optional[bool] = None,
+                                 goods_id: Optional[str] = None,
+                                 goods_type: Optional[int] = None):
+            """获取订单列表API（按创建时间倒序，传入上一页的 next_cursor 翻页）"""
             try:
-                orders = self.order_service.get_orders_by_status(None, limit=page_size)
-                return {
-                    "orders": [order.to_dict() for order in orders],
-                    "page": page,
-                    "page_size": page_size,
-                    "total": len(orders)
-                }
+                page = await self.order_service.list_orders(
+                    cursor=cursor, page_size=page_size,
+                    status=status, verification_status=verification_status,
+                    goods_id=goods_id, goods_type=goods_type
+                )
+                return json_response({
+                    "orders": rows_to_dicts(page.items, OrderListRow._fields),
+                    "page_size": page.page_size,
+                    "next_cursor": page.next_cursor,
+                    "has_more": page.has_more
+                })
+            except PddAutoVerifyException as e:
+                status_code = 400 if e.error_code == "INVALID_CURSOR" else 500
+                raise HTTPException(status_code=status_code, detail=str(e))
             except Exception as e:
                 raise HTTPException(status_code=500, detail=str(e))
         
+        @self.app.get("/api/orders/{order_sn}")
+        async def api_get_order(order_sn: str):
+            """获取订单详情API（含商品明细，已归档订单也可查询）"""
+            try:
+                detail = await self.order_service.get_order_detail(order_sn)
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=str(e))
+            if detail is None:
+                raise HTTPException(status_code=404, detail=f"订单 {order_sn} 不存在")
+            return detail
+        
         @self.app.get("/api/verification-records")
-        async def api_get_verification_records(page: int = 1, page_size: int = 20):
-            """获取核销记录API"""
+        async def api_get_verification_records(cursor: Optional[str] = None, page_size: int = 20,
+                                               order_sn: Optional[str] = None,
+                                               start_time: Optional[str] = None,
+                                               end_time: Optional[str] = None):
+            """获取核销记录API（按创建时间倒序，传入上一页的 next_cursor 翻页）"""
             try:
-                result = self.verifier.get_verification_records(page=page, page_size=page_size)
-                return result
+                page = await self.verification_service.list_verification_records(
+                    cursor=cursor, page_size=page_size,
+                    order_sn=order_sn, start_time=start_time, end_time=end_time
+                )
+                return json_response({
+                    "records": rows_to_dicts(page.items, VerificationRecordListRow._fields),
+                    "page_size": page.page_size,
+                    "next_cursor": page.next_cursor,
+                    "has_more": page.has_more
+                })
+            except PddAutoVerifyException as e:
+                status_code = 400 if e.error_code == "INVALID_CURSOR" else 500
+                raise HTTPException(status_code=status_code, detail=str(e))
             except Exception as e:
                 raise HTTPException(status_code=500, detail=str(e))
         
         @self.app.post("/api/process-order")
-        async def api_process_order(request: Request):
+        async def api_process_order(request: Request, db: Session = Depends(get_db)):
             """手动处理订单API"""
             try:
                 # 从JSON请求体中获取数据
@@ -534,11 +639,11 @@ class WebInterface:
                     raise HTTPException(status_code=400, detail="缺少订单号参数")
                 
                 # 获取订单详情
-                order_detail = self.order_manager.api_client.get_order_detail(order_sn)
+                order_detail = await run_in_threadpool(self.order_manager.api_client.get_order_detail, order_sn)
                 order_info = order_detail.get("order_detail_get_response", {}).get("order", {})
                 
                 # 处理订单
-                success = self.order_manager.process_order(order_info)
+                success = await run_in_threadpool(self.order_manager.for_session(db).process_order, order_info)
                 
                 return {
                     "success": success,
@@ -547,6 +652,11 @@ class WebInterface:
             except Exception as e:
                 raise HTTPException(status_code=400, detail=str(e))
         
+        @self.app.get("/api/health")
+        async def api_health():
+            """健康检查API（含缓存后端状态，fallback 为 true 表示 Redis 不可用，缓存失效不跨进程）"""
+            return {"status": "ok", "cache": get_cache().status()}
+        
         @self.app.get("/api/stats")
         async def api_get_stats():
             """获取统计数据API"""
@@ -555,35 +665,108 @@ class WebInterface:
                 return stats
             except Exception as e:
                 raise HTTPException(status_code=500, detail=str(e))
+        
+        @self.app.get("/api/stats/daily")
+        async def api_get_daily_stats(date: Optional[str] = None):
+            """获取日报统计API（date 格式 YYYY-MM-DD，默认今天）"""
+            try:
+                day = datetime.strptime(date, "%Y-%m-%d").date() if date else datetime.now().date()
+            except ValueError:
+                raise HTTPException(status_code=400, detail="日期格式应为 YYYY-MM-DD")
+            try:
+                return await self.stats_service.get_daily_report(day)
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=str(e))
+    
+        @self.app.get("/api/stats/goods")
+        async def api_get_goods_stats(start_time: Optional[str] = None, end_time: Optional[str] = None,
+                                      goods_type: Optional[int] = None, limit: int = 50):
+            """按商品统计销量API（时间为 ISO 格式，按销售额倒序）"""
+            start, end = self._parse_time_range(start_time, end_time)
+            try:
+                goods = await self.order_service.get_goods_sales(start, end, goods_type, limit)
+                return {"goods": goods}
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=str(e))
+    
+        @self.app.get("/api/export/orders")
+        async def api_export_orders(format: str = "csv", gzip: bool = False,
+                                    start_time: Optional[str] = None, end_time: Optional[str] = None,
+                                    status: Optional[int] = None, shop_id: Optional[str] = None):
+            """流式导出订单（CSV/NDJSON，可 gzip 压缩，end_time 不含）"""
+            start, end = self._parse_time_range(start_time, end_time)
+            return self._export_response(
+                "orders", format, gzip, ORDER_EXPORT_COLUMNS,
+                lambda service: service.iter_orders(start, end, status=status, shop_id=shop_id)
+            )
+        
+        @self.app.get("/api/export/verification-records")
+        async def api_export_verification_records(format: str = "csv", gzip: bool = False,
+                                                  start_time: Optional[str] = None,
+                                                  end_time: Optional[str] = None,
+                                                  verification_status: Optional[bool] = None,
+                                                  shop_id: Optional[str] = None):
+            """流式导出核销记录（CSV/NDJSON，可 gzip 压缩，end_time 不含）"""
+            start, end = self._parse_time_range(start_time, end_time)
+            return self._export_response(
+                "verification_records", format, gzip, VERIFICATION_RECORD_EXPORT_COLUMNS,
+                lambda service: service.iter_verification_records(
+                    start, end, verification_status=verification_status, shop_id=shop_id
+                )
+            )
+    
+    @staticmethod
+    def _parse_time_range(start_time: Optional[str], end_time: Optional[str]):
+        """解析 ISO 格式的时间范围，格式错误返回400"""
+        try:
+            return (
+                datetime.fromisoformat(start_time) if start_time else None,
+                datetime.fromisoformat(end_time) if end_time else None,
+            )
+        except ValueError:
+            raise HTTPException(status_code=400, detail="时间格式应为 ISO 格式，如 2024-01-01T00:00:00")
+    
+    @staticmethod
+    def _export_response(name: str, fmt: str, compress: bool, columns, iterate) -> StreamingResponse:
+        """流式导出响应，iterate(service) 返回导出行的迭代器
+        
+        响应体是同步生成器，由 Starlette 在线程池中逐块迭代，导出期间使用独立的只读会话。
+        """
+        if fmt not in EXPORT_FORMATS:
+            raise HTTPException(status_code=400, detail=f"导出格式应为 {'/'.join(EXPORT_FORMATS)}")
+        
+        def body():
+            service = ExportService(read_only=True)
+            try:
+                yield from encode_rows(iterate(service), columns, fmt, compress)
+            finally:
+                service.close()
+        
+        if compress:
+            media_type = "application/gzip"
+        elif fmt == "csv":
+            media_type = "text/csv; charset=utf-8"
+        else:
+            media_type = "application/x-ndjson"
+        filename = export_filename(name, fmt, compress)
+        return StreamingResponse(body(), media_type=media_type,
+                                 headers={"Content-Disposition": f'attachment; filename="{filename}"'})
     
     async def _get_dashboard_stats(self):
         """获取仪表板统计数据"""
         try:
-            # 获取订单统计
-            # 由于get_orders_by_status不支持None参数，我们需要分别获取各种状态的订单
-            pending_orders = len(self.order_service.get_orders_by_status(1, limit=1000))  # 已支付
-            shipped_orders = len(self.order_service.get_orders_by_status(2, limit=1000))  # 已发货
-            finished_orders = len(self.order_service.get_orders_by_status(4, limit=1000))  # 已完成
-            total_orders = pending_orders + shipped_orders + finished_orders
-            
-            # 获取核销统计
-            verification_records = self.verification_service.get_verification_records(page=1, page_size=1000)
-            total_verifications = len(verification_records)
-            successful_verifications = len([r for r in verification_records if r.verification_status])
-            
-            # 获取可以核销的订单（已发货且未核销）
-            verifiable_orders = self.order_service.get_orders_by_status(2, limit=1000)  # 已发货
-            verifiable_orders = [o for o in verifiable_orders if not o.verification_status]  # 未核销
-            verifiable_count = len(verifiable_orders)
+            # 读取增量维护的统计计数器
+            stats = await self.stats_service.get_dashboard_stats()
             
             return {
-                "total_orders": total_orders,
-                "pending_orders": pending_orders,
-                "shipped_orders": shipped_orders,
-                "finished_orders": finished_orders,
-                "verifiable_orders": verifiable_count,  # 可以核销的订单数
-                "total_verifications": total_verifications,
-                "successful_verifications": successful_verifications,
+                "total_orders": stats["total_orders"],
+                "pending_orders": stats["pending_orders"],
+                "shipped_orders": stats["shipped_orders"],
+                "finished_orders": stats["finished_orders"],
+                "verifiable_orders": stats["verifiable_orders"],  # 可以核销的订单数
+                "total_verifications": stats["total_verifications"],
+                "successful_verifications": stats["successful_verifications"],
+                "failed_verifications": stats["failed_verifications"],
                 "system_status": "running",
                 "last_update": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             }
@@ -616,11 +799,20 @@ class WebInterface:
             return f"读取日志文件失败: {e}"
     
     def run(self, host: str = "0.0.0.0", port: int = 8000):
-        """运行Web服务器"""
+        """运行Web服务器（WEB_WORKERS 大于1时每个进程各自创建应用）"""
         import uvicorn
-        uvicorn.run(self.app, host=host, port=port)
+        if settings.web_workers > 1:
+            uvicorn.run("web.interface:create_app", factory=True, host=host, port=port,
+                        workers=settings.web_workers)
+        else:
+            uvicorn.run(self.app, host=host, port=port)
 
 
 def create_web_interface():
     """创建Web界面实例"""
     return WebInterface()
+
+
+def create_app() -> FastAPI:
+    """创建FastAPI应用（供 uvicorn 多进程启动时在每个进程中调用）"""
+    return create_web_interface().app